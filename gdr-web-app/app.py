@@ -12,6 +12,8 @@ from flask_migrate import Migrate
 from auth import auth_bp  # Importa il blueprint di autenticazione 2
 from auth.models import db, User
 from flask_login import LoginManager
+from config import (CreateDirs, MISSIONI_RELOAD_INTERVAL, SQLALCHEMY_DATABASE_URI,
+                    SESSION_BACKEND, DATA_SESSIONI)
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
 
@@ -22,14 +24,20 @@ def create_app():
         'SECRET_KEY',
         'cambia_questa_chiave_per_una_più_sicura'
     )
-    app.config['SESSION_TYPE'] = 'filesystem'
     # Configurazione per il database.
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///user.db'
+    app.config['SQLALCHEMY_DATABASE_URI'] = SQLALCHEMY_DATABASE_URI
 
     db.init_app(app)
     migrate = Migrate(app, db)  # Assegnata non utilizzata
     login_manager.init_app(app)
-    Session(app)
+    if SESSION_BACKEND == 'sqlite':
+        # Sessioni in un unico database con scadenza indicizzata
+        from utils.sessioni import SqliteSessionInterface
+        os.makedirs(os.path.dirname(DATA_SESSIONI), exist_ok=True)
+        app.session_interface = SqliteSessionInterface(app, DATA_SESSIONI)
+    else:
+        app.config['SESSION_TYPE'] = SESSION_BACKEND
+        Session(app)
 
     app.register_blueprint(gioco_bp)
     app.register_blueprint(battle_bp)
@@ -39,6 +47,33 @@ def create_app():
     app.register_blueprint(mission_bp)
     app.register_blueprint(auth_bp)
 
+    # Indice proprietari degli inventari: ricostruito se più vecchio dei file
+    from inventory.utils import inventory_index
+    CreateDirs()
+    inventory_index.ensure_fresh()
+
+    # Catalogo delle missioni: letto una volta, poi solo i file modificati
+    from gioco.missione import catalogo_missioni
+    catalogo_missioni.aggiorna()
+    catalogo_missioni.avvia_controllo(MISSIONI_RELOAD_INTERVAL)
+
+    # Completa o annulla le transazioni sui personaggi interrotte da un crash
+    from characters.utils import RecoverCharacterTransactions
+    with app.app_context():
+        # Crea solo le tabelle mancanti
+        db.create_all()
+        # Possesso dei personaggi dalla vecchia colonna JSON a UserCharacter
+        from auth.migrazione import aggiungi_colonne_personaggi, migra_possessi
+        try:
+            aggiungi_colonne_personaggi()
+            migra_possessi()
+        except Exception as e:
+            app.logger.error(f"Errore migrazione possesso personaggi: {e}")
+        try:
+            RecoverCharacterTransactions()
+        except Exception as e:
+            app.logger.error(f"Errore recupero journal personaggi: {e}")
+
     return app
 
 # Imposta una SECRET_KEY sicura (meglio via variabile d'ambiente)
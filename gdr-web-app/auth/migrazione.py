@@ -0,0 +1,170 @@
+"""
+Migrazione del possesso dei personaggi dalla vecchia colonna JSON
+User.character_ids alla tabella UserCharacter.
+
+Per ogni utente con la lista non vuota crea le righe mancanti (in ordine)
+e svuota la lista nello stesso commit: eseguirla più volte, o da più
+worker insieme, non duplica nulla. create_app la esegue all'avvio, dopo
+aver aggiunto a user_character le colonne delle statistiche se mancano
+(db.create_all non modifica le tabelle esistenti).
+
+Uso (dalla cartella gdr-web-app):
+    python -m auth.migrazione
+"""
+import os
+import logging
+from typing import Optional, Tuple
+
+from flask import Flask
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from config import BASE_DIR, SQLALCHEMY_DATABASE_URI
+from auth.models import db, User, UserCharacter
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Utenti migrati per commit
+MIGRAZIONE_BLOCCO = 200
+
+
+# Colonne aggiunte a user_character dopo la sua creazione
+COLONNE_PERSONAGGI = {
+    'classe': 'VARCHAR(40)',
+    'livello': 'INTEGER',
+}
+
+
+def aggiungi_colonne_personaggi() -> int:
+    """
+    Aggiunge a user_character le colonne di COLONNE_PERSONAGGI che mancano
+    (vuote: le statistiche le completano alla lettura). Va eseguita dentro
+    un app context.
+
+    Returns:
+        int: colonne aggiunte
+    """
+    presenti = {colonna['name'] for colonna in inspect(db.engine).get_columns(UserCharacter.__tablename__)}
+    aggiunte = 0
+    for nome, tipo in COLONNE_PERSONAGGI.items():
+        if nome in presenti:
+            continue
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {UserCharacter.__tablename__} ADD COLUMN {nome} {tipo}"))
+            aggiunte += 1
+        except OperationalError:
+            # Aggiunta nel frattempo da un altro worker
+            presenti = {colonna['name'] for colonna in inspect(db.engine).get_columns(UserCharacter.__tablename__)}
+            if nome not in presenti:
+                raise
+    if aggiunte:
+        logger.info(f"Colonne aggiunte a {UserCharacter.__tablename__}: {aggiunte}")
+    return aggiunte
+
+
+def _aggiungi_riga(user_id: int, char_id: str) -> Optional[int]:
+    """
+    Crea la riga UserCharacter in un savepoint: se char_id è già presente
+    (da prima o inserito nel frattempo da un altro worker) annulla solo
+    questa riga.
+
+    Returns:
+        Optional[int]: None se creata, altrimenti l'utente proprietario
+    """
+    try:
+        with db.session.begin_nested():
+            db.session.add(UserCharacter(user_id=user_id, char_id=char_id))
+        return None
+    except IntegrityError:
+        return db.session.query(UserCharacter.user_id).filter(UserCharacter.char_id == char_id).scalar()
+
+
+def _migra_utente(user: User) -> Tuple[int, int]:
+    """
+    Crea le righe UserCharacter dell'utente dalla lista JSON e la svuota
+    (non fa commit). Un personaggio già dell'utente non è un conflitto;
+    uno di un altro utente viene segnalato e lasciato a lui.
+
+    Returns:
+        Tuple[int, int]: (righe create, conflitti con altri utenti)
+    """
+    char_ids = list(dict.fromkeys(str(char_id) for char_id in user.legacy_character_ids or []))
+    proprietari = dict(
+        db.session.query(UserCharacter.char_id, UserCharacter.user_id)
+        .filter(UserCharacter.char_id.in_(char_ids))
+    ) if char_ids else {}
+    create = conflitti = 0
+    for char_id in char_ids:
+        proprietario = proprietari.get(char_id)
+        if proprietario is None:
+            proprietario = _aggiungi_riga(user.id, char_id)
+            if proprietario is None:
+                create += 1
+                continue
+        if proprietario != user.id:
+            conflitti += 1
+            logger.warning(
+                f"Personaggio {char_id} nella lista dell'utente {user.id} "
+                f"ma già dell'utente {proprietario}: ignorato"
+            )
+    user.legacy_character_ids = []
+    return create, conflitti
+
+
+def migra_possessi(blocco: int = MIGRAZIONE_BLOCCO) -> Tuple[int, int, int]:
+    """
+    Sposta in UserCharacter i personaggi ancora nella colonna JSON.
+    Va eseguita dentro un app context.
+
+    Args:
+        blocco (int): utenti migrati per commit
+
+    Returns:
+        Tuple[int, int, int]: (utenti migrati, righe create, personaggi
+        già di un altro utente)
+    """
+    ids = [
+        user_id for (user_id,) in db.session.query(User.id)
+        .filter(db.func.json_array_length(User.legacy_character_ids) > 0)
+        .order_by(User.id)
+    ]
+    utenti = righe = conflitti = 0
+    for inizio in range(0, len(ids), blocco):
+        parte = ids[inizio:inizio + blocco]
+        try:
+            for user in User.query.filter(User.id.in_(parte)):
+                create, scartati = _migra_utente(user)
+                utenti += 1
+                righe += create
+                conflitti += scartati
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    if utenti:
+        logger.info(
+            f"Possesso personaggi migrato: {utenti} utenti, {righe} personaggi, "
+            f"{conflitti} già di altri utenti"
+        )
+    return utenti, righe, conflitti
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.WARNING)
+    app = Flask(__name__, instance_path=os.path.join(BASE_DIR, 'instance'))
+    app.config['SQLALCHEMY_DATABASE_URI'] = SQLALCHEMY_DATABASE_URI
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        aggiungi_colonne_personaggi()
+        utenti, righe, conflitti = migra_possessi()
+    print(
+        f"Possesso personaggi migrato per {utenti} utenti ({righe} personaggi, "
+        f"{conflitti} già di altri utenti)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -5,14 +5,113 @@ from sqlalchemy.dialects.sqlite import JSON
 
 db = SQLAlchemy()
 
+# Classi giocabili sempre presenti nelle statistiche (anche a 0)
+CLASSI_STATISTICHE = ("Mago", "Guerriero", "Ladro")
+
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(80), nullable=False)
     email = db.Column(db.String(80), unique=True, nullable=False)
     password_hash = db.Column(db.String(128), nullable=False)
     crediti = db.Column(db.Float, nullable=False)
-    character_ids = db.Column(
+    # Vecchia lista JSON dei personaggi: la migrazione (auth/migrazione.py)
+    # la sposta in UserCharacter e la lascia vuota
+    legacy_character_ids = db.Column(
+        'character_ids',
         JSON,               # su SQLite sarà un TEXT che SQLAlchemy serializza in JSON
         nullable=False,
-        default=list        # ad ogni nuovo Utente character_ids = []
+        default=list
+    )
+    # possesso dei personaggi, una riga per personaggio (vedi UserCharacter)
+    character_links = db.relationship(
+        'UserCharacter', cascade='all, delete-orphan', back_populates='user'
     )
+
+    @property
+    def character_ids(self) -> list:
+        """
+        IDs dei personaggi dell'utente in ordine di creazione (query
+        sull'indice user_id di UserCharacter).
+        """
+        return [
+            char_id for (char_id,) in db.session.query(UserCharacter.char_id)
+            .filter(UserCharacter.user_id == self.id)
+            .order_by(UserCharacter.id)
+        ]
+
+    def owns_character(self, char_id) -> bool:
+        """
+        True se il personaggio è dell'utente (una lettura sull'indice
+        univoco di char_id, senza caricare la lista).
+        """
+        return db.session.query(
+            db.session.query(UserCharacter.id)
+            .filter(UserCharacter.char_id == str(char_id), UserCharacter.user_id == self.id)
+            .exists()
+        ).scalar()
+
+    def owned_character_ids(self, char_ids) -> set:
+        """
+        Sottoinsieme di char_ids posseduto dall'utente, con una sola query.
+        """
+        char_ids = {str(char_id) for char_id in char_ids}
+        if not char_ids:
+            return set()
+        return {
+            char_id for (char_id,) in db.session.query(UserCharacter.char_id)
+            .filter(UserCharacter.user_id == self.id, UserCharacter.char_id.in_(char_ids))
+        }
+
+
+class UserCharacter(db.Model):
+    """
+    Associazione utente -> personaggio. char_id è univoco (un personaggio
+    ha un solo proprietario) e indicizzato per trovarne il proprietario;
+    (user_id, id) indicizzato per elencare i personaggi di un utente in
+    ordine di creazione.
+
+    classe e livello del personaggio sono copiati qui a ogni creazione e
+    modifica: le statistiche dell'utente sono una query raggruppata sulle
+    sue righe, senza leggere i file dei personaggi. NULL finché non sono
+    stati letti (righe create prima di queste colonne).
+    """
+    __tablename__ = 'user_character'
+    __table_args__ = (
+        db.Index('ix_user_character_user_id', 'user_id', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    char_id = db.Column(db.String(36), nullable=False, unique=True, index=True)
+    classe = db.Column(db.String(40), nullable=True)
+    livello = db.Column(db.Integer, nullable=True)
+
+    user = db.relationship('User', back_populates='character_links')
+
+
+def statistiche_personaggi(per_classe: dict, livello_totale: int) -> dict:
+    """
+    Statistiche dei personaggi di un utente dai conteggi per classe e dalla
+    somma dei livelli (vedi UserCharacter.classe e UserCharacter.livello).
+
+    Returns:
+        dict: per_classe (con 'Totale'), livello_totale, livello_medio,
+        distribuzione percentuale e classe più giocata
+    """
+    conteggi = dict.fromkeys(CLASSI_STATISTICHE, 0)
+    conteggi.update(per_classe or {})
+    totale = sum(conteggi.values())
+    livello_totale = livello_totale or 0
+    if totale:
+        distribuzione = {c: round(n / totale * 100, 1) for c, n in conteggi.items()}
+        classe, numero = max(conteggi.items(), key=lambda x: x[1])
+    else:
+        distribuzione = dict.fromkeys(conteggi, 0.0)
+        classe, numero = "Nessuna", 0
+    return {
+        "per_classe": {**conteggi, "Totale": totale},
+        "livello_totale": livello_totale,
+        "livello_medio": round(livello_totale / totale, 1) if totale else 0.0,
+        "distribuzione": distribuzione,
+        "classe_piu_giocata": {"classe": classe, "numero": numero},
+    }
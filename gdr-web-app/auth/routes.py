@@ -78,8 +78,7 @@ def register():
                 nome=username,
                 email=email,
                 password_hash=hash_psw,
-                crediti=100.0,
-                character_ids=[]
+                crediti=100.0
             )
 
             db.session.add(nuovo_utente)  # [10]
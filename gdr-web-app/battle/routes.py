@@ -3,13 +3,44 @@ from . import battle_bp
 from gioco.personaggio import Personaggio
 from gioco.inventario import Inventario
 from gioco.ambiente import Ambiente, Foresta
-from gioco.missione import Missione, GestoreMissioni
+from gioco.missione import Missione, GestoreMissioni, catalogo_missioni
 from gioco.oggetto import Oggetto
-from utils.messaggi import Messaggi
+from utils.messaggi import Messaggi, CanaleMessaggi, messaggi_richiesta, SUCCESSO, ERRORE
 from utils.log import Log
+from flask_login import login_required, current_user
+from gioco.battaglia import Battaglia, NEMICI, VITTORIA
+from characters.utils import LoadSessionCharacters
+from .utils import (
+    create_random_mission, LoadBattleCharacters, SaveBattleResult,
+    BATTAGLIA_MAX_NEMICI, BATTAGLIA_MAX_MESSAGGI
+)
 import random
 import json
 import os
+import logging
+
+# Setup logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+def _messaggi_battaglia() -> CanaleMessaggi:
+    """
+    Canale dei messaggi della battaglia in sessione (limitato a
+    BATTAGLIA_MAX_MESSAGGI voci).
+    """
+    return CanaleMessaggi.from_dict(session.get('battaglia_messaggi'), BATTAGLIA_MAX_MESSAGGI)
+
+
+def _salva_battaglia(battaglia: Battaglia, canale: CanaleMessaggi) -> None:
+    """
+    Salva in sessione lo stato compatto della battaglia e il canale dei
+    messaggi, a cui si aggiungono quelli della richiesta corrente.
+    """
+    for voce in messaggi_richiesta().svuota():
+        canale.aggiungi(voce['testo'], voce['livello'])
+    session['battaglia'] = battaglia.to_dict()
+    session['battaglia_messaggi'] = canale.to_dict()
+
 
 #---------------------------SHOW_INVENTORY--------------------------------
 @battle_bp.route('/show_inventory', methods=['GET', 'POST'])
@@ -18,8 +49,58 @@ def show_inventory():
 
 #---------------------------BEGIN THE BATTLE------------------------------
 @battle_bp.route('/begin_battle', methods=['GET', 'POST'])
+@login_required
 def begin_battle():
-    pass
+    """
+    Avvia una battaglia tra i personaggi scelti dall'utente e i nemici di
+    una missione del catalogo o di una missione casuale (numero di nemici,
+    ambiente e strategia dal form).
+    """
+    lista_pers = LoadSessionCharacters(session)
+    owned = current_user.owned_character_ids(
+        [p['id'] for p in lista_pers] + request.form.getlist('personaggi')
+    )
+    personaggi_utente = [p for p in lista_pers if p['id'] in owned]
+
+    if request.method == 'POST':
+        try:
+            char_ids = request.form.getlist('personaggi')
+            if not char_ids or any(char_id not in owned for char_id in char_ids):
+                flash("Seleziona almeno uno dei tuoi personaggi", "danger")
+                return redirect(url_for('battle.begin_battle'))
+
+            nome_missione = request.form.get('missione')
+            if nome_missione:
+                missione = catalogo_missioni.istanza(nome_missione)
+                missione.attiva = True
+            else:
+                missione = create_random_mission(
+                    int(request.form.get('nemici', 3)),
+                    ambiente=request.form.get('ambiente') or None,
+                    strategia=request.form.get('strategia') or None
+                )
+            giocatori, inventari = LoadBattleCharacters(char_ids)
+            battaglia = Battaglia(missione, giocatori, inventari)
+
+            canale = CanaleMessaggi(BATTAGLIA_MAX_MESSAGGI)
+            canale.aggiungi(
+                f"Inizia la missione '{missione.nome}' ({missione.ambiente.nome}): "
+                f"{len(giocatori)} personaggi contro {len(missione.nemici)} nemici"
+            )
+            _salva_battaglia(battaglia, canale)
+            logger.info(f"Battaglia avviata da {current_user.email}: {len(giocatori)} vs {len(missione.nemici)}")
+            return redirect(url_for('battle.test_battle'))
+
+        except ValueError as e:
+            flash(str(e), "danger")
+            return redirect(url_for('battle.begin_battle'))
+
+    return render_template(
+        'begin_battle.html',
+        personaggi=personaggi_utente,
+        max_nemici=BATTAGLIA_MAX_NEMICI,
+        missioni=catalogo_missioni.nomi()
+    )
 
 #---------------------------SELECT_CHAR-----------------------------------
 @battle_bp.route('/select_char', methods=['GET', 'POST'])
@@ -28,5 +109,75 @@ def select_char():
 
 #---------------------------TEST BATTLE-----------------------------------
 @battle_bp.route('/test_battle', methods=['GET', 'POST'])
+@login_required
 def test_battle():
-    pass
+    """
+    Turno della battaglia in corso: con POST il personaggio giocabile di
+    turno usa un oggetto (opzionale) e attacca, poi i nemici agiscono
+    secondo la strategia della missione fino al prossimo giocatore.
+    """
+    stato = session.get('battaglia')
+    if not stato:
+        flash("Nessuna battaglia in corso", "warning")
+        return redirect(url_for('battle.begin_battle'))
+
+    battaglia = Battaglia.from_dict(stato)
+    gia_finita = battaglia.finita
+    canale = _messaggi_battaglia()
+    # ultimo messaggio già mostrato: la pagina evidenzia quelli nuovi
+    letti = canale.ultimo
+
+    if request.method == 'POST' and not gia_finita:
+        try:
+            canale.estendi(battaglia.azione_giocatore(
+                request.form['bersaglio'],
+                oggetto_id=request.form.get('oggetto') or None,
+                bersaglio_oggetto_id=request.form.get('bersaglio_oggetto') or None
+            ))
+        except (KeyError, ValueError) as e:
+            flash(str(e) if isinstance(e, ValueError) else "Scegli un bersaglio", "danger")
+
+    if not gia_finita:
+        messaggi = battaglia.avanza()
+        if battaglia.finita:
+            # l'ultimo messaggio è l'esito della missione
+            canale.estendi(messaggi[:-1])
+            canale.aggiungi(messaggi[-1], SUCCESSO if battaglia.esito == VITTORIA else ERRORE)
+            if not SaveBattleResult(battaglia):
+                flash("Errore nel salvataggio degli inventari", "danger")
+        else:
+            canale.estendi(messaggi)
+    _salva_battaglia(battaglia, canale)
+
+    attore = battaglia.di_turno
+    return render_template(
+        'battle.html',
+        battaglia=battaglia,
+        giocatori=battaglia.combattenti[:battaglia.giocatori],
+        nemici_vivi=[battaglia.combattenti[i] for i in sorted(battaglia.vivi[NEMICI])],
+        attore=battaglia.combattenti[attore] if attore is not None else None,
+        inventario=battaglia.inventari[attore] if attore is not None else None,
+        messaggi=canale.dopo(0),
+        letti=letti
+    )
+
+
+#---------------------------BATTLE MESSAGES-------------------------------
+@battle_bp.route('/battle_messages')
+@login_required
+def battle_messages():
+    """
+    Messaggi della battaglia in corso successivi al cursore ?dopo=<id>,
+    per aggiornare la pagina senza ricaricare tutto lo storico.
+    """
+    try:
+        cursore = int(request.args.get('dopo', 0))
+    except ValueError:
+        return jsonify({'success': False, 'error': "Cursore non valido"}), 400
+    canale = _messaggi_battaglia()
+    return jsonify({
+        'success': True,
+        'messaggi': canale.dopo(cursore),
+        'ultimo': canale.ultimo,
+        'finita': Battaglia.from_dict(session['battaglia']).finita if session.get('battaglia') else True
+    })
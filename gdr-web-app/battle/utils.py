@@ -0,0 +1,145 @@
+import random
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from gioco.personaggio import Personaggio
+from gioco.inventario import Inventario
+from gioco.missione import Missione
+from gioco.strategy import StrategiaFactory
+from gioco.battaglia import Battaglia, ambiente_per_nome
+from gioco.schemas.personaggio import PersonaggioSchema
+from characters.utils import LoadCharacterJson, create_character_instance, get_character_classes
+from inventory.utils import (
+    LoadInventoriesForOwners, apply_inventory_changes, create_object_instance,
+    get_object_classes, inventario_schema
+)
+
+# Setup logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+schema = PersonaggioSchema()
+
+# Limite ai nemici di una missione casuale
+BATTAGLIA_MAX_NEMICI = 500
+
+# Messaggi della battaglia tenuti in sessione
+BATTAGLIA_MAX_MESSAGGI = 200
+
+# Oggetti che un nemico di una missione casuale può avere (quelli usati
+# dalle strategie), ognuno con questa probabilità
+OGGETTI_NEMICI = ("PozioneCura", "BombaAcida")
+NEMICI_PROB_OGGETTO = 0.5
+
+# ------------------------CREAZIONE BATTAGLIA------------------------------
+def create_random_mission(
+    numero_nemici: int,
+    ambiente: Optional[str] = None,
+    strategia: Optional[str] = None,
+    rng: Optional[random.Random] = None
+) -> Missione:
+    """
+    Crea una missione con nemici di classe casuale, ognuno con pozioni e
+    bombe casuali (OGGETTI_NEMICI), e un premio casuale.
+
+    Args:
+        numero_nemici (int): Numero di nemici (1..BATTAGLIA_MAX_NEMICI)
+        ambiente (Optional[str]): Nome ambiente, casuale se assente
+        strategia (Optional[str]): Strategia dei nemici, casuale se assente
+        rng (Optional[random.Random]): Generatore (opzionale)
+
+    Returns:
+        Missione: Missione pronta per la battaglia
+
+    Raises:
+        ValueError: Se numero, ambiente o strategia non sono validi
+    """
+    rng = rng or random.Random()
+    if not 1 <= numero_nemici <= BATTAGLIA_MAX_NEMICI:
+        raise ValueError(f"I nemici devono essere tra 1 e {BATTAGLIA_MAX_NEMICI}")
+
+    classi = sorted(get_character_classes())
+    ambiente = ambiente or rng.choice(["Foresta", "Vulcano", "Palude"])
+    nemici = []
+    inventari_nemici = {}
+    for i in range(numero_nemici):
+        nemico = create_character_instance(f"Nemico {i + 1}", rng.choice(classi))
+        nemico.npc = True
+        nemici.append(nemico)
+        oggetti = [
+            create_object_instance(classe) for classe in OGGETTI_NEMICI
+            if rng.random() < NEMICI_PROB_OGGETTO
+        ]
+        if oggetti:
+            inventari_nemici[nemico.nome] = oggetti
+
+    return Missione(
+        nome="Missione casuale",
+        ambiente=ambiente_per_nome(ambiente),
+        nemici=nemici,
+        premi=[create_object_instance(rng.choice(sorted(get_object_classes())))],
+        inventari_nemici=inventari_nemici,
+        strategia_nemici=(
+            StrategiaFactory.usa_strategia(strategia)
+            if strategia else StrategiaFactory.strategia_random(rng)
+        ),
+        attiva=True,
+    )
+
+def LoadBattleCharacters(char_ids: List[str]) -> Tuple[List[Personaggio], Dict[str, Inventario]]:
+    """
+    Carica i personaggi giocabili e i loro inventari per una battaglia.
+
+    Args:
+        char_ids (List[str]): IDs dei personaggi (già verificati come
+            posseduti dall'utente)
+
+    Returns:
+        Tuple[List[Personaggio], Dict[str, Inventario]]: personaggi e
+        inventari per ID personaggio
+
+    Raises:
+        ValueError: Se un personaggio non viene trovato
+    """
+    giocatori = []
+    for char_id in char_ids:
+        char_dict = LoadCharacterJson(char_id)
+        if not char_dict:
+            raise ValueError(f"Personaggio non trovato: {char_id}")
+        giocatori.append(schema.load(char_dict))
+
+    inventari = {
+        owner_id: inventario_schema.load(inv_dict)
+        for owner_id, inv_dict in LoadInventoriesForOwners(char_ids).items()
+    }
+    return giocatori, inventari
+
+# ------------------------FINE BATTAGLIA-----------------------------------
+def SaveBattleResult(battaglia: Battaglia) -> bool:
+    """
+    Riporta sugli inventari salvati dei giocatori gli oggetti consumati e
+    i premi ricevuti in battaglia (con lock e rilettura per inventario).
+
+    Args:
+        battaglia (Battaglia): Battaglia conclusa
+
+    Returns:
+        bool: True se tutti gli inventari sono stati aggiornati
+    """
+    premi = {str(premio.id) for premio in battaglia.missione.premi}
+    esito = True
+
+    for inventario in battaglia.inventari[:battaglia.giocatori]:
+        if inventario.id_proprietario is None:
+            continue
+        ricevuti = [ogg for ogg in inventario.oggetti if str(ogg.id) in premi]
+        if not ricevuti and not battaglia.usati:
+            continue
+        # gli ID degli oggetti sono unici: quelli di altri inventari sono ignorati
+        success, message = apply_inventory_changes(
+            inventario_schema.dump(inventario), battaglia.usati, ricevuti
+        )
+        if not success:
+            logger.error(f"Esito battaglia non salvato per {inventario.id_proprietario}: {message}")
+            esito = False
+    return esito
@@ -0,0 +1,70 @@
+"""
+Benchmark del caricamento dei personaggi: validazione completa Marshmallow
+contro caricamento "trusted" dei file con versione dello schema e checksum.
+
+Uso (dalla cartella gdr-web-app):
+    python -m benchmarks.bench_caricamento [numero_personaggi]
+"""
+import sys
+import time
+import random
+import logging
+import tempfile
+
+import gioco.classi  # noqa: F401  registra le sottoclassi di Personaggio
+from characters import utils as char_utils
+from utils.storage import DirectoryStore, unstamp
+
+logging.disable(logging.CRITICAL)
+
+
+def genera_personaggi(store: DirectoryStore, numero: int) -> list:
+    """
+    Scrive `numero` personaggi casuali nello store con SaveCharacterJson.
+    """
+    classi = list(char_utils.get_character_classes())
+    ids = []
+    for i in range(numero):
+        pg = char_utils.create_character_instance(f"Pg {i}", random.choice(classi))
+        char_utils.SaveCharacterJson(char_utils.schema.dump(pg))
+        ids.append(str(pg.id))
+    return ids
+
+
+def misura(descrizione: str, funzione, *args) -> float:
+    inizio = time.perf_counter()
+    funzione(*args)
+    durata = time.perf_counter() - inizio
+    print(f"{descrizione:<40} {durata * 1000:10.1f} ms")
+    return durata
+
+
+def main(numero: int = 10_000) -> None:
+    with tempfile.TemporaryDirectory() as cartella:
+        store = DirectoryStore(cartella)
+        char_utils.character_store = store
+        ids = genera_personaggi(store, numero)
+        raw = store.get_many(ids)
+        print(f"{numero} personaggi generati in {cartella}")
+
+        def validazione_completa():
+            for data in raw.values():
+                char_utils.schema.dump(char_utils.schema.load(unstamp(data)))
+
+        def validazione_trusted():
+            for data in raw.values():
+                char_utils._validate_character(data)
+
+        lenta = misura("load + dump Marshmallow", validazione_completa)
+        veloce = misura("trusted (versione + checksum)", validazione_trusted)
+        print(f"speedup: {lenta / veloce:.1f}x")
+
+        # Cache grande abbastanza da contenere tutti i personaggi
+        char_utils.character_cache.clear()
+        char_utils.character_cache.maxsize = numero
+        misura("LoadMultipleCharactersJson (cache fredda)", char_utils.LoadMultipleCharactersJson, ids)
+        misura("LoadMultipleCharactersJson (cache calda)", char_utils.LoadMultipleCharactersJson, ids)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
@@ -0,0 +1,68 @@
+"""
+Benchmark dei codec dei file di gioco (utils.salvataggio): dimensione su
+disco, tempo di codifica e tempo di decodifica di personaggi e inventari.
+
+Uso (dalla cartella gdr-web-app):
+    python -m benchmarks.bench_codec [numero_record]
+"""
+import gc
+import sys
+import time
+import logging
+
+import gioco.classi  # noqa: F401  registra le sottoclassi di Personaggio
+from characters import utils as char_utils
+from inventory import utils as inv_utils
+from gioco.oggetto import PozioneCura, BombaAcida, Medaglione
+from utils.storage import stamp
+from utils.salvataggio import CODECS, decodifica
+
+logging.disable(logging.CRITICAL)
+
+
+def genera_record(numero: int) -> list:
+    """
+    Personaggi e inventari (con tre oggetti) già serializzati e firmati,
+    come li scrivono SaveCharacterJson e SaveInventoryJson.
+    """
+    classi = list(char_utils.get_character_classes())
+    records = []
+    for i in range(numero):
+        pg = char_utils.create_character_instance(f"Pg {i}", classi[i % len(classi)])
+        inv = inv_utils.create_character_inventory(str(pg.id), PozioneCura())
+        inv.aggiungi_oggetto(BombaAcida())
+        inv.aggiungi_oggetto(Medaglione())
+        records.append(stamp(char_utils.schema.dump(pg), char_utils.CHARACTER_SCHEMA_VERSION))
+        records.append(stamp(inv_utils.inventario_schema.dump(inv), inv_utils.INVENTORY_SCHEMA_VERSION))
+    return records
+
+
+def main(numero: int = 5_000) -> None:
+    records = genera_record(numero)
+    print(f"{len(records)} record (personaggi + inventari)")
+    print(f"{'codec':<15} {'KB':>10} {'codifica ms':>12} {'decodifica ms':>14}")
+
+    base = None
+    gc.disable()  # le raccolte durante le misure falsano il confronto
+    for nome, codec in CODECS.items():
+        gc.collect()
+        inizio = time.perf_counter()
+        codificati = [codec.codifica(record) for record in records]
+        t_codifica = time.perf_counter() - inizio
+
+        inizio = time.perf_counter()
+        decodificati = [decodifica(contenuto) for contenuto in codificati]
+        t_decodifica = time.perf_counter() - inizio
+
+        assert decodificati == records, f"round trip non esatto con {nome}"
+        dimensione = sum(len(contenuto) for contenuto in codificati)
+        base = base or dimensione
+        print(
+            f"{nome:<15} {dimensione / 1024:10.1f} {t_codifica * 1000:12.1f} "
+            f"{t_decodifica * 1000:14.1f}   ({dimensione / base:.0%} di 'json')"
+        )
+    gc.enable()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5_000)
@@ -0,0 +1,72 @@
+"""
+Benchmark dell'inventario indicizzato (gioco.inventario.OggettiInventario)
+rispetto alla lista semplice usata prima: rimozione per ID, uso di un
+oggetto e statistiche per classe su inventari molto grandi.
+
+Uso (dalla cartella gdr-web-app):
+    python -m benchmarks.bench_inventario [numero_oggetti]
+"""
+import sys
+import time
+import random
+import logging
+
+from gioco.inventario import Inventario
+from gioco.oggetto import PozioneCura, BombaAcida, Medaglione
+
+logging.disable(logging.CRITICAL)
+
+OPERAZIONI = 100
+
+
+def genera_oggetti(numero: int) -> list:
+    classi = (PozioneCura, BombaAcida, Medaglione)
+    return [classi[i % len(classi)]() for i in range(numero)]
+
+
+def misura_lista(oggetti: list, da_rimuovere: list) -> tuple:
+    """Vecchio comportamento: scansione della lista per ogni operazione."""
+    lista = list(oggetti)
+    inizio = time.perf_counter()
+    for oggetto_id in da_rimuovere:
+        for oggetto in lista:
+            if str(oggetto.id) == oggetto_id:
+                lista.remove(oggetto)
+                break
+    t_rimozione = time.perf_counter() - inizio
+    inizio = time.perf_counter()
+    for _ in range(OPERAZIONI):
+        conteggi = {}
+        for oggetto in lista:
+            conteggi[oggetto.classe] = conteggi.get(oggetto.classe, 0) + 1
+        sum(oggetto.valore for oggetto in lista)
+    t_statistiche = time.perf_counter() - inizio
+    return t_rimozione, t_statistiche
+
+
+def misura_indice(oggetti: list, da_rimuovere: list) -> tuple:
+    inventario = Inventario(oggetti=oggetti)
+    inizio = time.perf_counter()
+    for oggetto_id in da_rimuovere:
+        inventario.rimuovi_oggetto(oggetto_id)
+    t_rimozione = time.perf_counter() - inizio
+    inizio = time.perf_counter()
+    for _ in range(OPERAZIONI):
+        inventario.conteggi_per_classe()
+        inventario.valore_totale()
+    t_statistiche = time.perf_counter() - inizio
+    return t_rimozione, t_statistiche
+
+
+def main(numero: int = 10_000) -> None:
+    oggetti = genera_oggetti(numero)
+    da_rimuovere = [str(o.id) for o in random.Random(0).sample(oggetti, min(OPERAZIONI, numero))]
+    print(f"{numero} oggetti, {len(da_rimuovere)} rimozioni per ID, {OPERAZIONI} statistiche")
+    print(f"{'':<10} {'rimozioni ms':>13} {'statistiche ms':>15}")
+    for nome, misura in (("lista", misura_lista), ("indice", misura_indice)):
+        t_rimozione, t_statistiche = misura(oggetti, da_rimuovere)
+        print(f"{nome:<10} {t_rimozione * 1000:13.2f} {t_statistiche * 1000:15.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
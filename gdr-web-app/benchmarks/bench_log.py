@@ -0,0 +1,70 @@
+"""
+Benchmark del log degli eventi (utils.log): tempo speso da chi chiama
+scrivi_log con la scrittura in coda rispetto all'apertura del file per ogni
+riga, e tempo di lettura degli ultimi eventi rispetto alla lettura
+dell'intero file.
+
+Uso (dalla cartella gdr-web-app):
+    python -m benchmarks.bench_log [numero_eventi]
+"""
+import os
+import sys
+import time
+import shutil
+import logging
+import tempfile
+from datetime import datetime
+
+from utils.log import ScrittoreLog, leggi_log, FORMATO_DATA, _timestamp
+
+logging.disable(logging.CRITICAL)
+
+
+def scrivi_per_riga(file_path: str, messaggio: str) -> None:
+    """Vecchio Log.scrivi_log: un open in append per ogni evento."""
+    with open(file_path, "a", encoding="utf-8") as file:
+        file.write(f"{datetime.now().strftime(FORMATO_DATA)} - {messaggio}\n")
+
+
+def main(numero: int = 100_000) -> None:
+    cartella = tempfile.mkdtemp()
+    try:
+        messaggi = [f"Evento {i}: Aria infligge {i % 80} danni a Bruno" for i in range(numero)]
+
+        vecchio = os.path.join(cartella, "vecchio.txt")
+        inizio = time.perf_counter()
+        for messaggio in messaggi:
+            scrivi_per_riga(vecchio, messaggio)
+        t_vecchio = time.perf_counter() - inizio
+
+        # Senza rotazione per confrontare gli stessi byte
+        scrittore = ScrittoreLog(os.path.join(cartella, "log.txt"), max_bytes=0, max_eta=0)
+        inizio = time.perf_counter()
+        for messaggio in messaggi:
+            scrittore.scrivi(f"{_timestamp()} - {messaggio}\n")
+        t_coda = time.perf_counter() - inizio
+        scrittore.flush()
+        t_disco = time.perf_counter() - inizio
+        scrittore.chiudi()
+
+        print(f"{numero} eventi")
+        print(f"open per riga:     {t_vecchio * 1000:9.1f} ms")
+        print(f"in coda:           {t_coda * 1000:9.1f} ms (su disco dopo {t_disco * 1000:.1f} ms, "
+              f"{scrittore.scritture} write)")
+
+        inizio = time.perf_counter()
+        with open(vecchio, "r", encoding="utf-8") as file:
+            tutte = file.read().splitlines()[-100:]
+        t_tutto = time.perf_counter() - inizio
+        inizio = time.perf_counter()
+        ultime = leggi_log(0, 100, file_path=scrittore.file_path, backup=0)
+        t_coda_lettura = time.perf_counter() - inizio
+        assert [r.split(" - ", 1)[1] for r in ultime] == [r.split(" - ", 1)[1] for r in tutte]
+        print(f"ultimi 100, intero file: {t_tutto * 1000:7.2f} ms")
+        print(f"ultimi 100, dal fondo:   {t_coda_lettura * 1000:7.2f} ms")
+    finally:
+        shutil.rmtree(cartella)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,99 @@
+"""
+Benchmark delle interrogazioni su tutti gli inventari (inventory/query.py)
+rispetto alla lettura di ogni file con FindObjectsInInventory: "tutte le
+BombaAcida con valore > 40 raggruppate per classe del proprietario".
+
+Uso (dalla cartella gdr-web-app):
+    python -m benchmarks.bench_query [numero_inventari] [oggetti_per_inventario]
+"""
+import os
+import sys
+import time
+import random
+import logging
+import tempfile
+
+import gioco.classi  # noqa: F401  registra le sottoclassi di Personaggio
+from characters import utils as char_utils
+from inventory import utils as inv_utils
+from gioco.inventario import Inventario
+from gioco.oggetto import PozioneCura, BombaAcida, Medaglione
+from utils.storage import DirectoryStore, DirectoryIds, OwnerIndex
+
+logging.disable(logging.CRITICAL)
+
+CRITERI = {'tipo': 'BombaAcida', 'valore_min': 41}
+INTERROGAZIONI = 100
+
+
+def genera_inventari(numero: int, oggetti: int) -> None:
+    """Scrive `numero` personaggi casuali, ognuno con il proprio inventario."""
+    casuale = random.Random(0)
+    classi = list(char_utils.get_character_classes())
+    for i in range(numero):
+        pg = char_utils.create_character_instance(f"Pg {i}", casuale.choice(classi))
+        char_utils.SaveCharacterJson(char_utils.schema.dump(pg))
+        inv_utils.SaveInventoryJson(Inventario(id_proprietario=pg.id, oggetti=[
+            casuale.choice((PozioneCura, BombaAcida, Medaglione))(valore=casuale.randint(1, 80))
+            for _ in range(oggetti)
+        ]))
+
+
+def per_file() -> dict:
+    """Senza indice: legge tutti gli inventari e i loro proprietari."""
+    gruppi = {}
+    for file_id in inv_utils.GetAllInventoryFiles():
+        inventario = inv_utils._LoadInventoryFile(file_id, memorizza=False)
+        trovati = inv_utils.FindObjectsInInventory(inventario, CRITERI)
+        if trovati:
+            classe = char_utils.LoadCharacterJson(inventario['id_proprietario'])['classe']
+            gruppi[classe] = gruppi.get(classe, 0) + len(trovati)
+    return gruppi
+
+
+def main(numero: int = 2_000, oggetti: int = 50) -> None:
+    with tempfile.TemporaryDirectory() as cartella:
+        char_utils.character_store = DirectoryStore(os.path.join(cartella, 'pg'))
+        inv_utils.DATA_DIR_INV = os.path.join(cartella, 'inv')
+        os.makedirs(char_utils.character_store.base_dir)
+        os.makedirs(inv_utils.DATA_DIR_INV)
+        inv_utils.inventory_ids = DirectoryIds(inv_utils.DATA_DIR_INV)
+        inv_utils.inventory_index = OwnerIndex(
+            inv_utils.DATA_DIR_INV, os.path.join(cartella, 'index.json'), 'id_proprietario'
+        )
+        from inventory.query import IndiceInventari
+        inv_utils.inventory_listeners.clear()
+
+        genera_inventari(numero, oggetti)
+        print(f"{numero} inventari, {numero * oggetti} oggetti")
+
+        inizio = time.perf_counter()
+        atteso = per_file()
+        t_file = time.perf_counter() - inizio
+
+        indice = IndiceInventari(inv_utils.DATA_DIR_INV, intervallo_sync=0)
+        inv_utils.inventory_listeners.append(indice.aggiorna_file)
+        inizio = time.perf_counter()
+        indice.ricostruisci()
+        t_costruzione = time.perf_counter() - inizio
+
+        inizio = time.perf_counter()
+        for _ in range(INTERROGAZIONI):
+            risultato = indice.interroga(CRITERI, raggruppa='classe_proprietario')
+        t_indice = (time.perf_counter() - inizio) / INTERROGAZIONI
+        assert {g['classe_proprietario']: g['numero'] for g in risultato['gruppi']} == atteso
+
+        inizio = time.perf_counter()
+        inv_utils.SaveInventoryJson(Inventario(
+            id_proprietario=next(iter(indice._blocchi)), oggetti=[BombaAcida(valore=60)]
+        ))
+        t_salvataggio = time.perf_counter() - inizio
+
+        print(f"lettura di ogni file:        {t_file * 1000:9.1f} ms")
+        print(f"costruzione indice:          {t_costruzione * 1000:9.1f} ms (una volta)")
+        print(f"interrogazione sull'indice:  {t_indice * 1000:9.3f} ms")
+        print(f"salvataggio + aggiornamento: {t_salvataggio * 1000:9.3f} ms")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
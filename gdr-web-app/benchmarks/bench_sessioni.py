@@ -0,0 +1,75 @@
+"""
+Benchmark delle sessioni lato server: un file per sessione (Flask-Session
+'filesystem', usato prima) rispetto al database SQLite di utils/sessioni.py.
+Ogni richiesta legge la sessione di un utente fra `numero_sessioni` attive;
+una su dieci la modifica.
+
+Uso (dalla cartella gdr-web-app):
+    python -m benchmarks.bench_sessioni [numero_sessioni] [richieste]
+"""
+import os
+import sys
+import time
+import random
+import logging
+import tempfile
+
+from flask import Flask, session
+from flask_session.filesystem import FileSystemSessionInterface
+
+from utils.sessioni import SqliteSessionInterface
+
+logging.disable(logging.CRITICAL)
+
+
+def crea_app(interfaccia) -> Flask:
+    app = Flask(__name__)
+    app.secret_key = "benchmark"
+    app.session_interface = interfaccia(app)
+
+    @app.route("/login/<int:utente>")
+    def login(utente):
+        session["_user_id"] = str(utente)
+        session["personaggi_ids"] = [f"pg-{utente}-{i}" for i in range(10)]
+        return ""
+
+    @app.route("/gioca/<int:turno>")
+    def gioca(turno):
+        if turno % 10 == 0:
+            session["turno"] = turno
+        return session.get("_user_id", "")
+
+    return app
+
+
+def misura(app: Flask, numero: int, richieste: int) -> float:
+    clients = []
+    for utente in range(numero):
+        client = app.test_client()
+        client.get(f"/login/{utente}")
+        clients.append(client)
+    casuale = random.Random(0)
+    inizio = time.perf_counter()
+    for turno in range(richieste):
+        casuale.choice(clients).get(f"/gioca/{turno}")
+    return (time.perf_counter() - inizio) / richieste
+
+
+def main(numero: int = 2_000, richieste: int = 5_000) -> None:
+    with tempfile.TemporaryDirectory() as cartella:
+        file_dir = os.path.join(cartella, "flask_session")
+        backend = {
+            "filesystem": lambda app: FileSystemSessionInterface(
+                app, cache_dir=file_dir, threshold=numero * 2
+            ),
+            "sqlite": lambda app: SqliteSessionInterface(app, os.path.join(cartella, "sessioni.db")),
+        }
+        print(f"{numero} sessioni attive, {richieste} richieste")
+        for nome, interfaccia in backend.items():
+            t = misura(crea_app(interfaccia), numero, richieste)
+            print(f"{nome:<10} {t * 1000:8.3f} ms/richiesta")
+        print(f"file in flask_session/: {len(os.listdir(file_dir))}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,301 @@
+"""
+Benchmark e verifica statistica delle decisioni vettoriali degli NPC
+(Strategia.decidi_batch) contro il percorso un NPC alla volta
+(Strategia.uso_inventario_npc).
+
+Per ogni strategia le azioni dei due percorsi, ripetute su una missione
+con NPC di salute e inventari diversi, sono confrontate per scenario
+(salute sotto 40/60, oggetti presenti) con un test chi quadro
+sull'omogeneità delle frequenze.
+
+Lo stesso confronto si ripete dentro una Battaglia, con gli oggetti dei
+nemici dati dalla missione (inventari_nemici): Battaglia.avanza, che
+decide tutti i nemici insieme con _decisioni_npc, contro azione_npc
+senza decisione, che chiama uso_inventario_npc per ogni nemico.
+
+Uso (dalla cartella gdr-web-app):
+    python -m benchmarks.bench_strategia [numero_npc] [ripetizioni]
+"""
+import sys
+import copy
+import time
+import random
+import logging
+from typing import Tuple
+
+import numpy as np
+
+from gioco.inventario import Inventario
+from gioco.oggetto import PozioneCura, BombaAcida, Medaglione
+from gioco.classi import Guerriero, Ladro
+from gioco.missione import Missione
+from gioco.battaglia import Battaglia, NEMICI
+from gioco.strategy import (
+    StrategiaFactory, decisioni_npc, matrici_inventari,
+    NESSUNA_AZIONE, USA_POZIONE, USA_BOMBA
+)
+
+logging.disable(logging.CRITICAL)
+
+STRATEGIE = ("aggressiva", "difensiva", "equilibrata")
+AZIONI = (NESSUNA_AZIONE, USA_POZIONE, USA_BOMBA)
+
+# Valori critici del chi quadro con alpha = 0.001 per 1 e 2 gradi di libertà
+CHI2_CRITICO = {1: 10.83, 2: 13.82}
+
+# Nemici della verifica in battaglia (ognuno esegue un turno completo, attacco compreso)
+NPC_BATTAGLIA = 200
+
+
+def genera_npc(numero: int, seed: int = 0):
+    """
+    Salute e inventari di una missione: metà degli NPC sotto i 60 punti,
+    inventari con e senza pozioni e bombe (e oggetti irrilevanti).
+    """
+    rng = random.Random(seed)
+    salute = [rng.randint(1, 120) for _ in range(numero)]
+    inventari = []
+    for _ in range(numero):
+        oggetti = [Medaglione()] if rng.random() < 0.3 else []
+        if rng.random() < 0.6:
+            oggetti.append(PozioneCura())
+        if rng.random() < 0.6:
+            oggetti.append(BombaAcida())
+        rng.shuffle(oggetti)
+        inventari.append(Inventario(oggetti=oggetti))
+    return salute, inventari
+
+
+def azione_da_risultato(risultato) -> int:
+    # uso_inventario_npc restituisce la cura (> 0) o il danno (< 0)
+    if risultato is None:
+        return NESSUNA_AZIONE
+    return USA_POZIONE if risultato > 0 else USA_BOMBA
+
+
+def turno_singolo(strategia, salute, inventari, rng) -> np.ndarray:
+    """
+    Un turno con il percorso per NPC; gli oggetti usati vengono rimessi
+    per ripetere il turno con gli stessi inventari.
+    """
+    azioni = np.empty(len(salute), dtype=np.int8)
+    for i, (vita, inventario) in enumerate(zip(salute, inventari)):
+        oggetti = list(inventario.oggetti)
+        azioni[i] = azione_da_risultato(
+            strategia.uso_inventario_npc(vita, inventario, None, rng)
+        )
+        inventario.oggetti = oggetti
+    return azioni
+
+
+def scenari(salute, inventari) -> np.ndarray:
+    # Scenario di ogni NPC: tutto ciò da cui dipende la decisione
+    pozioni, bombe = matrici_inventari(inventari)
+    salute = np.asarray(salute)
+    return (
+        (salute < 40).astype(int) * 8 + (salute < 60).astype(int) * 4
+        + pozioni.astype(int) * 2 + bombe.astype(int)
+    )
+
+
+def chi_quadro(conteggi_a: np.ndarray, conteggi_b: np.ndarray):
+    """
+    Test chi quadro di omogeneità su una tabella 2 x azioni (le azioni mai
+    osservate sono escluse).
+
+    Returns:
+        (statistica, gradi di libertà)
+    """
+    tabella = np.vstack([conteggi_a, conteggi_b]).astype(float)
+    tabella = tabella[:, tabella.sum(axis=0) > 0]
+    if tabella.shape[1] < 2:
+        return 0.0, 0
+    attesi = tabella.sum(axis=1, keepdims=True) * tabella.sum(axis=0) / tabella.sum()
+    return float(((tabella - attesi) ** 2 / attesi).sum()), tabella.shape[1] - 1
+
+
+def confronta(nome: str, gruppi: np.ndarray, singolo: np.ndarray, batch: np.ndarray) -> bool:
+    """
+    Confronta per scenario le azioni dei due percorsi e stampa le
+    frequenze complessive.
+
+    Returns:
+        bool: True se nessuno scenario ha distribuzioni diverse
+    """
+    esito = True
+    for gruppo in np.unique(gruppi):
+        maschera = gruppi == gruppo
+        conta_singolo = np.array([(singolo[maschera] == a).sum() for a in AZIONI])
+        conta_batch = np.array([(batch[maschera] == a).sum() for a in AZIONI])
+        statistica, gradi = chi_quadro(conta_singolo, conta_batch)
+        if gradi and statistica > CHI2_CRITICO[gradi]:
+            print(f"  {nome}: scenario {gruppo} diverso (chi2={statistica:.1f}, gdl={gradi})")
+            esito = False
+    frequenze = [f"{(batch == a).mean():.3f}/{(singolo == a).mean():.3f}" for a in AZIONI]
+    print(f"{nome:<12} azioni batch/singolo (nessuna, pozione, bomba): {', '.join(frequenze)}")
+    return esito
+
+
+def verifica(nome: str, salute, inventari, ripetizioni: int) -> bool:
+    strategia = StrategiaFactory.usa_strategia(nome)
+    rng = random.Random(1)
+    rng_np = np.random.default_rng(1)
+    gruppi = scenari(salute, inventari)
+
+    singolo = np.concatenate([
+        turno_singolo(strategia, salute, inventari, rng) for _ in range(ripetizioni)
+    ])
+    batch = np.concatenate([
+        decisioni_npc(strategia, salute, inventari, rng_np) for _ in range(ripetizioni)
+    ])
+    return confronta(nome, np.tile(gruppi, ripetizioni), singolo, batch)
+
+
+def missione_npc(nome: str, salute, inventari) -> Missione:
+    """
+    Missione con un nemico per NPC: salute data e oggetti di partenza in
+    inventari_nemici (la Battaglia ne copia uno nuovo a ogni partita).
+    """
+    nemici = []
+    for i, vita in enumerate(salute):
+        nemico = Ladro(nome=f"NPC {i}", npc=True)
+        nemico.salute = vita
+        nemici.append(nemico)
+    return Missione(
+        nome="Verifica strategie",
+        nemici=nemici,
+        inventari_nemici={
+            f"NPC {i}": list(inventario.oggetti)
+            for i, inventario in enumerate(inventari) if inventario.oggetti
+        },
+        strategia_nemici=StrategiaFactory.usa_strategia(nome),
+    )
+
+
+def primo_round(missione: Missione, seed: int, insieme: bool) -> Tuple[np.ndarray, float]:
+    """
+    Primo round di una battaglia in cui tutti i nemici agiscono prima
+    dell'unico giocatore (destrezza minima, salute che regge gli attacchi).
+    L'azione di ogni nemico si ricava dagli oggetti che mancano dal suo
+    inventario a fine round.
+
+    Args:
+        missione (Missione): missione di missione_npc
+        seed (int): seme della battaglia
+        insieme (bool): True per Battaglia.avanza, False per azione_npc
+            senza decisione (uso_inventario_npc)
+
+    Returns:
+        Tuple[np.ndarray, float]: azione di ogni nemico e secondi del round
+    """
+    # ogni partita su nemici nuovi: cure e danni cambiano la salute
+    missione = copy.copy(missione)
+    missione.nemici = [copy.copy(nemico) for nemico in missione.nemici]
+    giocatore = Guerriero(nome="Bersaglio", npc=False, destrezza=-1_000)
+    giocatore.salute_max = giocatore.salute = 10 ** 9
+    battaglia = Battaglia(missione, [giocatore], seed=seed)
+    inventari = battaglia.inventari[battaglia.giocatori:]
+    prima = [inventario.oggetti.conteggi for inventario in inventari]
+
+    inizio = time.perf_counter()
+    if insieme:
+        battaglia.avanza()
+    else:
+        while battaglia.schieramento(battaglia.di_turno) == NEMICI:
+            battaglia.azione_npc()
+    durata = time.perf_counter() - inizio
+    if battaglia.azioni != len(inventari):
+        raise RuntimeError("Il giocatore ha agito prima di tutti i nemici")
+
+    azioni = np.full(len(inventari), NESSUNA_AZIONE, dtype=np.int8)
+    for i, (conteggi, inventario) in enumerate(zip(prima, inventari)):
+        dopo = inventario.oggetti.conteggi
+        if dopo.get("PozioneCura", 0) < conteggi.get("PozioneCura", 0):
+            azioni[i] = USA_POZIONE
+        elif dopo.get("BombaAcida", 0) < conteggi.get("BombaAcida", 0):
+            azioni[i] = USA_BOMBA
+    return azioni, durata
+
+
+def verifica_battaglia(nome: str, salute, inventari, ripetizioni: int) -> bool:
+    missione = missione_npc(nome, salute, inventari)
+    gruppi = scenari(salute, inventari)
+
+    singolo, t_singolo = zip(*(
+        primo_round(missione, seed, insieme=False) for seed in range(ripetizioni)
+    ))
+    batch, t_batch = zip(*(
+        primo_round(missione, seed, insieme=True) for seed in range(ripetizioni)
+    ))
+    singolo, batch = np.concatenate(singolo), np.concatenate(batch)
+    t_singolo, t_batch = sum(t_singolo), sum(t_batch)
+
+    esito = confronta(nome, np.tile(gruppi, ripetizioni), singolo, batch)
+    print(
+        f"{'':<12} round da {len(salute)} nemici: azione_npc {t_singolo / ripetizioni * 1000:.1f} ms, "
+        f"avanza {t_batch / ripetizioni * 1000:.1f} ms"
+    )
+    return esito
+
+
+def misura(nome: str, salute, inventari, ripetizioni: int) -> None:
+    strategia = StrategiaFactory.usa_strategia(nome)
+    rng = random.Random(2)
+    rng_np = np.random.default_rng(2)
+
+    inizio = time.perf_counter()
+    for _ in range(ripetizioni):
+        turno_singolo(strategia, salute, inventari, rng)
+    t_singolo = (time.perf_counter() - inizio) / ripetizioni
+
+    inizio = time.perf_counter()
+    for _ in range(ripetizioni):
+        decisioni_npc(strategia, salute, inventari, rng_np)
+    t_batch = (time.perf_counter() - inizio) / ripetizioni
+
+    # Solo la decisione, con le matrici degli inventari già pronte (restano
+    # valide finché nessun NPC usa un oggetto)
+    pozioni, bombe = matrici_inventari(inventari)
+    vite = np.asarray(salute)
+    inizio = time.perf_counter()
+    for _ in range(ripetizioni):
+        strategia.decidi_batch(vite, pozioni, bombe, rng_np)
+    t_decisione = (time.perf_counter() - inizio) / ripetizioni
+
+    print(
+        f"{nome:<12} per NPC {t_singolo * 1000:7.2f} ms   "
+        f"batch {t_batch * 1000:6.2f} ms ({t_singolo / t_batch:.0f}x)   "
+        f"solo decisione {t_decisione * 1000:6.3f} ms ({t_singolo / t_decisione:.0f}x)"
+    )
+
+
+def main(numero: int = 1_000, ripetizioni: int = 200) -> None:
+    salute, inventari = genera_npc(numero)
+    print(f"{numero} NPC, {ripetizioni} turni per strategia")
+
+    equivalenti = all(
+        [verifica(nome, salute, inventari, ripetizioni) for nome in STRATEGIE]
+    )
+    print("distribuzioni equivalenti" if equivalenti else "DISTRIBUZIONI DIVERSE")
+
+    numero_battaglia = min(numero, NPC_BATTAGLIA)
+    print(f"\nBattaglia: {numero_battaglia} nemici, {ripetizioni} primi round per strategia")
+    in_battaglia = all([
+        verifica_battaglia(
+            nome, salute[:numero_battaglia], inventari[:numero_battaglia], ripetizioni
+        )
+        for nome in STRATEGIE
+    ])
+    print("distribuzioni equivalenti" if in_battaglia else "DISTRIBUZIONI DIVERSE")
+    equivalenti = equivalenti and in_battaglia
+
+    print()
+    for nome in STRATEGIE:
+        misura(nome, salute, inventari, 20)
+
+    if not equivalenti:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
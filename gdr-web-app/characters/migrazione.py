@@ -0,0 +1,72 @@
+"""
+Migrazione dei record personaggio alla versione attuale dello schema
+(CHARACTER_SCHEMA_VERSION), es. lo storico dei danni da lista di tutti i
+colpi a riepilogo compatto (versione 2).
+
+Non è obbligatoria: i record vecchi restano leggibili (vengono validati a
+ogni lettura) e sono riscritti nel nuovo formato al primo salvataggio.
+Migrandoli tutti si torna al caricamento veloce senza validazione.
+
+Uso (dalla cartella gdr-web-app):
+    python -m characters.migrazione
+"""
+import logging
+from typing import Tuple
+
+from characters.utils import (
+    character_store, schema, SaveCharacterJson, CHARACTER_SCHEMA_VERSION
+)
+from utils.storage import unstamp, verify_stamp
+from utils.locks import lock_manager
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Record letti per volta
+MIGRAZIONE_BLOCCO = 500
+
+
+def migra_personaggi(blocco: int = MIGRAZIONE_BLOCCO) -> Tuple[int, int]:
+    """
+    Riscrive nella versione attuale dello schema i record che non lo sono.
+
+    Args:
+        blocco (int): record letti per volta
+
+    Returns:
+        Tuple[int, int]: (record migrati, record non validi)
+    """
+    ids = character_store.ids()
+    migrati = errori = 0
+    for inizio in range(0, len(ids), blocco):
+        records = character_store.get_many(ids[inizio:inizio + blocco])
+        for char_id, data in records.items():
+            if verify_stamp(data, CHARACTER_SCHEMA_VERSION) is not None:
+                continue
+            # Rilettura nel lock usato da edit_char: niente salvataggi persi
+            with lock_manager.write_lock(f"personaggio:{char_id}"):
+                data = character_store.get(char_id)
+                if data is None or verify_stamp(data, CHARACTER_SCHEMA_VERSION) is not None:
+                    continue
+                try:
+                    validato = schema.dump(schema.load(unstamp(data)))
+                except Exception as e:
+                    logger.error(f"Personaggio {char_id} non valido, non migrato: {e}")
+                    errori += 1
+                    continue
+                if SaveCharacterJson(validato):
+                    migrati += 1
+                else:
+                    errori += 1
+    logger.info(f"Migrati {migrati} personaggi su {len(ids)} ({errori} errori)")
+    return migrati, errori
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.WARNING)
+    migrati, errori = migra_personaggi()
+    print(f"Personaggi migrati alla versione {CHARACTER_SCHEMA_VERSION}: {migrati} ({errori} errori)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Copia dei personaggi dai file JSON (backend 'directory') al database del
+backend 'sqlite', con il proprietario di ogni personaggio preso da
+auth.models.UserCharacter (colonna owner_id indicizzata).
+
+Va eseguita prima di avviare l'app con GDR_STORAGE_BACKEND=sqlite: senza
+copia i personaggi esistenti non sono visibili. Si può ripetere (i record
+già copiati vengono sovrascritti con la versione dei file).
+
+Uso (dalla cartella gdr-web-app):
+    python -m characters.migrazione_store
+"""
+import os
+import logging
+from typing import Dict, Tuple
+
+from flask import Flask
+
+from config import BASE_DIR, SQLALCHEMY_DATABASE_URI, DATA_DIR_PGS
+from auth.models import db, UserCharacter
+from utils.storage import get_store, copy_records
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def proprietari_personaggi() -> Dict[str, int]:
+    """
+    Proprietario di ogni personaggio. Va eseguita dentro un app context.
+
+    Returns:
+        Dict[str, int]: char_id -> user_id
+    """
+    return {
+        char_id: user_id for char_id, user_id in
+        db.session.query(UserCharacter.char_id, UserCharacter.user_id)
+    }
+
+
+def migra_store(origine: str = "directory", destinazione: str = "sqlite") -> Tuple[int, int]:
+    """
+    Copia i personaggi da un backend all'altro e controlla, per ogni
+    proprietario, che il backend di destinazione li trovi per owner_id.
+    Va eseguita dentro un app context.
+
+    Returns:
+        Tuple[int, int]: (personaggi copiati, proprietari con personaggi
+        mancanti nella destinazione)
+    """
+    sorgente = get_store('personaggi', DATA_DIR_PGS, origine)
+    target = get_store('personaggi', DATA_DIR_PGS, destinazione)
+    proprietari = proprietari_personaggi()
+    copiati = copy_records(sorgente, target, owners=proprietari)
+
+    incompleti = 0
+    if hasattr(target, 'ids_by_owner'):
+        esistenti = set(sorgente.existing(proprietari))
+        per_utente: Dict[int, set] = {}
+        for char_id, user_id in proprietari.items():
+            if char_id in esistenti:
+                per_utente.setdefault(user_id, set()).add(char_id)
+        for user_id, attesi in per_utente.items():
+            mancanti = attesi - set(target.ids_by_owner(user_id))
+            if mancanti:
+                incompleti += 1
+                logger.warning(f"Utente {user_id}: {len(mancanti)} personaggi senza proprietario nella destinazione")
+    logger.info(f"Personaggi copiati da {origine} a {destinazione}: {copiati}")
+    return copiati, incompleti
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.WARNING)
+    app = Flask(__name__, instance_path=os.path.join(BASE_DIR, 'instance'))
+    app.config['SQLALCHEMY_DATABASE_URI'] = SQLALCHEMY_DATABASE_URI
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        copiati, incompleti = migra_store()
+    print(f"Personaggi copiati nel backend sqlite: {copiati} ({incompleti} utenti con proprietari mancanti)")
+
+
+if __name__ == "__main__":
+    main()
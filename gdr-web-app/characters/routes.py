@@ -1,8 +1,6 @@
-import os
-import json
 import logging
 
-from flask import render_template, request, redirect, url_for, session, abort, flash, jsonify
+from flask import render_template, request, redirect, url_for, session, abort, flash, jsonify, Response
 from flask_login import login_required, current_user
 from . import characters_bp
 from .utils import (
@@ -11,30 +9,40 @@ from .utils import (
     validate_user_can_afford,
 
     # Gestione JSON SOLO personaggi
-    SaveCharacterJson, LoadCharacterJson, DeleteCharacterJson,
-    LoadMultipleCharactersJson, get_user_character_files, filter_owned_characters,
+    SaveCharacterJson, LoadCharacterJson,
+    LoadMultipleCharactersJson, filter_owned_characters,
+    SaveSessionCharacters, LoadSessionCharacters,
 
     # Creazione SOLO personaggi
     create_character_instance,
 
     # Statistiche SOLO personaggi
-    GetUserCharacterCount, GetUserCharacterStatsByClass, GetMostPlayedClass,
+    GetCharacterDamageSummary, GetUserCharacterStats, UpdateCharacterStats,
 
     # Utilità SOLO personaggi
-    update_user_character_ids, find_character_by_id, calculate_character_cost,
-    calculate_character_refund, execute_combat_turn, determine_combat_winner,
-    log_character_operation
+    find_character_by_id, calculate_character_cost,
+    calculate_character_refund, determine_combat_winner,
+    log_character_operation,
+
+    # Replay dei combattimenti
+    SaveReplay, LoadReplay,
+
+    # Transazioni (journal) crediti + personaggio + inventario
+    CreateCharacterTransaction, DeleteCharacterTransaction
 )
 # Import da inventory per funzioni inventario
 from inventory.utils import (
     get_object_classes, validate_object_class, create_object_instance, 
-    create_character_inventory, DeleteInventoryJson, SaveInventoryJson
+    create_character_inventory
 )
-from inventory.routes import salva_inventario_su_json
 
 from gioco.schemas.personaggio import PersonaggioSchema
-from auth.models import User, db
+from gioco.ambiente import AmbienteFactory
+from gioco.simulazione import simula_duelli
+from gioco.duello import Duello, rigioca, ricostruisci, stato_partecipante
 from config import CreateDirs
+from utils.locks import lock_manager
+from utils.sse import evento_sse, SSE_HEADERS
 
 # Setup logging
 logger = logging.getLogger(__name__)
@@ -51,9 +59,6 @@ def load_char():
     Carica IDs dei personaggi posseduti dall'utente confrontando
     file JSON esistenti con character_ids nel database.
     """
-    # Ottieni tutti i file JSON dei personaggi
-    all_char_files = get_user_character_files()
-    
     # Filtra solo quelli posseduti dall'utente
     owned_chars = filter_owned_characters(current_user.character_ids or [])
     
@@ -74,8 +79,6 @@ def create_char():
     """
     CreateDirs()  # Verifica esistenza cartelle
     
-    from app import db
-    
     # Ottieni mapping classi e oggetti disponibili
     classi = get_character_classes()  # da characters.utils
     oggetti = get_object_classes()    # da inventory.utils
@@ -116,22 +119,10 @@ def create_char():
                 flash(credit_error, "danger")
                 return redirect(url_for('auth.personal_area'))
 
-            # Deduzione crediti
-            current_user.crediti -= costo_pg
-
-            # Serializzazione e salvataggio con utils
+            # Salvataggio personaggio e inventario, deduzione crediti e
+            # aggiornamento character_ids in un'unica transazione (journal)
             pg_dict = schema.dump(pg)
-            if not SaveCharacterJson(pg_dict):
-                raise Exception("Errore salvataggio personaggio")
-
-            SaveInventoryJson(inv)  # da inventory.routes
-
-            # Aggiornamento character_ids utente con utils
-            current_user.character_ids = update_user_character_ids(
-                current_user.character_ids, str(pg.id), 'add'
-            )
-
-            db.session.commit()
+            CreateCharacterTransaction(current_user, pg_dict, inv, costo_pg)
 
             # Logging con utils
             log_character_operation(
@@ -142,8 +133,11 @@ def create_char():
             flash(f"Personaggio {pg.nome} creato! Spesi {costo_pg} crediti.", "success")
             return redirect(url_for('characters.show_chars'))
 
+        except ValueError as e:
+            flash(str(e), "danger")
+            return redirect(url_for('auth.personal_area'))
+
         except Exception as e:
-            db.session.rollback()
             logger.error(f"Errore creazione personaggio: {str(e)}")
             flash("Errore durante la creazione", "danger")
 
@@ -162,8 +156,7 @@ def edit_char(char_id):
     e aggiornamento completo dei dati.
     """
     # Verifica ownership del personaggio
-    owned_ids = load_char()
-    if str(char_id) not in owned_ids:
+    if not current_user.owns_character(char_id):
         flash("Personaggio non trovato", "danger")
         return redirect(url_for("characters.show_chars"))
 
@@ -194,15 +187,25 @@ def edit_char(char_id):
                 flash(class_error, "danger")
                 return render_template('char_edit.html', pg=pg_dict, classi=list(classi.keys()))
 
-            # Creazione nuovo oggetto personaggio con utils
-            pg_obj = create_character_instance(nuovo_nome, nuova_classe)
-            # Mantieni ID originale
-            pg_obj.id = pg_dict['id']
+            # Carica-modifica-salva sotto lock esclusivo: altri worker
+            # possono modificare lo stesso personaggio nello stesso momento
+            with lock_manager.write_lock(f"personaggio:{char_id}"):
+                pg_dict = LoadCharacterJson(str(char_id)) or pg_dict
+                vecchio_nome = pg_dict['nome']
+
+                # Creazione nuovo oggetto personaggio con utils
+                pg_obj = create_character_instance(nuovo_nome, nuova_classe)
+                # Mantieni ID originale
+                pg_obj.id = pg_dict['id']
 
-            # Serializzazione e salvataggio con utils
-            updated_dict = schema.dump(pg_obj)
-            if not SaveCharacterJson(updated_dict):
-                raise Exception("Errore salvataggio modifiche")
+                # Serializzazione e salvataggio con utils
+                updated_dict = schema.dump(pg_obj)
+                if not SaveCharacterJson(updated_dict, owner_id=current_user.id):
+                    raise Exception("Errore salvataggio modifiche")
+
+            # Classe e livello nelle statistiche dell'utente; se fallisce
+            # vengono riallineate dalla prossima lettura o da un ricalcolo
+            UpdateCharacterStats(current_user, updated_dict)
 
             # Logging con utils
             log_character_operation(
@@ -244,6 +247,8 @@ def show_chars():
     """
     owned_chars = load_char()
     lista_pers_utente = get_owned_chars(owned_chars)
+    # Usati dal combattimento e dalla battaglia
+    SaveSessionCharacters(session, lista_pers_utente)
     
     logger.info(f"Lista personaggi richiesta - Count: {len(lista_pers_utente)}")
     
@@ -260,17 +265,8 @@ def char_details(char_id):
     Mostra dettagli completi di un personaggio specifico
     con validazione ownership e caricamento sicuro.
     """
-    try:
-        # Caricamento personaggi posseduti con utils
-        owned_chars = load_char()
-        lista_pers = LoadMultipleCharactersJson(owned_chars)
-        
-    except Exception as e:
-        logger.error(f"Errore caricamento lista personaggi: {str(e)}")
-        lista_pers = []
-
-    # Ricerca personaggio per ID con utils
-    pg_dict = find_character_by_id(lista_pers, str(char_id))
+    # Ownership con una query indicizzata, poi il solo personaggio richiesto
+    pg_dict = LoadCharacterJson(str(char_id)) if current_user.owns_character(char_id) else None
 
     if pg_dict is None:
         logger.warning(f"Accesso a personaggio inesistente - ID: {char_id}")
@@ -293,6 +289,11 @@ def char_delete(char_id):
     e rimborso crediti automatico.
     """
     try:
+        # Validazione ownership: solo i propri personaggi
+        if not current_user.owns_character(char_id):
+            flash("Personaggio non trovato", "danger")
+            return redirect(url_for('characters.show_chars'))
+
         # Caricamento dati personaggio con utils
         pg_dict = LoadCharacterJson(str(char_id))
         if not pg_dict:
@@ -301,24 +302,11 @@ def char_delete(char_id):
 
         # Deserializzazione per rimborso crediti
         pg_obj = schema.load(pg_dict)
-
-        # Eliminazione file personaggio e inventario con utils
-        if not DeleteCharacterJson(str(char_id)):
-            logger.warning(f"Problemi eliminazione file personaggio {char_id}")
-            
-        if not DeleteInventoryJson(str(char_id)):  # da inventory.utils
-            logger.warning(f"Problemi eliminazione inventario {char_id}")
-
-        # Rimozione UUID dalla lista utente con utils
-        current_user.character_ids = update_user_character_ids(
-            current_user.character_ids, str(char_id), 'remove'
-        )
-
-        # Rimborso crediti con utils
         rimborso = calculate_character_refund(pg_obj)
-        current_user.crediti += rimborso
 
-        db.session.commit()
+        # Rimborso crediti, rimozione UUID dalla lista utente ed eliminazione
+        # file personaggio e inventario in un'unica transazione (journal)
+        DeleteCharacterTransaction(current_user, pg_dict, rimborso)
         
         # Logging con utils
         log_character_operation(
@@ -329,7 +317,6 @@ def char_delete(char_id):
         flash(f"Personaggio eliminato! Rimborsati {rimborso} crediti.", "success")
 
     except Exception as e:
-        db.session.rollback()
         logger.error(f"Errore eliminazione personaggio {char_id}: {str(e)}")
         flash("Errore durante l'eliminazione", "danger")
 
@@ -344,8 +331,9 @@ def begin_combat():
     con simulazione turni e meccaniche di successo/fallimento.
     """
     # Filtro personaggi dell'utente dalla sessione
-    lista_pers = session.get('personaggi', [])
-    personaggi_utente = [p for p in lista_pers if p['id'] in (current_user.character_ids or [])]
+    lista_pers = LoadSessionCharacters(session)
+    owned = current_user.owned_character_ids(p['id'] for p in lista_pers)
+    personaggi_utente = [p for p in lista_pers if p['id'] in owned]
 
     if request.method == 'POST':
         try:
@@ -364,39 +352,21 @@ def begin_combat():
             pg1 = schema.load(pg1_dict)
             pg2 = schema.load(pg2_dict)
 
-            # Inizializzazione combattimento
-            log_combattimento = []
-            turno = 1
-
-            # Loop combattimento con meccaniche avanzate usando utils
-            while pg1.salute > 0 and pg2.salute > 0:
-                log_combattimento.append(f"Turno {turno}:")
-
-                # Turno personaggio 1 con utils
-                successo, danno, messaggio = execute_combat_turn(pg1, pg2)
-                log_combattimento.append(messaggio)
-
-                if pg2.salute <= 0:
-                    break
-
-                # Turno personaggio 2 con utils
-                successo, danno, messaggio = execute_combat_turn(pg2, pg1)
-                log_combattimento.append(messaggio)
-
-                turno += 1
-
-            # Determinazione vincitore con utils
+            # Duello con generatore dedicato: il log si può rigenerare dal replay
+            duello = Duello(pg1, pg2)
+            log_combattimento = list(duello.svolgi())
             risultato = determine_combat_winner(pg1, pg2)
-            log_combattimento.append(f"Risultato finale: {risultato}")
-            
-            logger.info(f"Combattimento completato - {risultato}")
+            replay_id = duello.replay.id if SaveReplay(duello.replay) else None
+
+            logger.info(f"Combattimento completato - {risultato} (replay {replay_id})")
 
             return render_template(
                 'combat.html',
                 pg1=pg1,
                 pg2=pg2,
                 risultato=risultato,
-                log_combattimento=log_combattimento
+                log_combattimento=log_combattimento,
+                replay_id=replay_id
             )
 
         except Exception as e:
@@ -405,25 +375,206 @@ def begin_combat():
 
     return render_template('combat.html', personaggi=personaggi_utente)
 
+@characters_bp.route('/replay/<replay_id>')
+@login_required
+def combat_replay(replay_id):
+    """
+    Rigioca un combattimento salvato: il log viene rigenerato dal seme
+    e dalle azioni del replay invece di essere letto da disco.
+    """
+    replay = LoadReplay(replay_id)
+    if replay is None or not current_user.owned_character_ids(
+        stato_partecipante(p)['id'] for p in replay.partecipanti
+    ):
+        abort(404, "Replay non trovato.")
+
+    try:
+        duello, log_combattimento = rigioca(replay)
+    except ValueError as e:
+        logger.error(f"Errore replay: {str(e)}")
+        abort(409, "Replay non più riproducibile.")
+
+    return render_template(
+        'combat.html',
+        pg1=duello.pg1,
+        pg2=duello.pg2,
+        risultato=determine_combat_winner(duello.pg1, duello.pg2),
+        log_combattimento=log_combattimento,
+        replay_id=replay.id
+    )
+
+# ------------------------COMBATTIMENTO IN STREAMING-----------------------
+# Limite ai turni di un combattimento in streaming
+COMBAT_STREAM_MAX_TURNI = 1_000
+
+# Attesa (ms) suggerita al browser prima di riconnettersi
+COMBAT_STREAM_RETRY_MS = 3_000
+
+def _eventi_combattimento(duello: Duello, da_turno: int, salva: bool):
+    """
+    Genera gli eventi SSE del combattimento. Ogni turno viene calcolato
+    solo quando il server chiede l'evento successivo, cioè dopo aver
+    scritto il precedente: un client lento rallenta il combattimento
+    invece di far accumulare eventi in memoria.
+
+    Args:
+        duello (Duello): duello nello stato iniziale
+        da_turno (int): ultimo turno già ricevuto dal client (riconnessione)
+        salva (bool): salva il replay completo alla fine
+    """
+    replay_id = duello.replay.id
+    yield evento_sse(
+        {
+            'replay_id': replay_id,
+            'pg1': duello.pg1.nome,
+            'pg2': duello.pg2.nome,
+            'turni_max': duello.turni_max,
+            'da_turno': da_turno,
+        },
+        evento='inizio',
+        retry=COMBAT_STREAM_RETRY_MS
+    )
+    for turno, righe in duello.turni():
+        if turno <= da_turno:
+            continue
+        yield evento_sse(
+            {'turno': turno, 'righe': righe},
+            evento='turno',
+            id=f"{replay_id}:{turno}"
+        )
+
+    if salva:
+        SaveReplay(duello.replay)
+    logger.info(f"Combattimento in streaming completato - {duello.risultato()} (replay {replay_id})")
+    yield evento_sse(
+        {
+            'risultato': duello.risultato(),
+            'interrotto': duello.interrotto,
+            'turni': duello.turno,
+            'replay_id': replay_id,
+        },
+        evento='fine',
+        id=f"{replay_id}:fine"
+    )
+
+@characters_bp.route('/combat_stream')
+@login_required
+def combat_stream():
+    """
+    Combattimento tra due personaggi dell'utente in streaming
+    (text/event-stream): un evento 'inizio' inviato subito, un evento
+    'turno' per ogni turno e un evento 'fine' con il risultato.
+
+    Query string: pg1, pg2 (IDs) per un nuovo combattimento.
+    Riconnessione: l'header Last-Event-ID (o il parametro cursore) nella
+    forma '<replay_id>:<turno>'; il duello viene ricostruito dal replay
+    salvato all'inizio e riprende dal turno successivo.
+    """
+    cursore = request.headers.get('Last-Event-ID') or request.args.get('cursore', '')
+
+    if cursore:
+        replay_id, _, turno = cursore.partition(':')
+        if turno == 'fine':
+            # 204: il browser smette di riconnettersi
+            return Response(status=204)
+        replay = LoadReplay(replay_id)
+        if replay is None or not current_user.owned_character_ids(
+            stato_partecipante(p)['id'] for p in replay.partecipanti
+        ):
+            abort(404, "Combattimento non trovato.")
+        duello = ricostruisci(replay)
+        da_turno = int(turno) if turno.isdigit() else 0
+        salva = not replay.azioni
+    else:
+        id_1 = request.args.get('pg1', '')
+        id_2 = request.args.get('pg2', '')
+        if current_user.owned_character_ids([id_1, id_2]) != {id_1, id_2}:
+            abort(404, "Personaggio non trovato.")
+        pg1_dict = LoadCharacterJson(id_1)
+        pg2_dict = LoadCharacterJson(id_2)
+        if not pg1_dict or not pg2_dict:
+            abort(404, "Personaggio non trovato.")
+
+        # Il replay senza azioni salvato subito permette di riprendere lo stream
+        duello = Duello(schema.load(pg1_dict), schema.load(pg2_dict), turni_max=COMBAT_STREAM_MAX_TURNI)
+        if not SaveReplay(duello.replay):
+            abort(500, "Errore avvio combattimento.")
+        da_turno = 0
+        salva = True
+
+    return Response(
+        _eventi_combattimento(duello, da_turno, salva),
+        mimetype='text/event-stream',
+        headers=SSE_HEADERS
+    )
+
+# ------------------------PROBABILITÀ COMBATTIMENTO------------------------
+# Limite ai duelli simulati per richiesta
+SIMULAZIONE_MAX_DUELLI = 50_000
+
+@characters_bp.route('/api/combat_odds')
+@login_required
+def combat_odds_api():
+    """
+    API endpoint con le probabilità di vittoria di un duello tra due
+    personaggi dell'utente, stimate con la simulazione Monte Carlo prima
+    di iniziare il combattimento.
+
+    Query string: pg1, pg2 (IDs), ambiente (Foresta/Vulcano/Palude,
+    opzionale), duelli (default 5000), cura (1 = cura a fine turno).
+    """
+    try:
+        id_1 = request.args.get('pg1', '')
+        id_2 = request.args.get('pg2', '')
+        if current_user.owned_character_ids([id_1, id_2]) != {id_1, id_2}:
+            return jsonify({'success': False, 'error': 'Personaggio non trovato'}), 404
+
+        pg1_dict = LoadCharacterJson(id_1)
+        pg2_dict = LoadCharacterJson(id_2)
+        if not pg1_dict or not pg2_dict:
+            return jsonify({'success': False, 'error': 'Personaggio non trovato'}), 404
+
+        ambiente = None
+        nome_ambiente = request.args.get('ambiente', '').strip().lower()
+        if nome_ambiente:
+            ambienti = {a.nome.lower(): a for a in AmbienteFactory.get_opzioni().values()}
+            if nome_ambiente not in ambienti:
+                return jsonify({'success': False, 'error': 'Ambiente sconosciuto'}), 400
+            ambiente = ambienti[nome_ambiente]
+
+        duelli = min(max(request.args.get('duelli', 5000, type=int), 1), SIMULAZIONE_MAX_DUELLI)
+        risultato = simula_duelli(
+            schema.load(pg1_dict),
+            schema.load(pg2_dict),
+            ambiente=ambiente,
+            duelli=duelli,
+            cura_fine_turno=request.args.get('cura') == '1'
+        )
+        return jsonify({'success': True, **risultato.to_dict()})
+    except Exception as e:
+        logger.error(f"Errore API probabilità combattimento: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 # ------------------------DASHBOARD STATISTICHE-----------------------------
 @characters_bp.route('/dashboard')
 @login_required
 def character_dashboard():
     """
-    Dashboard con statistiche dettagliate sui personaggi dell'utente.
+    Dashboard con statistiche dettagliate sui personaggi dell'utente,
+    lette dalle statistiche materializzate (nessun file personaggio).
     """
     try:
-        # Ottieni tutte le statistiche con utils
-        total_count = GetUserCharacterCount(current_user.character_ids or [])
-        stats_by_class = GetUserCharacterStatsByClass(current_user.character_ids or [])
-        most_played, most_count = GetMostPlayedClass(current_user.character_ids or [])
+        stats = GetUserCharacterStats(current_user)
+        piu_giocata = stats['classe_piu_giocata']
         
         return render_template(
             'character_dashboard.html',
-            total_count=total_count,
-            stats=stats_by_class,
-            most_played=most_played,
-            most_count=most_count
+            total_count=stats['per_classe']['Totale'],
+            stats=stats['per_classe'],
+            most_played=piu_giocata['classe'],
+            most_count=piu_giocata['numero'],
+            distribution=stats['distribuzione'],
+            total_level=stats['livello_totale']
         )
         
     except Exception as e:
@@ -439,12 +590,31 @@ def character_stats_api():
     API endpoint per statistiche personaggi (per AJAX/dashboard dinamica).
     """
     try:
-        stats = GetUserCharacterStatsByClass(current_user.character_ids or [])
+        stats = GetUserCharacterStats(current_user)
         return jsonify({
             'success': True,
-            'stats': stats,
-            'total': stats.get('Totale', 0)
+            'stats': stats['per_classe'],
+            'total': stats['per_classe']['Totale'],
+            'livello_totale': stats['livello_totale'],
+            'livello_medio': stats['livello_medio'],
+            'distribuzione': stats['distribuzione'],
+            'classe_piu_giocata': stats['classe_piu_giocata']
         })
     except Exception as e:
         logger.error(f"Errore API statistiche: {str(e)}")
-        return jsonify({'success': False, 'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@characters_bp.route('/api/damage/<string:char_id>')
+@login_required
+def character_damage_api(char_id):
+    """
+    API endpoint con il riepilogo dei danni subiti da un personaggio:
+    colpi, totale, minimo, massimo, media e ultimi colpi.
+    """
+    if not current_user.owns_character(char_id):
+        return jsonify({'success': False, 'error': 'Personaggio non autorizzato'}), 403
+
+    riepilogo = GetCharacterDamageSummary(char_id)
+    if riepilogo is None:
+        return jsonify({'success': False, 'error': 'Personaggio non trovato'}), 404
+    return jsonify({'success': True, 'personaggio_id': char_id, 'danni': riepilogo})
@@ -0,0 +1,73 @@
+"""
+Ricalcolo da zero delle statistiche dei personaggi (classe e livello
+copiati in auth.models.UserCharacter), leggendo i personaggi di ogni utente.
+
+Non serve nel funzionamento normale: classe e livello sono scritti da
+creazione e modifica, le righe eliminate escono dalle statistiche e quelle
+ancora senza classe sono completate alla lettura. Serve dopo modifiche ai
+file fatte a mano o se classi e livelli risultano diversi da quelli salvati.
+
+Uso (dalla cartella gdr-web-app):
+    python -m characters.statistiche [user_id ...]
+"""
+import os
+import sys
+import logging
+from typing import Iterable, Optional, Tuple
+
+from flask import Flask
+
+from config import BASE_DIR, SQLALCHEMY_DATABASE_URI
+from auth.models import db, User
+from auth.migrazione import aggiungi_colonne_personaggi
+from characters.utils import RebuildUserCharacterStats
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Utenti ricalcolati per commit
+RICALCOLO_BLOCCO = 100
+
+
+def ricalcola_statistiche(user_ids: Optional[Iterable[int]] = None,
+                          blocco: int = RICALCOLO_BLOCCO) -> Tuple[int, int]:
+    """
+    Ricalcola le statistiche degli utenti indicati (tutti se None).
+    Va eseguita dentro un app context.
+
+    Args:
+        user_ids (Optional[Iterable[int]]): IDs utente, None per tutti
+        blocco (int): utenti ricalcolati per commit
+
+    Returns:
+        Tuple[int, int]: (utenti, personaggi conteggiati)
+    """
+    query = db.session.query(User.id).order_by(User.id)
+    if user_ids is not None:
+        query = query.filter(User.id.in_(list(user_ids)))
+    ids = [user_id for (user_id,) in query]
+    utenti = personaggi = 0
+    for inizio in range(0, len(ids), blocco):
+        for user in User.query.filter(User.id.in_(ids[inizio:inizio + blocco])):
+            personaggi += RebuildUserCharacterStats(user)
+            utenti += 1
+        db.session.commit()
+    logger.info(f"Statistiche ricalcolate: {utenti} utenti, {personaggi} personaggi")
+    return utenti, personaggi
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.WARNING)
+    app = Flask(__name__, instance_path=os.path.join(BASE_DIR, 'instance'))
+    app.config['SQLALCHEMY_DATABASE_URI'] = SQLALCHEMY_DATABASE_URI
+    db.init_app(app)
+    user_ids = [int(arg) for arg in sys.argv[1:]] or None
+    with app.app_context():
+        db.create_all()
+        aggiungi_colonne_personaggi()
+        utenti, personaggi = ricalcola_statistiche(user_ids)
+    print(f"Statistiche ricalcolate per {utenti} utenti ({personaggi} personaggi)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,23 @@
 import os
-import json
+import time
 import logging
-from typing import List, Dict, Optional, Tuple
+import threading
+from typing import Callable, List, Dict, Optional, Tuple, MutableMapping
 from gioco.personaggio import Personaggio
 from gioco.schemas.personaggio import PersonaggioSchema
-from config import DATA_DIR_PGS
+from sqlalchemy import update, delete
+from config import (DATA_DIR_PGS, CACHE_MAX_ENTRIES, DATA_DIR_JOURNAL, JOURNAL_RECOVERY_AGE, DATA_DIR_REPLAY,
+                    JOURNAL_RECOVERY_INTERVAL, SESSION_PERSONAGGI_SOLO_ID)
 from auth.credits import credits_to_create, credits_to_refund
+from auth.models import db, User, UserCharacter, statistiche_personaggi
+from gioco.inventario import Inventario
+from utils.storage import get_store, stamp, unstamp, verify_stamp
+from utils.cache import LRUCache
+from utils.journal import Journal
+from utils.locks import lock_manager
+from utils.salvataggio import CODECS, salva_json, leggi_json
+from gioco.duello import Replay, esito_duello
+from gioco.storico import StoricoDanni
 
 # Setup logging
 logger = logging.getLogger(__name__)
@@ -14,6 +26,38 @@ logger.setLevel(logging.INFO)
 # Schema instance
 schema = PersonaggioSchema()
 
+# Versione dello schema scritta nei file: i file con versione e checksum
+# corretti vengono caricati senza validazione Marshmallow.
+# 2: storico_danni_subiti come riepilogo compatto (gioco.storico)
+CHARACTER_SCHEMA_VERSION = 2
+
+# i replay sono binari (msgspec); senza msgspec si ripiega su JSON compatto
+REPLAY_CODEC = "msgpack" if "msgpack" in CODECS else "json-compatto"
+
+# Backend di storage dei personaggi (config.STORAGE_BACKEND)
+character_store = get_store('personaggi', DATA_DIR_PGS)
+
+# Cache dei personaggi già validati, valida finché la firma del record
+# (percorso, mtime_ns, dimensione) non cambia
+character_cache = LRUCache(CACHE_MAX_ENTRIES)
+
+# Journal delle operazioni crediti + personaggio + inventario
+character_journal = Journal(DATA_DIR_JOURNAL)
+
+# Funzioni chiamate dopo ogni salvataggio (char_id, dati serializzati) o
+# eliminazione (char_id, None) di un personaggio in questo processo; le usa
+# l'indice delle interrogazioni (inventory/query.py) per la classe dei
+# proprietari degli inventari
+character_listeners: List[Callable[[str, Optional[Dict]], None]] = []
+
+
+def _notify_character_listeners(char_id: str, character_dict: Optional[Dict]) -> None:
+    for listener in character_listeners:
+        try:
+            listener(char_id, character_dict)
+        except Exception as e:
+            logger.error(f"Errore notifica personaggio {char_id}: {e}")
+
 # ------------------------MAPPING CLASSI PERSONAGGI------------------------
 def get_character_classes() -> Dict[str, type]:
     """
@@ -69,54 +113,85 @@ def validate_character_class(classe: str) -> Tuple[bool, str]:
     return True, ""
 
 # ------------------------GESTIONE FILE JSON PERSONAGGI--------------------
-def SaveCharacterJson(character_dict: Dict) -> bool:
+def SaveCharacterJson(character_dict: Dict, owner_id: Optional[int] = None) -> bool:
     """
-    Salva dizionario personaggio su file JSON.
+    Salva dizionario personaggio nello store configurato.
     
     Args:
         character_dict (Dict): Dati personaggio serializzati
+        owner_id (Optional[int]): ID utente proprietario (indicizzato dal
+            backend sqlite)
         
     Returns:
         bool: True se salvato con successo
     """
     try:
-        name_file = f"{character_dict['id']}.json"
-        path = os.path.join(DATA_DIR_PGS, name_file)
-        
-        with open(path, "w", encoding="utf-8") as file:
-            json.dump(character_dict, file, indent=4)
+        char_id = str(character_dict['id'])
+        character_store.put(
+            char_id, stamp(character_dict, CHARACTER_SCHEMA_VERSION), owner_id
+        )
+        character_cache.invalidate(char_id)
+        _notify_character_listeners(char_id, character_dict)
         
-        logger.info(f"Personaggio salvato: {name_file}")
+        logger.info(f"Personaggio salvato: {char_id}")
         return True
         
     except Exception as e:
         logger.error(f"Errore salvataggio personaggio: {str(e)}")
         return False
 
+def _validate_character(char_dict: Dict) -> Dict:
+    """
+    Valida i dati di un personaggio. I record scritti da SaveCharacterJson
+    con versione e checksum corretti sono restituiti così come sono;
+    gli altri passano dalla validazione completa Marshmallow (load + dump).
+
+    Args:
+        char_dict (Dict): Dati personaggio letti dallo store
+
+    Returns:
+        Dict: Dati personaggio validati
+    """
+    trusted = verify_stamp(char_dict, CHARACTER_SCHEMA_VERSION)
+    if trusted is not None:
+        return trusted
+
+    character = schema.load(unstamp(char_dict))
+    return schema.dump(character)
+
 def LoadCharacterJson(char_id: str) -> Optional[Dict]:
     """
-    Carica personaggio da file JSON e lo valida.
+    Carica personaggio dallo store e lo valida; se il record non è
+    cambiato dall'ultima lettura restituisce la copia in cache.
     
     Args:
         char_id (str): ID del personaggio da caricare
         
     Returns:
-        Optional[Dict]: Dati personaggio o None se errore
+        Optional[Dict]: Dati personaggio (sola lettura) o None se errore
     """
     try:
-        path = os.path.join(DATA_DIR_PGS, f"{char_id}.json")
+        char_id = str(char_id)
+        signature = character_store.signature(char_id)
         
-        if not os.path.exists(path):
+        if signature is None:
+            logger.warning(f"File personaggio non trovato: {char_id}")
+            return None
+
+        cached = character_cache.get(char_id, signature)
+        if cached is not None:
+            return cached
+
+        # Lettura condivisa: attende un edit_char in corso sullo stesso personaggio
+        with lock_manager.read_lock(f"personaggio:{char_id}"):
+            char_dict = character_store.get(char_id)
+        if char_dict is None:
             logger.warning(f"File personaggio non trovato: {char_id}")
             return None
-        
-        with open(path, "r", encoding='utf-8') as file:
-            char_dict = json.load(file)
         
         # Validazione con Marshmallow
-        character = schema.load(char_dict)
-        validated_dict = schema.dump(character)
-        
+        validated_dict = _validate_character(char_dict)
+        character_cache.put(char_id, signature, validated_dict)
         return validated_dict
         
     except Exception as e:
@@ -125,7 +200,7 @@ def LoadCharacterJson(char_id: str) -> Optional[Dict]:
 
 def DeleteCharacterJson(char_id: str) -> bool:
     """
-    Elimina file JSON del personaggio.
+    Elimina il personaggio dallo store.
     
     Args:
         char_id (str): ID del personaggio da eliminare
@@ -134,14 +209,13 @@ def DeleteCharacterJson(char_id: str) -> bool:
         bool: True se eliminato con successo
     """
     try:
-        file_path = os.path.join(DATA_DIR_PGS, f"{char_id}.json")
-        
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            logger.info(f"File personaggio eliminato: {file_path}")
+        character_cache.invalidate(str(char_id))
+        if character_store.delete(str(char_id)):
+            _notify_character_listeners(str(char_id), None)
+            logger.info(f"Personaggio eliminato: {char_id}")
             return True
         else:
-            logger.warning(f"File personaggio non trovato: {file_path}")
+            logger.warning(f"Personaggio non trovato: {char_id}")
             return False
             
     except Exception as e:
@@ -151,21 +225,13 @@ def DeleteCharacterJson(char_id: str) -> bool:
 # ------------------------GESTIONE IDS UTENTE-------------------------------
 def get_user_character_files() -> List[str]:
     """
-    Ottiene lista di tutti i file personaggio esistenti.
+    Ottiene lista di tutti i personaggi esistenti nello store.
     
     Returns:
-        List[str]: Lista di IDs dei file trovati
+        List[str]: Lista di IDs dei personaggi trovati
     """
     try:
-        files = os.listdir(DATA_DIR_PGS)
-        char_ids = []
-        
-        for file in files:
-            if file.endswith('.json') and file != '.gitkeep':
-                filename = os.path.splitext(file)[0]
-                char_ids.append(filename)
-        
-        return char_ids
+        return character_store.ids()
         
     except Exception as e:
         logger.error(f"Errore lettura directory personaggi: {str(e)}")
@@ -173,7 +239,8 @@ def get_user_character_files() -> List[str]:
 
 def filter_owned_characters(user_char_ids: List[str]) -> List[str]:
     """
-    Filtra personaggi dell'utente che esistono realmente su file.
+    Filtra personaggi dell'utente che esistono realmente su file,
+    usando l'insieme degli IDs esistenti in cache (O(len(user_char_ids))).
     
     Args:
         user_char_ids (List[str]): IDs personaggi nel database utente
@@ -184,37 +251,63 @@ def filter_owned_characters(user_char_ids: List[str]) -> List[str]:
     if not user_char_ids:
         return []
     
-    all_files = get_user_character_files()
-    owned_chars = [char_id for char_id in user_char_ids if char_id in all_files]
+    try:
+        owned_chars = character_store.existing(user_char_ids)
+    except Exception as e:
+        logger.error(f"Errore lettura directory personaggi: {str(e)}")
+        return []
     
     logger.info(f"Filtrati {len(owned_chars)} personaggi posseduti da {len(user_char_ids)} totali")
     return owned_chars
 
-def update_user_character_ids(current_ids: List[str], char_id: str, operation: str) -> List[str]:
+def AddUserCharacter(user_id: int, char_id: str, classe: Optional[str] = None,
+                     livello: Optional[int] = None) -> None:
     """
-    Aggiorna lista IDs personaggi dell'utente.
+    Registra il personaggio come dell'utente (tabella UserCharacter).
+    Non fa commit: fa parte della transazione del chiamante.
     
     Args:
-        current_ids (List[str]): IDs attuali
-        char_id (str): ID da aggiungere/rimuovere
-        operation (str): 'add' o 'remove'
+        user_id (int): ID utente
+        char_id (str): ID personaggio
+        classe (Optional[str]): classe del personaggio (statistiche)
+        livello (Optional[int]): livello del personaggio (statistiche)
+    """
+    db.session.add(UserCharacter(
+        user_id=user_id, char_id=str(char_id), classe=classe,
+        livello=int(livello or 1) if classe is not None else None
+    ))
+
+def RemoveUserCharacter(user_id: int, char_id: str) -> bool:
+    """
+    Toglie il personaggio all'utente (nessun effetto se non è suo).
+    Non fa commit: fa parte della transazione del chiamante.
+    
+    Args:
+        user_id (int): ID utente
+        char_id (str): ID personaggio
         
     Returns:
-        List[str]: Lista aggiornata
+        bool: True se il personaggio era dell'utente ed è stato rimosso
     """
-    if current_ids is None:
-        current_ids = []
-    
-    # Assicura tutti stringhe
-    current_ids = [str(cid) for cid in current_ids]
-    char_id = str(char_id)
-    
-    if operation == 'add' and char_id not in current_ids:
-        current_ids.append(char_id)
-    elif operation == 'remove' and char_id in current_ids:
-        current_ids.remove(char_id)
+    result = db.session.execute(
+        delete(UserCharacter)
+        .where(UserCharacter.char_id == str(char_id), UserCharacter.user_id == user_id)
+    )
+    return result.rowcount == 1
+
+def GetCharacterOwner(char_id: str) -> Optional[int]:
+    """
+    Proprietario di un personaggio (indice univoco su char_id).
     
-    return current_ids
+    Args:
+        char_id (str): ID personaggio
+        
+    Returns:
+        Optional[int]: ID utente o None se il personaggio non ha proprietario
+    """
+    return db.session.execute(
+        db.select(UserCharacter.user_id).where(UserCharacter.char_id == str(char_id))
+    ).scalar_one_or_none()
 
 # ------------------------CREAZIONE PERSONAGGI------------------------------
 def create_character_instance(nome: str, classe: str) -> Personaggio:
@@ -245,120 +338,180 @@ def create_character_instance(nome: str, classe: str) -> Personaggio:
     return pg
 
 # ------------------------STATISTICHE PERSONAGGI---------------------------
-def GetUserCharacterCount(user_char_ids: List[str]) -> int:
+def GetCharacterDamageSummary(char_id: str) -> Optional[Dict]:
     """
-    Ottiene numero totale di personaggi dell'utente.
+    Riepilogo dei danni subiti da un personaggio per l'interfaccia.
     
     Args:
-        user_char_ids (List[str]): Lista IDs personaggi utente
+        char_id (str): ID del personaggio
         
     Returns:
-        int: Numero totale personaggi posseduti
+        Optional[Dict]: colpi, totale, minimo, massimo, media e ultimi colpi
+        (dal più recente), o None se il personaggio non esiste
     """
-    if not user_char_ids:
+    char_dict = LoadCharacterJson(char_id)
+    if char_dict is None:
+        return None
+    riepilogo = StoricoDanni.from_dict(char_dict.get('storico_danni_subiti') or {}).riepilogo()
+    riepilogo['ultimi'].reverse()
+    return riepilogo
+
+# ------------------------STATISTICHE MATERIALIZZATE-----------------------
+# Classe e livello di ogni personaggio sono copiati nella sua riga
+# UserCharacter da creazione e modifica: le statistiche dell'utente sono una
+# query raggruppata sulle sue righe, senza leggere i file dei personaggi.
+
+def _SetUserCharacterStats(user_id: int, char_id: str, classe: Optional[str],
+                           livello: Optional[int]) -> None:
+    """
+    Aggiorna classe e livello nella riga del personaggio (non fa commit).
+    """
+    db.session.execute(
+        update(UserCharacter)
+        .where(UserCharacter.char_id == str(char_id), UserCharacter.user_id == user_id)
+        .values(classe=classe, livello=int(livello or 1) if classe is not None else None)
+    )
+
+def _FillUserCharacterStats(user_id: int) -> int:
+    """
+    Legge dai file classe e livello dei personaggi dell'utente che non li
+    hanno ancora nella loro riga (non fa commit). Quelli senza file
+    restano senza e non sono conteggiati, come in filter_owned_characters.
+
+    Returns:
+        int: righe completate
+    """
+    mancanti = [
+        char_id for (char_id,) in db.session.query(UserCharacter.char_id)
+        .filter(UserCharacter.user_id == user_id, UserCharacter.classe.is_(None))
+    ]
+    if not mancanti:
         return 0
-    
-    owned_chars = filter_owned_characters(user_char_ids)
-    count = len(owned_chars)
-    
-    logger.info(f"Conteggio personaggi utente: {count}")
-    return count
+    completati = 0
+    for char in LoadMultipleCharactersJson(mancanti):
+        _SetUserCharacterStats(user_id, char['id'], char.get('classe', 'Unknown'), char.get('livello', 1))
+        completati += 1
+    return completati
 
-def GetUserCharacterStatsByClass(user_char_ids: List[str]) -> Dict[str, int]:
+def UpdateCharacterStats(user, pg_dict: Dict) -> bool:
     """
-    Ottiene statistiche personaggi per classe dell'utente.
+    Aggiorna classe e livello di un personaggio modificato nelle
+    statistiche dell'utente.
     
     Args:
-        user_char_ids (List[str]): Lista IDs personaggi utente
+        user: utente proprietario (User)
+        pg_dict (Dict): personaggio serializzato
         
     Returns:
-        Dict[str, int]: Dizionario {classe: numero_personaggi}
+        bool: True se aggiornate con successo
     """
-    if not user_char_ids:
-        return {"Mago": 0, "Guerriero": 0, "Ladro": 0, "Totale": 0}
-    
-    # Carica tutti i personaggi dell'utente
-    owned_chars = filter_owned_characters(user_char_ids)
-    characters = LoadMultipleCharactersJson(owned_chars)
-    
-    # Conteggio per classe
-    stats = {"Mago": 0, "Guerriero": 0, "Ladro": 0}
-    
-    for char in characters:
-        classe = char.get('classe', 'Unknown')
-        if classe in stats:
-            stats[classe] += 1
-    
-    # Aggiungi totale
-    stats["Totale"] = sum(stats.values())
-    
-    logger.info(f"Statistiche personaggi per classe: {stats}")
-    return stats
+    try:
+        _SetUserCharacterStats(
+            user.id, pg_dict['id'], pg_dict.get('classe', 'Unknown'), pg_dict.get('livello', 1)
+        )
+        db.session.commit()
+        return True
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Errore aggiornamento statistiche utente {user.id}: {str(e)}")
+        return False
 
-def GetMostPlayedClass(user_char_ids: List[str]) -> Tuple[str, int]:
+def GetUserCharacterStats(user) -> Dict:
     """
-    Ottiene la classe più giocata dall'utente.
+    Statistiche dei personaggi dell'utente con una query raggruppata per
+    classe sulle sue righe UserCharacter. Le righe ancora senza classe
+    (create prima delle colonne) sono completate leggendo solo quei file.
     
     Args:
-        user_char_ids (List[str]): Lista IDs personaggi utente
+        user: utente (User)
         
     Returns:
-        Tuple[str, int]: (classe_più_giocata, numero_personaggi)
-    """
-    stats = GetUserCharacterStatsByClass(user_char_ids)
-    
-    # Rimuovi totale dal conteggio
-    class_stats = {k: v for k, v in stats.items() if k != "Totale"}
-    
-    if not class_stats or all(count == 0 for count in class_stats.values()):
-        return "Nessuna", 0
-    
-    most_played = max(class_stats.items(), key=lambda x: x[1])
-    
-    logger.info(f"Classe più giocata: {most_played[0]} ({most_played[1]} personaggi)")
-    return most_played
-
-def GetCharacterDistribution(user_char_ids: List[str]) -> Dict[str, float]:
+        Dict: per_classe (con 'Totale'), livello_totale, livello_medio,
+        distribuzione e classe_piu_giocata (vedi statistiche_personaggi)
     """
-    Ottiene distribuzione percentuale delle classi.
+    try:
+        completati = _FillUserCharacterStats(user.id)
+        if completati:
+            db.session.commit()
+            logger.info(f"Statistiche utente {user.id}: {completati} personaggi completati")
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Errore completamento statistiche utente {user.id}: {str(e)}")
+        raise
+
+    per_classe = {}
+    livello_totale = 0
+    for classe, numero, livelli in (
+        db.session.query(UserCharacter.classe, db.func.count(), db.func.sum(UserCharacter.livello))
+        .filter(UserCharacter.user_id == user.id, UserCharacter.classe.isnot(None))
+        .group_by(UserCharacter.classe)
+    ):
+        per_classe[classe] = numero
+        livello_totale += livelli or 0
+    return statistiche_personaggi(per_classe, livello_totale)
+
+def RebuildUserCharacterStats(user) -> int:
+    """
+    Rilegge dai file classe e livello di tutti i personaggi dell'utente
+    (non fa commit).
     
     Args:
-        user_char_ids (List[str]): Lista IDs personaggi utente
+        user: utente (User)
         
     Returns:
-        Dict[str, float]: Dizionario {classe: percentuale}
+        int: personaggi conteggiati
     """
-    stats = GetUserCharacterStatsByClass(user_char_ids)
-    total = stats.get("Totale", 0)
-    
-    if total == 0:
-        return {"Mago": 0.0, "Guerriero": 0.0, "Ladro": 0.0}
-    
-    distribution = {}
-    for classe in ["Mago", "Guerriero", "Ladro"]:
-        percentage = (stats[classe] / total) * 100
-        distribution[classe] = round(percentage, 1)
-    
-    logger.info(f"Distribuzione classi: {distribution}")
-    return distribution
+    db.session.execute(
+        update(UserCharacter)
+        .where(UserCharacter.user_id == user.id)
+        .values(classe=None, livello=None)
+    )
+    return _FillUserCharacterStats(user.id)
 
 # ------------------------CARICAMENTO BATCH---------------------------------
 def LoadMultipleCharactersJson(char_ids: List[str]) -> List[Dict]:
     """
-    Carica multipli personaggi da file JSON e li valida.
+    Carica multipli personaggi: quelli invariati arrivano dalla cache,
+    gli altri con una sola lettura batch dallo store e vengono validati.
     
     Args:
         char_ids (List[str]): Lista di IDs da caricare
         
     Returns:
-        List[Dict]: Lista personaggi caricati con successo
+        List[Dict]: Lista personaggi (sola lettura) caricati con successo
     """
     characters = []
-    
+    char_ids = [str(char_id) for char_id in char_ids]
+
+    try:
+        signatures = character_store.signatures(char_ids)
+        cached = {}
+        for char_id, signature in signatures.items():
+            char_dict = character_cache.get(char_id, signature)
+            if char_dict is not None:
+                cached[char_id] = char_dict
+        raw_chars = character_store.get_many(
+            [char_id for char_id in signatures if char_id not in cached]
+        )
+    except Exception as e:
+        logger.error(f"Errore caricamento batch personaggi: {str(e)}")
+        return characters
+
+    # Mantiene l'ordine degli IDs richiesti
     for char_id in char_ids:
-        char_data = LoadCharacterJson(char_id)
-        if char_data:
-            characters.append(char_data)
+        if char_id in cached:
+            characters.append(cached[char_id])
+            continue
+        char_dict = raw_chars.get(char_id)
+        if char_dict is None:
+            logger.warning(f"File personaggio non trovato: {char_id}")
+            continue
+        try:
+            validated_dict = _validate_character(char_dict)
+            character_cache.put(char_id, signatures[char_id], validated_dict)
+            characters.append(validated_dict)
+        except Exception as e:
+            logger.error(f"Errore caricamento personaggio {char_id}: {str(e)}")
     
     logger.info(f"Caricati {len(characters)} personaggi da {len(char_ids)} richiesti")
     return characters
@@ -379,6 +532,42 @@ def find_character_by_id(characters: List[Dict], char_id: str) -> Optional[Dict]
             return char
     return None
 
+# ------------------------PERSONAGGI IN SESSIONE----------------------------
+def SaveSessionCharacters(sessione: MutableMapping, personaggi: List[Dict]) -> None:
+    """
+    Salva in sessione i personaggi dell'utente: con SESSION_PERSONAGGI_SOLO_ID
+    solo gli IDs (la sessione resta piccola e i dati vengono riletti dalla
+    cache), altrimenti i dizionari completi come in passato.
+
+    Args:
+        sessione (MutableMapping): Sessione Flask
+        personaggi (List[Dict]): Personaggi da salvare
+    """
+    if SESSION_PERSONAGGI_SOLO_ID:
+        ids = [str(p['id']) for p in personaggi]
+        # Scrive (e fa salvare la sessione) solo se gli IDs sono cambiati
+        if sessione.get('personaggi_ids') != ids:
+            sessione['personaggi_ids'] = ids
+        sessione.pop('personaggi', None)
+    else:
+        sessione['personaggi'] = personaggi
+        sessione.pop('personaggi_ids', None)
+
+def LoadSessionCharacters(sessione: MutableMapping) -> List[Dict]:
+    """
+    Personaggi salvati in sessione con SaveSessionCharacters, in entrambi
+    i formati (IDs o dizionari completi).
+
+    Args:
+        sessione (MutableMapping): Sessione Flask
+
+    Returns:
+        List[Dict]: Personaggi (sola lettura), ownership da verificare
+    """
+    if 'personaggi_ids' in sessione:
+        return LoadMultipleCharactersJson(sessione['personaggi_ids'])
+    return sessione.get('personaggi', [])
+
 # ------------------------CREDITI E VALIDAZIONE-----------------------------
 def calculate_character_cost(character: Personaggio) -> int:
     """
@@ -420,29 +609,232 @@ def validate_user_can_afford(user_credits: float, required_credits: int) -> Tupl
     else:
         return False, f"Crediti insufficienti. Servono {required_credits}, hai {int(user_credits)}"
 
-# ------------------------COMBATTIMENTO-------------------------------------
-def execute_combat_turn(attacker: Personaggio, defender: Personaggio) -> Tuple[bool, int, str]:
+# ------------------------TRANSAZIONI PERSONAGGI----------------------------
+# Creazione ed eliminazione toccano tre store: crediti e possesso nel
+# database, file personaggio e file inventario. Ogni operazione è registrata
+# nel journal prima di iniziare; il commit del database è il punto di non
+# ritorno: al riavvio le transazioni interrotte vengono completate se il
+# database risulta aggiornato, altrimenti annullate.
+
+def _user_owns_character(user_id: int, char_id: str) -> Optional[bool]:
     """
-    Esegue un singolo turno di combattimento.
-    
-    Args:
-        attacker (Personaggio): Personaggio attaccante
-        defender (Personaggio): Personaggio difensore
-        
+    Stato del database per una transazione: il personaggio risulta
+    dell'utente? None se l'utente non esiste più.
+    """
+    if db.session.get(User, user_id) is None:
+        return None
+    return GetCharacterOwner(char_id) == user_id
+
+def _remove_character_files(char_id: str) -> bool:
+    """
+    Elimina file personaggio e inventario (se presenti).
+
     Returns:
-        Tuple[bool, int, str]: (successo, danno_inflitto, messaggio)
+        bool: True se alla fine nessuno dei due file esiste più (le
+        funzioni di eliminazione restituiscono False anche per un file
+        già assente, quindi si verifica il risultato)
     """
-    successo = attacker.esegui_azione()
-    
-    if successo:
-        danno = attacker.attacca()
-        defender.subisci_danno(danno)
-        messaggio = f"{attacker.nome} infligge {danno} danni a {defender.nome} (Salute residua: {defender.salute})"
-        return True, danno, messaggio
-    else:
-        messaggio = f"{attacker.nome} ha fallito l'attacco!"
-        return False, 0, messaggio
+    from inventory.utils import DeleteInventoryJson, _InventoryFileExists, inventory_index
+
+    char_id = str(char_id)
+    DeleteCharacterJson(char_id)
+    DeleteInventoryJson(char_id)
+    rimasti = []
+    if character_store.existing([char_id]):
+        rimasti.append("personaggio")
+    if _InventoryFileExists(char_id) or inventory_index.get(char_id):
+        rimasti.append("inventario")
+    if rimasti:
+        logger.error(f"File non eliminati per {char_id}: {', '.join(rimasti)}")
+        return False
+    return True
+
+def _restore_character_files(tx: Dict) -> None:
+    """
+    Riscrive file personaggio e inventario dalle immagini nel journal,
+    solo se mancanti.
+    """
+    from inventory.utils import SaveInventoryJson, inventario_schema, inventory_ids
+
+    char_id = str(tx['char_id'])
+    if not character_store.existing([char_id]):
+        SaveCharacterJson(tx['personaggio'], owner_id=tx['user_id'])
+    if tx.get('inventario') and char_id not in inventory_ids:
+        SaveInventoryJson(inventario_schema.load(tx['inventario']))
+
+def CreateCharacterTransaction(user, pg_dict: Dict, inventario: Inventario, costo: int) -> None:
+    """
+    Crea personaggio e inventario e addebita i crediti come un'unica
+    operazione registrata nel journal.
+
+    L'addebito è un UPDATE condizionato sul saldo, quindi più worker
+    possono creare personaggi in parallelo senza lock globali.
+
+    Args:
+        user: utente proprietario (User)
+        pg_dict (Dict): personaggio serializzato
+        inventario (Inventario): inventario iniziale
+        costo (int): crediti da addebitare
+
+    Raises:
+        ValueError: se i crediti non sono sufficienti
+        Exception: se un salvataggio fallisce (tutto viene annullato)
+    """
+    from inventory.utils import SaveInventoryJson, inventario_schema
 
+    _recupero_periodico()
+    char_id = str(pg_dict['id'])
+    tx_id = character_journal.begin(
+        'create', user_id=user.id, char_id=char_id, crediti=costo,
+        personaggio=pg_dict, inventario=inventario_schema.dump(inventario)
+    )
+    try:
+        if not SaveCharacterJson(pg_dict, owner_id=user.id):
+            raise Exception("Errore salvataggio personaggio")
+        if not SaveInventoryJson(inventario):
+            raise Exception("Errore salvataggio inventario")
+
+        addebito = db.session.execute(
+            update(User)
+            .where(User.id == user.id, User.crediti >= costo)
+            .values(crediti=User.crediti - costo)
+        )
+        if addebito.rowcount == 0:
+            raise ValueError("Crediti insufficienti")
+
+        AddUserCharacter(
+            user.id, char_id, pg_dict.get('classe', 'Unknown'), pg_dict.get('livello', 1)
+        )
+        db.session.commit()
+
+    except Exception:
+        db.session.rollback()
+        # Se la pulizia fallisce la transazione resta nel journal e il
+        # recupero elimina i file rimasti
+        if _remove_character_files(char_id):
+            character_journal.complete(tx_id)
+        raise
+
+    character_journal.complete(tx_id)
+    logger.info(f"Transazione creazione completata: {char_id}")
+
+def DeleteCharacterTransaction(user, pg_dict: Dict, rimborso: int) -> None:
+    """
+    Elimina personaggio e inventario e rimborsa i crediti come un'unica
+    operazione registrata nel journal.
+
+    Args:
+        user: utente proprietario (User)
+        pg_dict (Dict): personaggio serializzato da eliminare
+        rimborso (int): crediti da rimborsare
+
+    Raises:
+        ValueError: se il personaggio non è (più) dell'utente
+    """
+    from inventory.utils import LoadInventoryJson
+
+    _recupero_periodico()
+    char_id = str(pg_dict['id'])
+    tx_id = character_journal.begin(
+        'delete', user_id=user.id, char_id=char_id, crediti=rimborso,
+        personaggio=pg_dict, inventario=LoadInventoryJson(char_id)
+    )
+    try:
+        # Prima il possesso: solo la richiesta che rimuove davvero la riga
+        # rimborsa (due eliminazioni concorrenti o un POST ripetuto no)
+        if not RemoveUserCharacter(user.id, char_id):
+            raise ValueError("Personaggio non trovato")
+        db.session.execute(
+            update(User)
+            .where(User.id == user.id)
+            .values(crediti=User.crediti + rimborso)
+        )
+        db.session.commit()
+
+    except Exception:
+        db.session.rollback()
+        character_journal.complete(tx_id)
+        raise
+
+    # Dopo il commit l'eliminazione dei file va solo completata: se fallisce
+    # la transazione resta nel journal e viene ripresa dal recupero
+    if not _remove_character_files(char_id):
+        logger.warning(f"Transazione eliminazione {tx_id} lasciata nel journal: {char_id}")
+        return
+    character_journal.complete(tx_id)
+    logger.info(f"Transazione eliminazione completata: {char_id}")
+
+def RecoverCharacterTransactions(min_age: float = JOURNAL_RECOVERY_AGE) -> int:
+    """
+    Completa o annulla le transazioni rimaste nel journal dopo un crash o
+    una pulizia fallita. Va eseguita dentro un app context: all'avvio e
+    periodicamente da _recupero_periodico.
+
+    Args:
+        min_age (float): età minima in secondi delle transazioni da
+            recuperare (le più recenti possono essere in corso altrove)
+
+    Returns:
+        int: numero di transazioni recuperate
+    """
+    recuperate = 0
+    for tx in character_journal.pending(min_age):
+        try:
+            owned = _user_owns_character(tx['user_id'], tx['char_id'])
+            if tx['operazione'] == 'create':
+                if owned:
+                    _restore_character_files(tx)
+                    esito = "completata"
+                else:
+                    rimossi = _remove_character_files(tx['char_id'])
+                    esito = "annullata"
+            elif tx['operazione'] == 'delete':
+                if owned:
+                    _restore_character_files(tx)
+                    esito = "annullata"
+                else:
+                    rimossi = _remove_character_files(tx['char_id'])
+                    esito = "completata"
+            else:
+                logger.warning(f"Operazione sconosciuta nel journal: {tx['operazione']}")
+                continue
+
+            if not owned and not rimossi:
+                # File ancora presenti: si riprova al prossimo recupero
+                continue
+            character_journal.complete(tx['id'])
+            recuperate += 1
+            logger.info(f"Transazione {tx['operazione']} {tx['id']} {esito} al recupero")
+
+        except Exception as e:
+            logger.error(f"Errore recupero transazione {tx.get('id')}: {str(e)}")
+
+    return recuperate
+
+_recupero_lock = threading.Lock()
+_ultimo_recupero = time.monotonic()  # all'avvio lo fa create_app
+
+def _recupero_periodico() -> None:
+    """
+    Riprende le transazioni rimaste nel journal al più ogni
+    JOURNAL_RECOVERY_INTERVAL secondi: un worker che resta attivo a lungo
+    non aspetta il riavvio. Chiamata all'inizio di creazione ed eliminazione.
+    """
+    global _ultimo_recupero
+    if JOURNAL_RECOVERY_INTERVAL <= 0 or time.monotonic() - _ultimo_recupero < JOURNAL_RECOVERY_INTERVAL:
+        return
+    # Un solo thread per processo, gli altri proseguono
+    if not _recupero_lock.acquire(blocking=False):
+        return
+    try:
+        _ultimo_recupero = time.monotonic()
+        RecoverCharacterTransactions()
+    except Exception as e:
+        logger.error(f"Errore recupero periodico journal personaggi: {str(e)}")
+    finally:
+        _recupero_lock.release()
+
+# ------------------------COMBATTIMENTO-------------------------------------
 def determine_combat_winner(pg1: Personaggio, pg2: Personaggio) -> str:
     """
     Determina il vincitore del combattimento.
@@ -454,14 +846,51 @@ def determine_combat_winner(pg1: Personaggio, pg2: Personaggio) -> str:
     Returns:
         str: Messaggio del risultato
     """
-    if pg1.salute <= 0 and pg2.salute <= 0:
-        return "Pareggio! Entrambi i combattenti sono stati sconfitti"
-    elif pg1.salute <= 0:
-        return f"Vittoria di {pg2.nome}!"
-    elif pg2.salute <= 0:
-        return f"Vittoria di {pg1.nome}!"
-    else:
-        return "Combattimento in corso..."
+    return esito_duello(pg1, pg2)
+
+def _replay_path(replay_id: str) -> str:
+    return os.path.join(DATA_DIR_REPLAY, f"{replay_id}.bin")
+
+def SaveReplay(replay: Replay) -> bool:
+    """
+    Salva il replay binario di un duello (seme + azioni) in DATA_DIR_REPLAY.
+
+    Args:
+        replay (Replay): replay del duello concluso
+
+    Returns:
+        bool: True se salvato con successo
+    """
+    try:
+        os.makedirs(DATA_DIR_REPLAY, exist_ok=True)
+        dati = replay.to_dict()
+        if REPLAY_CODEC != "msgpack":
+            dati["azioni"] = dati["azioni"].hex()
+        salva_json(_replay_path(replay.id), dati, codec=REPLAY_CODEC)
+        logger.info(f"Replay salvato: {replay.id} ({len(replay.azioni)} azioni)")
+        return True
+    except Exception as e:
+        logger.error(f"Errore salvataggio replay: {str(e)}")
+        return False
+
+def LoadReplay(replay_id: str) -> Optional[Replay]:
+    """
+    Carica un replay salvato da SaveReplay.
+
+    Args:
+        replay_id (str): ID del replay (hex)
+
+    Returns:
+        Optional[Replay]: replay o None se non trovato o non valido
+    """
+    if not replay_id.isalnum():
+        return None
+    try:
+        data = leggi_json(_replay_path(replay_id), migra=False)
+        return Replay.from_dict(data) if data else None
+    except Exception as e:
+        logger.error(f"Errore caricamento replay {replay_id}: {str(e)}")
+        return None
 
 # ------------------------LOGGING E DEBUG-----------------------------------
 def log_character_operation(operation: str, char_data: Dict, user_email: str, **extra_data):
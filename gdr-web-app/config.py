@@ -9,12 +9,103 @@ DATA_DIR_PGS = os.path.join(BASE_DIR, 'data', 'json', 'personaggi')
 # directory file JSON degli inventari
 DATA_DIR_INV = os.path.join(BASE_DIR, 'data', 'json', 'inventari')
 
+# indice proprietario -> file inventario (fuori dalla cartella indicizzata)
+DATA_INV_INDEX = os.path.join(BASE_DIR, 'data', 'json', 'inventari_index.json')
+
+# database degli utenti (SQLAlchemy); i percorsi sqlite relativi sono
+# nella cartella instance dell'app
+SQLALCHEMY_DATABASE_URI = os.environ.get('GDR_DATABASE_URI', 'sqlite:///user.db')
+
+# backend di storage dei dati di gioco: 'directory' (un file JSON per
+# record, default) oppure 'sqlite' (tutti i record in DATA_DB; i personaggi
+# già salvati si copiano con python -m characters.migrazione_store)
+STORAGE_BACKEND = os.environ.get('GDR_STORAGE_BACKEND', 'directory')
+
+# database embedded usato dal backend 'sqlite'
+DATA_DB = os.path.join(BASE_DIR, 'data', 'gioco.db')
+
+# finestra (secondi) entro cui più salvataggi dello stesso file JSON
+# vengono accorpati in un'unica scrittura; 0 = scrittura immediata
+WRITE_BEHIND_WINDOW = float(os.environ.get('GDR_WRITE_BEHIND_MS', 0)) / 1000
+
+# formato dei file di gioco: 'json' (indentato, default), 'json-compatto',
+# 'orjson' (JSON compatto, se installato) o 'msgpack' (binario, msgspec).
+# In lettura il formato è riconosciuto dal contenuto
+SAVE_CODEC = os.environ.get('GDR_SAVE_CODEC', 'json')
+
+# riscrive nel formato configurato i file letti in un altro formato
+SAVE_CODEC_MIGRATE = os.environ.get('GDR_SAVE_CODEC_MIGRATE', '1') == '1'
+
+# numero massimo di personaggi/inventari validati tenuti in cache per processo
+CACHE_MAX_ENTRIES = int(os.environ.get('GDR_CACHE_MAX_ENTRIES', 2048))
+
+# ogni quanti secondi l'indice delle interrogazioni sugli inventari
+# (inventory/query.py) ricontrolla i file salvati da altri worker; i
+# salvataggi di questo processo arrivano subito
+INVENTORY_QUERY_SYNC = float(os.environ.get('GDR_INVENTORY_QUERY_SYNC', 5))
+
+# email (separate da virgola) degli utenti che possono interrogare tutti gli
+# inventari; gli altri vedono solo quelli dei propri personaggi
+ADMIN_EMAILS = frozenset(
+    email.strip().lower()
+    for email in os.environ.get('GDR_ADMIN_EMAILS', '').split(',')
+    if email.strip()
+)
+
+# journal delle operazioni su più store (crediti + personaggio + inventario)
+DATA_DIR_JOURNAL = os.path.join(BASE_DIR, 'data', 'journal')
+
+# età minima (secondi) di una transazione del journal per essere recuperata
+# all'avvio: quelle più recenti possono essere in corso in un altro worker
+JOURNAL_RECOVERY_AGE = float(os.environ.get('GDR_JOURNAL_RECOVERY_AGE', 60))
+
+# ogni quanti secondi un worker riprende le transazioni rimaste nel journal
+# (alla prima creazione/eliminazione dopo l'intervallo); 0 = solo all'avvio
+JOURNAL_RECOVERY_INTERVAL = float(os.environ.get('GDR_JOURNAL_RECOVERY_INTERVAL', 300))
+
+# risultati e classifiche dei tornei (gioco/torneo.py)
+DATA_DIR_TORNEI = os.path.join(BASE_DIR, 'data', 'tornei')
+
+# replay binari dei duelli (seme + azioni, gioco/duello.py)
+DATA_DIR_REPLAY = os.path.join(BASE_DIR, 'data', 'replay')
+
+# log degli eventi di gioco (utils/log.py): scritto da un thread in
+# background a blocchi, ruotato per dimensione o età e compresso in gzip
+DATA_LOG = os.path.join(BASE_DIR, 'data', 'log.txt')
+LOG_MAX_BYTES = int(os.environ.get('GDR_LOG_MAX_BYTES', 5 * 1024 * 1024))
+LOG_MAX_AGE = float(os.environ.get('GDR_LOG_MAX_AGE', 24 * 3600))
+# file ruotati conservati (log.txt.1.gz è il più recente)
+LOG_BACKUPS = int(os.environ.get('GDR_LOG_BACKUPS', 5))
+# attesa massima (secondi) prima che un evento in coda arrivi su disco
+LOG_FLUSH_INTERVAL = float(os.environ.get('GDR_LOG_FLUSH_MS', 500)) / 1000
+# eventi in coda oltre i quali scrivi_log attende il thread di scrittura
+LOG_QUEUE_MAX = int(os.environ.get('GDR_LOG_QUEUE_MAX', 10000))
+
+# sessioni lato server: 'sqlite' (tutte in DATA_SESSIONI, default) oppure
+# un tipo di Flask-Session (es. 'filesystem', una file per sessione)
+SESSION_BACKEND = os.environ.get('GDR_SESSION_BACKEND', 'sqlite')
+DATA_SESSIONI = os.path.join(BASE_DIR, 'data', 'sessioni.db')
+# dimensione massima (byte) di una sessione serializzata: oltre non è salvata
+SESSION_MAX_BYTES = int(os.environ.get('GDR_SESSION_MAX_BYTES', 128 * 1024))
+# ogni quanti secondi un worker elimina le sessioni scadute; 0 = mai
+SESSION_GC_INTERVAL = float(os.environ.get('GDR_SESSION_GC_INTERVAL', 300))
+# una sessione non modificata rinnova la scadenza al più ogni N secondi
+SESSION_TOUCH_INTERVAL = float(os.environ.get('GDR_SESSION_TOUCH_INTERVAL', 60))
+# in sessione solo gli ID dei personaggi (riletti dalla cache) invece dei
+# dizionari completi
+SESSION_PERSONAGGI_SOLO_ID = os.environ.get('GDR_SESSION_PERSONAGGI_SOLO_ID', '1') == '1'
+
+# file di lock per oggetto usati per coordinare più worker
+DATA_DIR_LOCKS = os.path.join(BASE_DIR, 'data', 'locks')
+# ogni quanti secondi ogni worker scrive nel log le attese sui lock; 0 = mai
+LOCK_STATS_INTERVAL = float(os.environ.get('GDR_LOCK_STATS_INTERVAL', 300))
+
 def CreateDirs():
     """
     Crea directory per i file JSON per i personaggi e gli inventari
-    se non sono esistenti
+    e per il journal se non sono esistenti
     """
-    for d in (DATA_DIR_PGS, DATA_DIR_INV):
+    for d in (DATA_DIR_PGS, DATA_DIR_INV, DATA_DIR_JOURNAL):
         os.makedirs(d, exist_ok=True)
 
         # crea file gitkeep se non esiste 
@@ -23,4 +114,8 @@ def CreateDirs():
             open(gitkeep, 'a').close()
 
 # directory file JSON delle missioni
-DATA_DIR_MIS = os.path.join(BASE_DIR, 'static', 'json', 'missions')
\ No newline at end of file
+DATA_DIR_MIS = os.path.join(BASE_DIR, 'static', 'json', 'missions')
+
+# ogni quanti secondi il catalogo delle missioni ricarica i file modificati;
+# 0 = caricate solo all'avvio
+MISSIONI_RELOAD_INTERVAL = float(os.environ.get('GDR_MISSIONI_RELOAD', 5))
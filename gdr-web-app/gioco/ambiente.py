@@ -1,6 +1,6 @@
 import random
 import logging
-from typing import Dict
+from typing import Dict, Optional
 from dataclasses import dataclass
 
 from marshmallow import Schema, fields, post_load
@@ -25,7 +25,9 @@ class Ambiente():
     def modifica_attacco(self, attaccante: Personaggio) -> int:
         raise NotImplementedError
 
-    def modifica_effetto_oggetto(self, oggetto: Oggetto) -> int:
+    def modifica_effetto_oggetto(
+        self, oggetto: Oggetto, rng: Optional[random.Random] = None
+    ) -> int:
         raise NotImplementedError
 
     def modifica_cura(self, soggetto: Personaggio) -> int:
@@ -90,7 +92,9 @@ class Foresta(Ambiente):
             return self.mod_attacco
         return 0
 
-    def modifica_effetto_oggetto(self, oggetto: Oggetto) -> int:
+    def modifica_effetto_oggetto(
+        self, oggetto: Oggetto, rng: Optional[random.Random] = None
+    ) -> int:
         """
         Questo metodo non modifica l'effetto dell'oggetto.
 
@@ -159,19 +163,22 @@ class Vulcano(Ambiente):
             return -self.mod_attacco
         return 0
 
-    def modifica_effetto_oggetto(self, oggetto: Oggetto) -> int:
+    def modifica_effetto_oggetto(
+        self, oggetto: Oggetto, rng: Optional[random.Random] = None
+    ) -> int:
         """
         Il metodo aumenta il danno della bomba acida di un valore casuale
         da 0 a 15
 
         Args:
             oggetto (Oggetto): Oggetto da modificare
+            rng (random.Random): generatore del combattimento (default: random)
 
         returns:
             int: Aumento del danno della bomba acida
         """
         if isinstance(oggetto, BombaAcida):
-            variazione = random.randint(0, 15)
+            variazione = (rng or random).randint(0, 15)
             logger.info(
                 f"Nella {self.nome}, la Bomba Acida guadagna {variazione}"
                 f" danni!"
@@ -224,7 +231,9 @@ class Palude(Ambiente):
             return self.mod_attacco
         return 0
 
-    def modifica_effetto_oggetto(self, oggetto: Oggetto) -> int:
+    def modifica_effetto_oggetto(
+        self, oggetto: Oggetto, rng: Optional[random.Random] = None
+    ) -> int:
         """
         Il metodo riduce l'effetto della Pozione Cura del %30
         Args:
@@ -286,7 +295,7 @@ class AmbienteFactory:
         return Foresta()
 
     @staticmethod
-    def ambiente_random() -> Ambiente:
+    def ambiente_random(rng: Optional[random.Random] = None) -> Ambiente:
         """
         Sorteggia un ambiente casuale tra quelli disponibili.
 
@@ -297,7 +306,7 @@ class AmbienteFactory:
             ambiente: Un'istanza di una sottoclasse di Ambiente scelta
             casualmente (Foresta, Vulcano o Palude).
         """
-        random_choice = random.choice(
+        random_choice = (rng or random).choice(
             list(AmbienteFactory.get_opzioni().values())
         )
         logger.info(f"Ambiente Casuale Selezionato: {random_choice}")
@@ -0,0 +1,498 @@
+import heapq
+import uuid
+import random
+import secrets
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import gioco.classi  # noqa: F401  registra le sottoclassi di Personaggio
+from gioco.personaggio import Personaggio
+from gioco.inventario import Inventario
+from gioco.oggetto import Oggetto
+from gioco.ambiente import Ambiente, AmbienteFactory
+from gioco.missione import Missione
+from gioco.strategy import StrategiaFactory, decisioni_npc, usa_decisione
+from gioco.duello import CAMPI_PARTECIPANTE, stato_partecipante
+from gioco.schemas.personaggio import PersonaggioSchema
+from gioco.schemas.inventario import InventarioSchema
+from gioco.schemas.oggetto import OggettoSchema
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Versione del formato di to_dict
+BATTAGLIA_VERSIONE = 1
+
+# Schieramenti
+GIOCATORI = 0
+NEMICI = 1
+
+# Esiti della battaglia
+VITTORIA = "vittoria"
+SCONFITTA = "sconfitta"
+
+_schema_personaggio = PersonaggioSchema()
+_schema_inventario = InventarioSchema()
+_schema_oggetto = OggettoSchema()
+
+
+def ambiente_per_nome(nome: str) -> Ambiente:
+    """
+    Ambiente dal nome (Foresta, Vulcano, Palude), senza distinzione tra
+    maiuscole e minuscole.
+
+    Raises:
+        ValueError: se l'ambiente non esiste
+    """
+    ambienti = {
+        ambiente.nome.lower(): ambiente
+        for ambiente in AmbienteFactory.get_opzioni().values()
+    }
+    try:
+        return ambienti[nome.strip().lower()]
+    except KeyError:
+        raise ValueError(f"Ambiente sconosciuto: {nome}") from None
+
+
+class Battaglia:
+    """
+    Battaglia a turni tra i personaggi giocabili e i nemici di una Missione.
+
+    L'ordine dei turni è una coda di priorità (heap) di voci
+    (round, -iniziativa, indice): l'iniziativa (d20 + destrezza) è tirata
+    una volta all'inizio e chi agisce torna in coda per il round successivo.
+    Le voci dei combattenti sconfitti restano nell'heap e vengono scartate
+    quando arrivano in cima, senza cercarle.
+
+    I combattenti vivi di ogni schieramento sono in una lista con la
+    posizione di ciascuno in un dizionario: un sconfitto si rimuove in O(1)
+    scambiandolo con l'ultimo, e un bersaglio casuale si sceglie in O(1).
+
+    Il generatore di ogni azione deriva dal seme e dal numero di azioni già
+    eseguite, quindi tra una richiesta e l'altra basta salvare due interi.
+    """
+
+    def __init__(
+        self,
+        missione: Missione,
+        giocatori: List[Personaggio],
+        inventari: Optional[Dict[str, Inventario]] = None,
+        seed: Optional[int] = None
+    ) -> None:
+        """
+        Args:
+            missione (Missione): missione con ambiente, nemici, premi e
+                strategia dei nemici
+            giocatori (List[Personaggio]): personaggi giocabili
+            inventari (Dict[str, Inventario]): inventari per ID personaggio;
+                i nemici senza inventario ricevono quello della missione
+                (Missione.inventari_dei_nemici), gli altri uno vuoto
+            seed (int): seme della battaglia, casuale se assente
+        """
+        if not giocatori or not missione.nemici:
+            raise ValueError("Servono almeno un giocatore e un nemico")
+        inventari = {**missione.inventari_dei_nemici(), **(inventari or {})}
+        self.missione = missione
+        self.seed = secrets.randbits(63) if seed is None else seed
+        self.azioni = 0
+        self.esito: Optional[str] = None
+        # ID degli oggetti consumati dai giocatori, da togliere dagli
+        # inventari salvati a fine battaglia
+        self.usati: List[str] = []
+        self.giocatori = len(giocatori)
+        self.combattenti: List[Personaggio] = list(giocatori) + list(missione.nemici)
+        for indice, pg in enumerate(self.combattenti):
+            pg.npc = indice >= self.giocatori
+        self.inventari: List[Inventario] = [
+            inventari.get(str(pg.id)) or Inventario(id_proprietario=pg.id)
+            for pg in self.combattenti
+        ]
+        self._indicizza()
+
+        rng = self._rng()
+        self.coda: List[Tuple[int, int, int]] = [
+            (0, -(rng.randint(1, 20) + pg.destrezza), indice)
+            for indice, pg in enumerate(self.combattenti)
+            if not pg.sconfitto()
+        ]
+        heapq.heapify(self.coda)
+        self._verifica_esito()
+
+    def _indicizza(self) -> None:
+        self.indice_id: Dict[str, int] = {
+            str(pg.id): indice for indice, pg in enumerate(self.combattenti)
+        }
+        self.vivi: Tuple[List[int], List[int]] = ([], [])
+        self._posizione: Dict[int, int] = {}
+        for indice, pg in enumerate(self.combattenti):
+            if not pg.sconfitto():
+                vivi = self.vivi[self.schieramento(indice)]
+                self._posizione[indice] = len(vivi)
+                vivi.append(indice)
+
+    def _rng(self) -> random.Random:
+        # Seme stringa: derivato con sha512, stabile tra processi
+        return random.Random(f"{self.seed}:{self.azioni}")
+
+    # ------------------------STATO---------------------------------------------
+    def schieramento(self, indice: int) -> int:
+        return GIOCATORI if indice < self.giocatori else NEMICI
+
+    def vivo(self, indice: int) -> bool:
+        return indice in self._posizione
+
+    @property
+    def finita(self) -> bool:
+        return self.esito is not None
+
+    @property
+    def di_turno(self) -> Optional[int]:
+        """
+        Indice del combattente di turno (None a battaglia finita); scarta
+        dalla cima della coda le voci dei combattenti sconfitti.
+        """
+        if self.finita:
+            return None
+        while self.coda and not self.vivo(self.coda[0][2]):
+            heapq.heappop(self.coda)
+        return self.coda[0][2] if self.coda else None
+
+    @property
+    def round(self) -> int:
+        return self.coda[0][0] if self.coda else 0
+
+    def _fine_turno(self) -> None:
+        round_, iniziativa, indice = self.coda[0]
+        heapq.heapreplace(self.coda, (round_ + 1, iniziativa, indice))
+        self.azioni += 1
+
+    def _rimuovi(self, indice: int) -> None:
+        vivi = self.vivi[self.schieramento(indice)]
+        posizione = self._posizione.pop(indice)
+        ultimo = vivi.pop()
+        if ultimo != indice:
+            vivi[posizione] = ultimo
+            self._posizione[ultimo] = posizione
+
+    def _verifica_esito(self) -> None:
+        if self.finita:
+            return
+        if not self.vivi[NEMICI]:
+            self.esito = VITTORIA
+            self.missione.verifica_completamento()
+            self.missione.attiva = False
+            vincitori = [
+                inv for inv in self.inventari[:self.giocatori]
+                if inv.id_proprietario is not None
+            ]
+            if vincitori and self.missione.premi:
+                nomi = ", ".join(pg.nome for pg in self.combattenti[:self.giocatori])
+                self.missione.assegna_premio(vincitori, nomi, rng=self._rng())
+        elif not self.vivi[GIOCATORI]:
+            self.esito = SCONFITTA
+        if self.finita:
+            logger.info(f"Battaglia '{self.missione.nome}' conclusa: {self.esito}")
+
+    # ------------------------AZIONI--------------------------------------------
+    def _danneggia(self, indice: int, danno: int) -> None:
+        bersaglio = self.combattenti[indice]
+        bersaglio.subisci_danno(danno)
+        if bersaglio.sconfitto() and self.vivo(indice):
+            self._rimuovi(indice)
+
+    def _cura(self, indice: int, cura: int) -> int:
+        bersaglio = self.combattenti[indice]
+        prima = bersaglio.salute
+        bersaglio.salute = min(bersaglio.salute + cura, bersaglio.salute_max)
+        return bersaglio.salute - prima
+
+    def _applica_oggetto(self, oggetto: Oggetto, valore: Optional[int], bersaglio: int) -> str:
+        """
+        Applica al bersaglio il risultato di Inventario.usa_oggetto in base
+        al tipo dell'oggetto (le bombe restituiscono un valore negativo).
+        """
+        pg = self.combattenti[bersaglio]
+        if valore is None:
+            return f"{oggetto.nome} non ha effetto"
+        if oggetto.tipo_oggetto == "Offensivo" or valore < 0:
+            self._danneggia(bersaglio, abs(valore))
+            return f"{oggetto.nome} infligge {abs(valore)} danni a {pg.nome} (Salute residua: {pg.salute})"
+        if oggetto.tipo_oggetto == "Buff":
+            pg.attacco_max += valore
+            return f"{oggetto.nome} aumenta di {valore} l'attacco massimo di {pg.nome}"
+        effettivo = self._cura(bersaglio, valore)
+        return f"{oggetto.nome} cura {pg.nome} di {effettivo} punti (Salute: {pg.salute})"
+
+    def _attacca(self, attaccante: int, bersaglio: int, rng: random.Random) -> str:
+        att = self.combattenti[attaccante]
+        dif = self.combattenti[bersaglio]
+        # Prova d20 sulla destrezza come nei duelli: solo se riesce si tira il danno
+        if not att.esegui_azione(rng):
+            return f"{att.nome} ha fallito l'attacco!"
+        danno = att.attacca(
+            mod_ambiente=self.missione.ambiente.modifica_attacco(att), rng=rng
+        ) or 0
+        if danno <= 0:
+            return f"{att.nome} ha fallito l'attacco!"
+        self._danneggia(bersaglio, danno)
+        messaggio = f"{att.nome} infligge {danno} danni a {dif.nome} (Salute residua: {dif.salute})"
+        if dif.sconfitto():
+            messaggio += f" - {dif.nome} è sconfitto!"
+        return messaggio
+
+    def _bersaglio(self, bersaglio_id: str) -> int:
+        indice = self.indice_id.get(str(bersaglio_id))
+        if indice is None or not self.vivo(indice):
+            raise ValueError("Bersaglio non valido o già sconfitto")
+        return indice
+
+    def azione_giocatore(
+        self,
+        bersaglio_id: str,
+        oggetto_id: Optional[str] = None,
+        bersaglio_oggetto_id: Optional[str] = None
+    ) -> List[str]:
+        """
+        Turno del personaggio giocabile di turno: uso opzionale di un oggetto
+        del suo inventario e attacco.
+
+        Args:
+            bersaglio_id (str): ID del combattente da attaccare
+            oggetto_id (str): ID dell'oggetto da usare (opzionale)
+            bersaglio_oggetto_id (str): ID del bersaglio dell'oggetto,
+                default il personaggio stesso per cure e buff, il bersaglio
+                dell'attacco per gli oggetti offensivi
+
+        Returns:
+            List[str]: messaggi del turno
+
+        Raises:
+            ValueError: se non è il turno di un giocatore, o bersaglio e
+                oggetto non sono validi
+        """
+        attore = self.di_turno
+        if attore is None or self.schieramento(attore) != GIOCATORI:
+            raise ValueError("Non è il turno di un personaggio giocabile")
+        bersaglio = self._bersaglio(bersaglio_id)
+        if bersaglio == attore:
+            raise ValueError("Un personaggio non può attaccare sé stesso")
+
+        rng = self._rng()
+        pg = self.combattenti[attore]
+        messaggi = [f"Turno di {pg.nome}"]
+        if oggetto_id:
+            inventario = self.inventari[attore]
+            oggetto = inventario.cerca_per_id(oggetto_id)
+            if oggetto is None:
+                raise ValueError("Oggetto non presente nell'inventario")
+            if bersaglio_oggetto_id:
+                bersaglio_oggetto = self._bersaglio(bersaglio_oggetto_id)
+            elif oggetto.tipo_oggetto == "Offensivo":
+                bersaglio_oggetto = bersaglio
+            else:
+                bersaglio_oggetto = attore
+            valore = inventario.usa_oggetto(oggetto, ambiente=self.missione.ambiente, rng=rng)
+            self.usati.append(str(oggetto.id))
+            messaggi.append(self._applica_oggetto(oggetto, valore, bersaglio_oggetto))
+
+        if self.vivo(bersaglio):
+            messaggi.append(self._attacca(attore, bersaglio, rng))
+        self._fine_turno()
+        self._verifica_esito()
+        return messaggi
+
+    def _prossimi_npc(self) -> List[int]:
+        """
+        Nemici che agiranno, in ordine, prima del prossimo giocatore. Nei
+        turni dei nemici nessun nemico viene colpito, quindi la loro salute
+        e i loro inventari cambiano solo con la loro stessa azione.
+        """
+        prossimi = []
+        for _, _, indice in sorted(self.coda):
+            if not self.vivo(indice):
+                continue
+            if self.schieramento(indice) == GIOCATORI or indice in prossimi:
+                break
+            prossimi.append(indice)
+        return prossimi
+
+    def _decisioni_npc(self, nemici: List[int]) -> Dict[int, int]:
+        """
+        Uso degli oggetti dei nemici indicati deciso in una sola passata
+        vettoriale (decisioni_npc), con un generatore derivato dal seme e
+        dal numero di azioni come quello delle singole azioni.
+
+        Returns:
+            Dict[int, int]: azione della strategia per indice del nemico
+        """
+        strategia = self.missione.strategia_nemici
+        if strategia is None or not nemici:
+            return {}
+        azioni = decisioni_npc(
+            strategia,
+            [self.combattenti[indice].salute for indice in nemici],
+            [self.inventari[indice] for indice in nemici],
+            rng=np.random.default_rng([self.seed % 2**64, self.azioni])
+        )
+        return dict(zip(nemici, (int(azione) for azione in azioni)))
+
+    def azione_npc(self, decisione: Optional[int] = None) -> List[str]:
+        """
+        Turno del nemico di turno: uso degli oggetti secondo la strategia
+        della missione (cura su sé stesso, danni su un giocatore) e attacco
+        a un giocatore vivo scelto a caso.
+
+        Args:
+            decisione (int): uso degli oggetti già deciso con
+                _decisioni_npc; se assente decide la strategia per questo
+                solo nemico
+
+        Returns:
+            List[str]: messaggi del turno
+
+        Raises:
+            ValueError: se non è il turno di un nemico
+        """
+        attore = self.di_turno
+        if attore is None or self.schieramento(attore) != NEMICI:
+            raise ValueError("Non è il turno di un nemico")
+
+        rng = self._rng()
+        npc = self.combattenti[attore]
+        messaggi = [f"Turno di {npc.nome}"]
+        bersaglio = rng.choice(self.vivi[GIOCATORI])
+        strategia = self.missione.strategia_nemici
+        if strategia is not None:
+            if decisione is not None:
+                valore = usa_decisione(decisione, self.inventari[attore], self.missione.ambiente, rng)
+            else:
+                valore = strategia.uso_inventario_npc(
+                    npc.salute, self.inventari[attore], self.missione.ambiente, rng
+                )
+            if valore is not None and valore > 0:
+                effettivo = self._cura(attore, valore)
+                messaggi.append(f"{npc.nome} si cura di {effettivo} punti (Salute: {npc.salute})")
+            elif valore is not None and valore < 0:
+                dif = self.combattenti[bersaglio]
+                self._danneggia(bersaglio, -valore)
+                messaggi.append(f"{npc.nome} lancia una Bomba Acida su {dif.nome}: {-valore} danni (Salute residua: {dif.salute})")
+
+        if self.vivo(bersaglio):
+            messaggi.append(self._attacca(attore, bersaglio, rng))
+        self._fine_turno()
+        self._verifica_esito()
+        return messaggi
+
+    def avanza(self) -> List[str]:
+        """
+        Esegue i turni dei nemici fino al turno di un giocatore o alla fine
+        della battaglia. L'uso degli oggetti di tutti questi nemici è deciso
+        insieme all'inizio (Strategia.decidi_batch).
+
+        Returns:
+            List[str]: messaggi dei turni eseguiti
+        """
+        messaggi = []
+        decisioni = self._decisioni_npc(self._prossimi_npc())
+        while True:
+            attore = self.di_turno
+            if attore is None or self.schieramento(attore) == GIOCATORI:
+                break
+            messaggi.extend(self.azione_npc(decisioni.pop(attore, None)))
+        if self.esito == VITTORIA:
+            messaggi.append(f"Missione '{self.missione.nome}' completata!")
+        elif self.esito == SCONFITTA:
+            messaggi.append("Tutti i personaggi sono stati sconfitti")
+        return messaggi
+
+    # ------------------------SERIALIZZAZIONE-----------------------------------
+    def to_dict(self) -> dict:
+        """
+        Stato compatto da salvare tra una richiesta e l'altra: i combattenti
+        come liste di valori (CAMPI_PARTECIPANTE), gli inventari e la coda
+        dei turni; i vivi e gli indici si ricostruiscono al caricamento.
+
+        Returns:
+            dict: stato serializzabile in JSON
+        """
+        missione = self.missione
+        return {
+            "versione": BATTAGLIA_VERSIONE,
+            "seed": self.seed,
+            "azioni": self.azioni,
+            "esito": self.esito,
+            "usati": self.usati,
+            "missione": {
+                "id": str(missione.id),
+                "nome": missione.nome,
+                "ambiente": missione.ambiente.nome,
+                "strategia": missione.strategia_nemici.nome if missione.strategia_nemici else None,
+                "premi": [_schema_oggetto.dump(premio) for premio in missione.premi],
+                "completata": missione.completata,
+            },
+            "giocatori": self.giocatori,
+            "combattenti": [
+                [stato[campo] for campo in CAMPI_PARTECIPANTE]
+                for stato in (_schema_personaggio.dump(pg) for pg in self.combattenti)
+            ],
+            # gli inventari vuoti dei nemici non si salvano
+            "inventari": [
+                _schema_inventario.dump(inv)
+                if inv.oggetti or indice < self.giocatori else None
+                for indice, inv in enumerate(self.inventari)
+            ],
+            "coda": [list(voce) for voce in self.coda],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Battaglia':
+        """
+        Ricrea la battaglia da to_dict.
+
+        Args:
+            data (dict): stato salvato
+
+        Returns:
+            Battaglia:
+        """
+        if data.get("versione") != BATTAGLIA_VERSIONE:
+            raise ValueError(f"Versione battaglia non supportata: {data.get('versione')}")
+        combattenti = [
+            _schema_personaggio.load(stato_partecipante(valori))
+            for valori in data["combattenti"]
+        ]
+        giocatori = data["giocatori"]
+        dati_missione = data["missione"]
+        missione = Missione(
+            id=uuid.UUID(dati_missione["id"]),
+            nome=dati_missione["nome"],
+            ambiente=ambiente_per_nome(dati_missione["ambiente"]),
+            nemici=[pg for pg in combattenti[giocatori:] if not pg.sconfitto()],
+            premi=[_schema_oggetto.load(premio) for premio in dati_missione["premi"]],
+            strategia_nemici=(
+                StrategiaFactory.usa_strategia(dati_missione["strategia"])
+                if dati_missione["strategia"] else None
+            ),
+            completata=dati_missione["completata"],
+            attiva=data["esito"] is None,
+        )
+
+        battaglia = cls.__new__(cls)
+        battaglia.missione = missione
+        battaglia.seed = data["seed"]
+        battaglia.azioni = data["azioni"]
+        battaglia.esito = data["esito"]
+        battaglia.usati = data["usati"]
+        battaglia.giocatori = giocatori
+        battaglia.combattenti = combattenti
+        for indice, pg in enumerate(combattenti):
+            pg.npc = indice >= giocatori
+        battaglia.inventari = [
+            _schema_inventario.load(inv) if inv else Inventario(id_proprietario=pg.id)
+            for inv, pg in zip(data["inventari"], combattenti)
+        ]
+        battaglia.coda = [tuple(voce) for voce in data["coda"]]
+        battaglia._indicizza()
+        return battaglia
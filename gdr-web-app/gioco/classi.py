@@ -2,7 +2,10 @@ import random, uuid, logging
 from gioco.personaggio import Personaggio
 
 from dataclasses import dataclass, field
+from typing import Optional
 from marshmallow import Schema, fields, post_load
+from gioco.storico import StoricoDanni
+from gioco.schemas.storico import StoricoDanniField
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -20,7 +23,7 @@ class Mago(Personaggio):
     attacco_max: int = 90
 
 
-    def attacca(self, mod_ambiente: int = 0) -> None:
+    def attacca(self, mod_ambiente: int = 0, rng: Optional[random.Random] = None) -> None:
         """
         Il Mago ha attacco minimo diminuito di 5 e attacco massimo
         aumentato di 10
@@ -28,17 +31,18 @@ class Mago(Personaggio):
         Args:
             bersaglio (Personaggio): personaggio che subisce l'attacco
             mod_ambiente (int): modificatore ambientale di attacco (default: 0)
+            rng (random.Random): generatore del combattimento (default: random)
 
         Returns:
             int: danno inflitto all'avversario
         """
-        danno = random.randint(self.attacco_min, self.attacco_max)
+        danno = (rng or random).randint(self.attacco_min, self.attacco_max)
         danno += mod_ambiente
         msg = f"{self.nome} lancia un incantesimo infliggendo {danno} danni!"
         logger.info(msg)
         return danno
 
-    def recupera_salute(self, mod_ambiente: int = 0) -> None:
+    def recupera_salute(self, mod_ambiente: int = 0, rng: Optional[random.Random] = None) -> None:
         """
         Recupera la salute del Mago alla fine di ogni duello del 20%
 
@@ -71,7 +75,7 @@ class Guerriero(Personaggio):
     attacco_min: int = 20
     attacco_max: int = 100
 
-    def attacca(self, mod_ambiente: int = 0) -> int:
+    def attacca(self, mod_ambiente: int = 0, rng: Optional[random.Random] = None) -> int:
         """
         Il Guerriero ha un attacco minimo aumentato di 15*  e un attacco
         massimo aumentato di 20* + il modificatore dell'ambiente corrente
@@ -80,11 +84,12 @@ class Guerriero(Personaggio):
         Args:
             bersaglio (Personaggio): personaggio che subisce l'attacco
             mod_ambiente (int): modificatore ambientale di attacco (default: 0)
+            rng (random.Random): generatore del combattimento (default: random)
 
         Returns:
             None
         """
-        danno = random.randint(
+        danno = (rng or random).randint(
             self.attacco_min,
             self.attacco_max + mod_ambiente
         )
@@ -92,7 +97,7 @@ class Guerriero(Personaggio):
         logger.info(msg)
         return danno
 
-    def recupera_salute(self, mod_ambiente: int = 0) -> None:
+    def recupera_salute(self, mod_ambiente: int = 0, rng: Optional[random.Random] = None) -> None:
         """
         Il guerriero al termine di ogni duello recupera salute pari 30
 
@@ -125,20 +130,21 @@ class Ladro(Personaggio):
     attacco_min: int = 10
 
 
-    def attacca(self, mod_ambiente: int = 0) -> int:
+    def attacca(self, mod_ambiente: int = 0, rng: Optional[random.Random] = None) -> int:
         """
         attacco del ladro valore random tra attacco_min e attacco_max
         con un modificatore ambientale, se l'azione ha successo
 
         Args:
             mod_ambiente (int): modificatore ambientale di attacco (default: 0)
+            rng (random.Random): generatore del combattimento (default: random)
 
         Returns:
             danno (int): danno inflitto all'avversario
         """
         danno = 0
-        if self.esegui_azione():
-            danno = random.randint(
+        if self.esegui_azione(rng):
+            danno = (rng or random).randint(
                 self.attacco_min, self.attacco_max
             ) + mod_ambiente
             msg = f"{self.nome} colpisce furtivamente infliggendo {danno} danni!"
@@ -147,7 +153,7 @@ class Ladro(Personaggio):
         logger.info(msg)
         return danno
 
-    def recupera_salute(self, mod_ambiente: int = 0) -> None:
+    def recupera_salute(self, mod_ambiente: int = 0, rng: Optional[random.Random] = None) -> None:
         """
         Permette al ladro di recuperare un numero casuale
         di punti salute in un range 10-40, modificato dall'ambiente
@@ -155,11 +161,12 @@ class Ladro(Personaggio):
         Args:
             mod_ambiente (int): modificatore ambientale di recupero
             (default: 0)
+            rng (random.Random): generatore del combattimento (default: random)
 
         Returns:
             None
         """
-        recupero = random.randint(10, 40) + mod_ambiente
+        recupero = (rng or random).randint(10, 40) + mod_ambiente
         nuova_salute = min(self.salute + recupero, 140)
         effettivo = nuova_salute - self.salute
         self.salute = nuova_salute
@@ -176,7 +183,7 @@ class PersonaggioSchema(Schema):
     classe = fields.String(required=True)
     id = fields.UUID(load_default=lambda: uuid.uuid4())
 
-    storico_danni_subiti = fields.List(fields.Integer(), load_default=list)
+    storico_danni_subiti = StoricoDanniField(load_default=StoricoDanni)
 
     def _set_default_if_empty(self, data, key, default):
         """
@@ -187,7 +194,6 @@ class PersonaggioSchema(Schema):
 
     @post_load
     def make_personaggio(self, data, **kwargs):
-        print(f"\nimport: \n{data}\n")
         classe = data.get("classe", "Personaggio")
         # Rimuovi il campo 'classe' dai dati prima di creare l'istanza
         data_clean = {k: v for k, v in data.items() if k != "classe"}
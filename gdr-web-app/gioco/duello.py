@@ -0,0 +1,315 @@
+import sys
+import time
+import uuid
+import random
+import secrets
+import logging
+from array import array
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import gioco.classi  # noqa: F401  registra le sottoclassi di Personaggio
+from gioco.personaggio import Personaggio
+from gioco.schemas.personaggio import PersonaggioSchema
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Versione del formato dei replay
+# 2: esito di ogni azione (danno o MANCATO) invece dell'indice dell'attore
+REPLAY_VERSIONE = 2
+
+# Esito di un'azione fallita nel replay (i danni non sono negativi)
+MANCATO = -1
+
+# Campi dei combattenti salvati nel replay, in quest'ordine (liste di valori
+# invece di dizionari); lo storico dei danni non influenza il duello
+CAMPI_PARTECIPANTE = (
+    "classe", "id", "nome", "npc", "salute_max", "salute",
+    "attacco_min", "attacco_max", "livello", "destrezza",
+)
+
+_schema = PersonaggioSchema()
+
+
+def esegui_turno(
+    attaccante: Personaggio,
+    difensore: Personaggio,
+    rng: Optional[random.Random] = None
+) -> Tuple[bool, int, str]:
+    """
+    Esegue un singolo turno di combattimento.
+
+    Args:
+        attaccante (Personaggio): Personaggio attaccante
+        difensore (Personaggio): Personaggio difensore
+        rng (random.Random): generatore del duello, default il modulo random
+
+    Returns:
+        Tuple[bool, int, str]: (successo, danno_inflitto, messaggio)
+    """
+    if attaccante.esegui_azione(rng):
+        return applica_esito(attaccante, difensore, attaccante.attacca(rng=rng))
+    return applica_esito(attaccante, difensore, MANCATO)
+
+
+def applica_esito(attaccante: Personaggio, difensore: Personaggio, esito: int) -> Tuple[bool, int, str]:
+    """
+    Applica l'esito già noto di un turno (tirato da esegui_turno o letto
+    da un replay), senza generatore.
+
+    Args:
+        attaccante (Personaggio): Personaggio attaccante
+        difensore (Personaggio): Personaggio difensore
+        esito (int): danno inflitto o MANCATO
+
+    Returns:
+        Tuple[bool, int, str]: (successo, danno_inflitto, messaggio)
+    """
+    if esito == MANCATO:
+        return False, 0, f"{attaccante.nome} ha fallito l'attacco!"
+    difensore.subisci_danno(esito)
+    messaggio = f"{attaccante.nome} infligge {esito} danni a {difensore.nome} (Salute residua: {difensore.salute})"
+    return True, esito, messaggio
+
+
+def esito_duello(pg1: Personaggio, pg2: Personaggio) -> str:
+    """
+    Determina il vincitore del combattimento.
+
+    Returns:
+        str: Messaggio del risultato
+    """
+    if pg1.salute <= 0 and pg2.salute <= 0:
+        return "Pareggio! Entrambi i combattenti sono stati sconfitti"
+    elif pg1.salute <= 0:
+        return f"Vittoria di {pg2.nome}!"
+    elif pg2.salute <= 0:
+        return f"Vittoria di {pg1.nome}!"
+    return "Combattimento in corso..."
+
+
+@dataclass
+class Replay():
+    """
+    Replay compatto di un duello: il seme del generatore, lo stato iniziale
+    dei combattenti e l'esito di ogni azione (danno o MANCATO, quattro byte per
+    azione; l'attore segue l'ordine dei turni) al posto delle righe di
+    testo del log. rigioca() rigenera il log applicando gli esiti salvati,
+    senza rilanciare i dadi. Senza azioni il replay descrive un duello non
+    ancora concluso, che si ricostruisce dal seme.
+    """
+    seed: int
+    partecipanti: List[list]
+    azioni: array = field(default_factory=lambda: array('i'))
+    turni_max: Optional[int] = None
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    creato: float = field(default_factory=time.time)
+    versione: int = REPLAY_VERSIONE
+
+    def to_dict(self) -> dict:
+        """Restituisce uno stato serializzabile (le azioni restano bytes,
+        interi a 32 bit little-endian, pensato per il codec msgpack).
+
+        Returns:
+            dict: Dizionario del replay
+        """
+        return {
+            "versione": self.versione,
+            "id": self.id,
+            "creato": self.creato,
+            "seed": self.seed,
+            "turni_max": self.turni_max,
+            "partecipanti": self.partecipanti,
+            "azioni": _azioni_in_bytes(self.azioni),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Replay':
+        """ricrea il replay da to_dict
+
+        Args:
+            data (dict): dati salvati (azioni in bytes o esadecimale)
+
+        Returns:
+            Replay:
+        """
+        if data.get("versione") != REPLAY_VERSIONE:
+            raise ValueError(f"Versione replay non supportata: {data.get('versione')}")
+        azioni = data["azioni"]
+        if isinstance(azioni, str):  # salvato in JSON come esadecimale
+            azioni = bytes.fromhex(azioni)
+        return cls(
+            seed=data["seed"],
+            partecipanti=data["partecipanti"],
+            azioni=_azioni_da_bytes(azioni),
+            turni_max=data.get("turni_max"),
+            id=data["id"],
+            creato=data["creato"],
+        )
+
+
+def _azioni_in_bytes(azioni: array) -> bytes:
+    if sys.byteorder == "big":
+        azioni = array('i', azioni)
+        azioni.byteswap()
+    return azioni.tobytes()
+
+
+def _azioni_da_bytes(dati: bytes) -> array:
+    azioni = array('i')
+    azioni.frombytes(dati)
+    if sys.byteorder == "big":
+        azioni.byteswap()
+    return azioni
+
+
+def _stato_iniziale(pg: Personaggio) -> list:
+    stato = _schema.dump(pg)
+    return [stato[campo] for campo in CAMPI_PARTECIPANTE]
+
+
+def stato_partecipante(valori: list) -> dict:
+    """
+    Dizionario del combattente salvato nel replay (per PersonaggioSchema).
+
+    Args:
+        valori (list): valori nell'ordine di CAMPI_PARTECIPANTE
+
+    Returns:
+        dict: dati del personaggio
+    """
+    return dict(zip(CAMPI_PARTECIPANTE, valori))
+
+
+class Duello:
+    """
+    Duello tra due personaggi con le regole di begin_combat (a ogni turno
+    attacca prima pg1, poi pg2 se ancora in piedi) e un generatore dedicato
+    inizializzato con il seme: a parità di seme e stato iniziale il duello
+    è identico, quindi basta il replay per ricostruirlo.
+
+    Con `esiti` il duello applica gli esiti salvati in un replay invece di
+    tirare i dadi.
+    """
+
+    def __init__(
+        self,
+        pg1: Personaggio,
+        pg2: Personaggio,
+        seed: Optional[int] = None,
+        turni_max: Optional[int] = None,
+        esiti: Optional[Sequence[int]] = None
+    ) -> None:
+        self.seed = secrets.randbits(63) if seed is None else seed
+        self.rng = random.Random(self.seed)
+        self.pg1 = pg1
+        self.pg2 = pg2
+        self.turno = 1
+        self.turni_max = turni_max
+        self.esiti = esiti
+        self.replay = Replay(
+            seed=self.seed,
+            partecipanti=[_stato_iniziale(pg1), _stato_iniziale(pg2)],
+            turni_max=turni_max
+        )
+
+    @property
+    def finito(self) -> bool:
+        return self.pg1.salute <= 0 or self.pg2.salute <= 0
+
+    @property
+    def interrotto(self) -> bool:
+        """True se il duello si è fermato al limite di turni senza vincitori"""
+        return not self.finito and self.turni_max is not None and self.turno > self.turni_max
+
+    def turni(self) -> Iterator[Tuple[int, List[str]]]:
+        """
+        Svolge il duello un turno alla volta, fino alla fine o a turni_max.
+
+        Yields:
+            Tuple[int, List[str]]: numero del turno e righe del log
+
+        Raises:
+            ValueError: se gli esiti del replay finiscono prima del duello
+        """
+        combattenti = (self.pg1, self.pg2)
+        while not self.finito and not self.interrotto:
+            righe = [f"Turno {self.turno}:"]
+            for attore in (0, 1):
+                attaccante, difensore = combattenti[attore], combattenti[1 - attore]
+                if self.esiti is None:
+                    successo, danno, messaggio = esegui_turno(attaccante, difensore, self.rng)
+                else:
+                    indice = len(self.replay.azioni)
+                    if indice >= len(self.esiti):
+                        raise ValueError(f"Replay {self.replay.id} incompleto")
+                    successo, danno, messaggio = applica_esito(attaccante, difensore, self.esiti[indice])
+                self.replay.azioni.append(danno if successo else MANCATO)
+                righe.append(messaggio)
+                if difensore.salute <= 0:
+                    break
+            yield self.turno, righe
+            if not self.finito:
+                self.turno += 1
+
+    def risultato(self) -> str:
+        if self.interrotto:
+            return f"Combattimento interrotto dopo {self.turni_max} turni"
+        return esito_duello(self.pg1, self.pg2)
+
+    def svolgi(self) -> Iterator[str]:
+        """
+        Svolge il duello fino alla fine, una riga di log alla volta.
+
+        Yields:
+            str: righe del log del combattimento
+        """
+        for _, righe in self.turni():
+            yield from righe
+        yield f"Risultato finale: {self.risultato()}"
+
+
+def ricostruisci(replay: Replay) -> Duello:
+    """
+    Duello nello stato iniziale descritto dal replay, con lo stesso seme.
+    Se il replay ha le azioni il duello applica i loro esiti.
+
+    Args:
+        replay (Replay): replay salvato (anche senza azioni)
+
+    Returns:
+        Duello: duello da svolgere
+    """
+    pg1, pg2 = (_schema.load(stato_partecipante(v)) for v in replay.partecipanti)
+    duello = Duello(
+        pg1, pg2, seed=replay.seed, turni_max=replay.turni_max,
+        esiti=replay.azioni or None
+    )
+    duello.replay.id = replay.id
+    duello.replay.creato = replay.creato
+    return duello
+
+
+def rigioca(replay: Replay) -> Tuple[Duello, List[str]]:
+    """
+    Ricostruisce un duello dal suo replay e ne rigenera il log applicando
+    gli esiti salvati (il risultato non dipende dal generatore né da
+    modifiche successive alle regole di attacco).
+
+    Args:
+        replay (Replay): replay salvato
+
+    Returns:
+        Tuple[Duello, List[str]]: duello concluso (combattenti nello stato
+            finale) e righe del log
+
+    Raises:
+        ValueError: se gli esiti salvati non descrivono un duello completo
+            (finiscono prima o avanzano dopo la fine)
+    """
+    duello = ricostruisci(replay)
+    log = list(duello.svolgi())
+    if replay.azioni and len(duello.replay.azioni) != len(replay.azioni):
+        raise ValueError(f"Il replay {replay.id} non è più riproducibile")
+    return duello, log
@@ -1,10 +1,11 @@
 import uuid
+import random
 from gioco.oggetto import Oggetto
 from gioco.schemas.oggetto import OggettoSchema
 from gioco.personaggio import Personaggio
 from gioco.ambiente import Ambiente
 #  , Json
-from typing import List, Optional, Union
+from typing import Dict, Iterable, Iterator, List, Optional, Union
 from dataclasses import dataclass, field
 from marshmallow import Schema, fields, post_load
 import logging
@@ -12,6 +13,155 @@ import logging
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+class OggettiInventario:
+    """
+    Oggetti di un inventario in ordine di inserimento, indicizzati per ID,
+    con conteggio per classe e valore totale aggiornati a ogni modifica:
+    ricerca, uso e rimozione per ID e statistiche costano O(1) anche con
+    decine di migliaia di oggetti.
+
+    Si usa come la lista di prima (iterazione, len, append, remove, clear)
+    e viene serializzato allo stesso modo, come lista di oggetti.
+    """
+
+    __slots__ = ("_per_id", "_conteggi", "_valore")
+
+    def __init__(self, oggetti: Iterable[Oggetto] = ()) -> None:
+        self._per_id: Dict[str, Oggetto] = {}
+        self._conteggi: Dict[str, int] = {}
+        self._valore = 0
+        for oggetto in oggetti:
+            self.append(oggetto)
+
+    def append(self, oggetto: Oggetto) -> None:
+        """
+        Aggiunge un oggetto in fondo. I dati vecchi con ID duplicati vanno
+        prima corretti con deduplica_id (lo fanno i caricamenti).
+
+        Raises:
+            ValueError: se un oggetto con lo stesso ID è già nell'inventario
+        """
+        chiave = str(oggetto.id)
+        if chiave in self._per_id:
+            raise ValueError(f"Oggetto '{oggetto.nome}' con ID {chiave} già presente nell'inventario")
+        self._per_id[chiave] = oggetto
+        classe = oggetto.classe
+        self._conteggi[classe] = self._conteggi.get(classe, 0) + 1
+        self._valore += oggetto.valore or 0
+
+    def extend(self, oggetti: Iterable[Oggetto]) -> None:
+        for oggetto in oggetti:
+            self.append(oggetto)
+
+    def _togli(self, chiave: str) -> Oggetto:
+        oggetto = self._per_id.pop(chiave)
+        classe = oggetto.classe
+        if self._conteggi[classe] == 1:
+            del self._conteggi[classe]
+        else:
+            self._conteggi[classe] -= 1
+        self._valore -= oggetto.valore or 0
+        return oggetto
+
+    def remove(self, oggetto: Oggetto) -> None:
+        """
+        Rimuove l'oggetto uguale a quello dato, come list.remove (l'uguaglianza
+        degli oggetti comprende l'ID, quindi basta cercare per ID).
+
+        Raises:
+            ValueError: se l'oggetto non è nell'inventario
+        """
+        chiave = str(oggetto.id)
+        if self._per_id.get(chiave) != oggetto:
+            raise ValueError(f"Oggetto '{oggetto.nome}' non presente nell'inventario")
+        self._togli(chiave)
+
+    def pop_id(self, oggetto_id: Union[str, uuid.UUID]) -> Optional[Oggetto]:
+        """
+        Rimuove l'oggetto con questo ID.
+
+        Returns:
+            Optional[Oggetto]: l'oggetto rimosso, None se non presente
+        """
+        chiave = str(oggetto_id)
+        return self._togli(chiave) if chiave in self._per_id else None
+
+    def get(self, oggetto_id: Union[str, uuid.UUID]) -> Optional[Oggetto]:
+        """
+        Returns:
+            Optional[Oggetto]: oggetto con questo ID, None se non presente
+        """
+        return self._per_id.get(str(oggetto_id))
+
+    def clear(self) -> None:
+        self._per_id.clear()
+        self._conteggi.clear()
+        self._valore = 0
+
+    @property
+    def conteggi(self) -> Dict[str, int]:
+        """Numero di oggetti per classe (copia)."""
+        return dict(self._conteggi)
+
+    @property
+    def valore_totale(self) -> int:
+        return self._valore
+
+    def __contains__(self, elemento: object) -> bool:
+        # Un oggetto è presente se ce n'è uno uguale, altrimenti si cerca l'ID
+        if isinstance(elemento, Oggetto):
+            presente = self._per_id.get(str(elemento.id))
+            return presente is not None and presente == elemento
+        return str(elemento) in self._per_id
+
+    def __iter__(self) -> Iterator[Oggetto]:
+        return iter(self._per_id.values())
+
+    def __len__(self) -> int:
+        return len(self._per_id)
+
+    def __getitem__(self, indice):
+        # Accesso per posizione come per la lista di prima: O(n)
+        return list(self._per_id.values())[indice]
+
+    def __eq__(self, altro: object) -> bool:
+        if isinstance(altro, (OggettiInventario, list, tuple)):
+            return list(self) == list(altro)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"OggettiInventario({list(self)!r})"
+
+
+def deduplica_id(inventario_id: Union[str, uuid.UUID], oggetti: List[Oggetto]) -> int:
+    """
+    Assegna un nuovo ID agli oggetti il cui ID è già usato da un oggetto
+    precedente (dati salvati prima che gli ID fossero univoci). Il nuovo ID
+    dipende solo dall'inventario, dall'ID vecchio e dalla posizione: letture
+    ripetute dello stesso file danno gli stessi ID, che diventano definitivi
+    al primo salvataggio (o con inventory.migrazione).
+
+    Args:
+        inventario_id (str | UUID): ID dell'inventario
+        oggetti (List[Oggetto]): oggetti in ordine, modificati sul posto
+
+    Returns:
+        int: oggetti con l'ID cambiato
+    """
+    visti = set()
+    cambiati = 0
+    for posizione, oggetto in enumerate(oggetti):
+        chiave = str(oggetto.id)
+        if chiave in visti:
+            nuovo = uuid.uuid5(uuid.NAMESPACE_URL, f"{inventario_id}/{chiave}/{posizione}")
+            logger.warning(f"ID oggetto duplicato {chiave}: '{oggetto.nome}' diventa {nuovo}")
+            oggetto.id = nuovo
+            chiave = str(nuovo)
+            cambiati += 1
+        visti.add(chiave)
+    return cambiati
+
+
 @dataclass
 class Inventario:
     """
@@ -19,9 +169,15 @@ class Inventario:
     Sarà la classe inventario a gestire le istanze di classe Oggetto
     """
     id_proprietario: Optional[uuid.UUID] = None
-    oggetti: List[Oggetto] = field(default_factory=list)
+    oggetti: OggettiInventario = field(default_factory=OggettiInventario)
     id: uuid.UUID = field(default_factory=uuid.uuid4)
 
+    def __setattr__(self, nome: str, valore) -> None:
+        # oggetti resta sempre indicizzato, anche se assegnato come lista
+        if nome == "oggetti" and not isinstance(valore, OggettiInventario):
+            valore = OggettiInventario(valore or ())
+        super().__setattr__(nome, valore)
+
     def aggiungi_oggetto(self, oggetto: Oggetto)->None:
         """
         Aggiungi un oggetto all'inventario.
@@ -71,12 +227,7 @@ class Inventario:
             None.
         """
         try:
-            found = False
-            for obj in self.oggetti:
-                if obj is oggetto:
-                    found = True
-                    break
-            return found
+            return oggetto in self.oggetti
         except Exception as e:
             logger.error(f"Errore durante la ricerca dell'oggetto: {e}")
             return None
@@ -119,12 +270,13 @@ class Inventario:
             logger.info(msg)
             return msg
         else:
-            return self.oggetti
+            return list(self.oggetti)
 
     def usa_oggetto(
         self,
         oggetto : Oggetto,
-        ambiente: Ambiente = None)-> int|None:
+        ambiente: Ambiente = None,
+        rng: Optional[random.Random] = None)-> int|None:
         """
         Utilizza un oggetto presente nell'inventario.
 
@@ -132,6 +284,7 @@ class Inventario:
             oggetto (Oggetto): oggetto da usare.
             ambiente (Ambiente): L'ambiente può alterare il funzionamento degli
             oggetti
+            rng (random.Random): generatore del combattimento (opzionale)
 
         Return:
             int: il risultato dell'uso dell'oggetto, se l'oggetto è stato
@@ -144,7 +297,7 @@ class Inventario:
             logger.info(msg)
         else:
             mod_ambiente = (
-                ambiente.modifica_effetto_oggetto(oggetto)
+                ambiente.modifica_effetto_oggetto(oggetto, rng)
                 if ambiente else 0
             )
             result = oggetto.usa(
@@ -189,15 +342,39 @@ class Inventario:
             Oggetto: L'oggetto rimosso se trovato.
             None: Se nessun oggetto con quell'ID è stato trovato.
         """
-        oggetto_id = str(oggetto_id)  # Normalizziamo a stringa per confronto sicuro
-        for oggetto in self.oggetti:
-            if str(oggetto.id) == oggetto_id:
-                self.oggetti.remove(oggetto)
-                logger.info(f"Oggetto '{oggetto.nome}' rimosso dall'inventario.")
-                return oggetto
+        oggetto = self.oggetti.pop_id(oggetto_id)
+        if oggetto is not None:
+            logger.info(f"Oggetto '{oggetto.nome}' rimosso dall'inventario.")
+            return oggetto
         logger.warning(f"Nessun oggetto con ID {oggetto_id} trovato nell'inventario.")
         return None
 
+    def cerca_per_id(self, oggetto_id: Union[str, uuid.UUID]) -> Optional[Oggetto]:
+        """
+        Cerca un oggetto dato il suo ID.
+
+        Args:
+            oggetto_id (str | UUID): L'ID dell'oggetto.
+
+        Returns:
+            Optional[Oggetto]: L'oggetto, None se non presente.
+        """
+        return self.oggetti.get(oggetto_id)
+
+    def conteggi_per_classe(self) -> Dict[str, int]:
+        """
+        Returns:
+            Dict[str, int]: numero di oggetti per classe
+        """
+        return self.oggetti.conteggi
+
+    def valore_totale(self) -> int:
+        """
+        Returns:
+            int: somma dei valori degli oggetti
+        """
+        return self.oggetti.valore_totale
+
     def to_dict(self) -> dict:
         """
         Serializza l'inventario in un dizionario.
@@ -228,9 +405,9 @@ class Inventario:
         inventario = cls()
         id_temp = data.get('id', None)
         inventario.id = uuid.UUID(id_temp) if id_temp else uuid.uuid4()
-        inventario.oggetti = [
-            Oggetto.from_dict(oggetto) for oggetto in data.get('oggetti', [])
-        ]
+        oggetti = OggettoSchema(many=True).load(data.get('oggetti', []))
+        deduplica_id(inventario.id, oggetti)
+        inventario.oggetti = oggetti
         id_prop = data.get('id_proprietario')
         inventario.id_proprietario = uuid.UUID(id_prop) if id_prop else None
 
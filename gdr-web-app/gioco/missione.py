@@ -1,14 +1,19 @@
 import random
 import uuid
+import copy
 import json
 import os
 import logging
+import threading
 from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from config import DATA_DIR_MIS
 from gioco.personaggio import Personaggio
 from gioco.ambiente import Ambiente, AmbienteFactory
 from gioco.oggetto import Oggetto
 from gioco.inventario import Inventario
 from gioco.strategy import Strategia, StrategiaFactory
+from gioco.storico import StoricoDanni
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -27,6 +32,9 @@ class Missione():
     )
     nemici: list[Personaggio] = field(default_factory=list)
     premi: list[Oggetto] = field(default_factory=list)
+    # oggetti di partenza dei nemici per nome del nemico (ogni nemico con
+    # quel nome ne riceve una copia all'inizio della battaglia)
+    inventari_nemici: dict[str, list[Oggetto]] = field(default_factory=dict)
     nome: str = ""
     strategia_nemici: Strategia = field(
         default_factory=lambda: StrategiaFactory.usa_strategia("Equilibrata")
@@ -48,6 +56,31 @@ class Missione():
         """
         return self.nemici
 
+    def inventari_dei_nemici(self) -> dict[str, Inventario]:
+        """
+        Inventari nuovi dei nemici che hanno oggetti in inventari_nemici,
+        con copie degli oggetti (ID propri): gli oggetti usati in battaglia
+        non toccano quelli della missione.
+
+        Args:
+            None
+
+        Returns:
+            dict[str, Inventario]: inventari per ID del nemico
+        """
+        inventari = {}
+        for nemico in self.nemici:
+            oggetti = []
+            for modello in self.inventari_nemici.get(nemico.nome, ()):
+                oggetto = copy.copy(modello)
+                oggetto.id = uuid.uuid4()
+                oggetti.append(oggetto)
+            if oggetti:
+                inventari[str(nemico.id)] = Inventario(
+                    id_proprietario=nemico.id, oggetti=oggetti
+                )
+        return inventari
+
     def rimuovi_nemico(self, nemico: Personaggio) -> None:
         """
         Rimuove un nemico dalla lista nemici della Missione
@@ -71,14 +104,14 @@ class Missione():
         Returns:
             None
         """
-        # Metto in una lista i nemici sconfitti che devo rinuovere
-        lista_to_remove = []
+        # Una sola passata: remove() per ogni sconfitto riscorrerebbe la lista
+        rimasti = []
         for nemico in self.nemici:
             if nemico.sconfitto():
-                lista_to_remove.append(nemico)
-        # Rimuovo i nemici sconfitti dalla proprietà nemici
-        for nemico in lista_to_remove:
-            self.rimuovi_nemico(nemico)
+                logger.info(f"{nemico} rimosso dalla lista nemici della missione")
+            else:
+                rimasti.append(nemico)
+        self.nemici = rimasti
 
     # controlla se la lista self.nemici è vuota e nel caso restituisce True
     def verifica_completamento(self) -> bool:
@@ -104,7 +137,8 @@ class Missione():
     def assegna_premio(
         self,
         inventari_giocatori: list[Inventario],
-        giocatore: str
+        giocatore: str,
+        rng: random.Random | None = None
     ) -> None:
         """
         Mette nell'inventario dei giocatori gli oggetti contenuti nella lista
@@ -113,13 +147,14 @@ class Missione():
         Args:
             inventari_giocatori (list[Inventario]): Inventari a cui assegnare
             il premio
+            rng (random.Random): generatore della partita (opzionale)
 
         Returns:
             None
 
         """
         for premio in self.premi:
-            inventario = random.choice(inventari_giocatori)
+            inventario = (rng or random).choice(inventari_giocatori)
             if inventario.id_proprietario is None:
                 msg = "Non è possibile assegnare un premio ad un inventario"
                 msg += "senza un personaggio"
@@ -151,9 +186,235 @@ class Missione():
         if self.verifica_completamento():
             self.assegna_premio(inventari_vincitori)
 
+# ------------------------CATALOGO MISSIONI---------------------------------
+@dataclass(frozen=True)
+class ModelloMissione:
+    """
+    Missione del catalogo già validata, mai modificata e mai data ai
+    giocatori: ogni partita usa una copia creata con istanza().
+    """
+    nome: str
+    ambiente: Ambiente
+    nemici: Tuple[Personaggio, ...]
+    premi: Tuple[Oggetto, ...]
+    inventari_nemici: Dict[str, Tuple[Oggetto, ...]]
+    strategia_nemici: Strategia
+    file: str
+    firma: Tuple[int, int]  # (mtime_ns, dimensione) del file letto
+
+    @classmethod
+    def da_missione(cls, missione: Missione, file: str, firma: Tuple[int, int]) -> 'ModelloMissione':
+        return cls(
+            nome=missione.nome,
+            ambiente=missione.ambiente,
+            nemici=tuple(missione.nemici),
+            premi=tuple(missione.premi),
+            inventari_nemici={
+                nome: tuple(oggetti)
+                for nome, oggetti in missione.inventari_nemici.items()
+            },
+            strategia_nemici=missione.strategia_nemici,
+            file=file,
+            firma=firma,
+        )
+
+    def istanza(self) -> Missione:
+        """
+        Nuova Missione dal modello. Si copia solo ciò che una partita
+        modifica (salute e storico dei nemici, stato dei premi); ambiente
+        e strategia sono senza stato e restano condivisi, come gli oggetti
+        dei nemici, copiati da Missione.inventari_dei_nemici.
+
+        Returns:
+            Missione: missione pronta per una partita
+        """
+        nemici = []
+        for modello in self.nemici:
+            nemico = copy.copy(modello)
+            nemico.storico_danni_subiti = StoricoDanni()
+            nemici.append(nemico)
+        premi = []
+        for modello in self.premi:
+            premio = copy.copy(modello)
+            # i premi finiscono negli inventari: id unico per ogni copia
+            premio.id = uuid.uuid4()
+            premi.append(premio)
+        return Missione(
+            nome=self.nome,
+            ambiente=self.ambiente,
+            nemici=nemici,
+            premi=premi,
+            inventari_nemici={
+                nome: list(oggetti)
+                for nome, oggetti in self.inventari_nemici.items()
+            },
+            strategia_nemici=self.strategia_nemici,
+        )
+
+
+class CatalogoMissioni:
+    """
+    Missioni disponibili lette una volta dai file JSON di `cartella` e
+    tenute in memoria come ModelloMissione: scegliere o istanziare una
+    missione non legge il disco.
+
+    aggiorna() rilegge solo i file aggiunti o modificati (mtime o
+    dimensione diversi) e toglie quelli eliminati; avvia_controllo() lo
+    chiama periodicamente da un thread in background. I modelli sono
+    sostituiti in blocco, quindi le letture non vedono mai un catalogo a
+    metà aggiornamento.
+    """
+
+    def __init__(self, cartella: str) -> None:
+        self.cartella = cartella
+        self._modelli: Dict[str, ModelloMissione] = {}
+        self._caricato = False
+        self._lock = threading.Lock()
+        self._controllo: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    def aggiorna(self) -> bool:
+        """
+        Ricarica i file delle missioni cambiati dall'ultima lettura. Un
+        file non valido è segnalato nel log e, se c'era, resta in uso la
+        versione precedente.
+
+        Returns:
+            bool: True se il catalogo è cambiato
+        """
+        from gioco.schemas.missione import MissioniSchema
+
+        with self._lock:
+            attuali = self._modelli
+            nuovi: Dict[str, ModelloMissione] = {}
+            schema = MissioniSchema()
+            try:
+                voci = [
+                    voce for voce in os.scandir(self.cartella)
+                    if voce.name.endswith(".json") and voce.is_file()
+                ]
+            except FileNotFoundError:
+                logger.warning(f"Cartella delle missioni non trovata: {self.cartella}")
+                voci = []
+            for voce in voci:
+                stat = voce.stat()
+                firma = (stat.st_mtime_ns, stat.st_size)
+                precedente = attuali.get(voce.name)
+                if precedente is not None and precedente.firma == firma:
+                    nuovi[voce.name] = precedente
+                    continue
+                try:
+                    with open(voce.path, "r", encoding="utf-8") as file:
+                        missione = schema.load(json.load(file))
+                    nuovi[voce.name] = ModelloMissione.da_missione(missione, voce.name, firma)
+                    logger.info(f"Missione '{missione.nome}' caricata da {voce.name}")
+                except Exception as e:
+                    logger.error(f"Missione {voce.name} non valida: {e}")
+                    if precedente is not None:
+                        nuovi[voce.name] = precedente
+            cambiato = nuovi.keys() != attuali.keys() or any(
+                nuovi[nome] is not attuali[nome] for nome in nuovi
+            )
+            self._modelli = nuovi
+            self._caricato = True
+            return cambiato
+
+    def _assicura_caricato(self) -> Dict[str, ModelloMissione]:
+        if not self._caricato:
+            self.aggiorna()
+        return self._modelli
+
+    def avvia_controllo(self, intervallo: float) -> None:
+        """
+        Avvia (una volta per processo) il thread che ricarica le missioni
+        modificate ogni `intervallo` secondi.
+
+        Args:
+            intervallo (float): secondi tra due controlli, <= 0 per nessun
+                controllo
+        """
+        if intervallo <= 0:
+            return
+        with self._lock:
+            if self._controllo is not None and self._controllo.is_alive() and self._pid == os.getpid():
+                return
+
+            def ciclo() -> None:
+                evento = threading.Event()
+                while not evento.wait(intervallo):
+                    try:
+                        self.aggiorna()
+                    except Exception as e:
+                        logger.error(f"Errore aggiornamento catalogo missioni: {e}")
+
+            self._pid = os.getpid()
+            self._controllo = threading.Thread(target=ciclo, name="gdr-missioni", daemon=True)
+            self._controllo.start()
+
+    def modelli(self) -> List[ModelloMissione]:
+        """
+        Returns:
+            List[ModelloMissione]: modelli in ordine di nome
+        """
+        return sorted(self._assicura_caricato().values(), key=lambda m: m.nome)
+
+    def nomi(self) -> List[str]:
+        """
+        Returns:
+            List[str]: nomi delle missioni in ordine alfabetico
+        """
+        return [modello.nome for modello in self.modelli()]
+
+    def modello(self, nome: str) -> Optional[ModelloMissione]:
+        """
+        Args:
+            nome (str): nome della missione
+
+        Returns:
+            Optional[ModelloMissione]: modello, None se non esiste
+        """
+        for modello in self._assicura_caricato().values():
+            if modello.nome == nome:
+                return modello
+        return None
+
+    def istanza(self, nome: str) -> Missione:
+        """
+        Nuova Missione dal modello con quel nome.
+
+        Args:
+            nome (str): nome della missione
+
+        Returns:
+            Missione:
+
+        Raises:
+            ValueError: se la missione non esiste
+        """
+        modello = self.modello(nome)
+        if modello is None:
+            raise ValueError(f"Missione sconosciuta: {nome}")
+        return modello.istanza()
+
+    def istanze(self) -> List[Missione]:
+        """
+        Returns:
+            List[Missione]: una nuova Missione per ogni modello
+        """
+        return [modello.istanza() for modello in self.modelli()]
+
+    def __len__(self) -> int:
+        return len(self._assicura_caricato())
+
+
+# Catalogo condiviso, caricato all'avvio dell'app (create_app)
+catalogo_missioni = CatalogoMissioni(DATA_DIR_MIS)
+
+
 # Lista delle missioni
 
 
+@dataclass
 class GestoreMissioni():
     """
     È un gestore di istanze della classe Missione, e le gestisce con diversi
@@ -161,34 +422,22 @@ class GestoreMissioni():
     """
     lista_missioni: list[Missione] = field(default_factory=list)
 
-    def setup(self) -> None:
-        from gioco.schemas.missione import MissioniSchema
+    def setup(self, catalogo: Optional[CatalogoMissioni] = None) -> None:
         """
-        Istanzio le Missioni da fornire al GestoreMissioni,
-        viene chiamato nel costruttore di GestoreMissioni
-        cerca dentro alla cartella static le missioni
-        e le istanzia in una lista di oggetti Missione
+        Istanzio le Missioni da fornire al GestoreMissioni: una copia di
+        ogni missione del catalogo (default quello condiviso, letto da
+        config.DATA_DIR_MIS), senza rileggere i file JSON.
+        Ogni file json contiene il nome della missione, l'ambiente, la
+        strategia, la lista dei nemici e dei premi e, facoltativi, gli
+        oggetti dei nemici (inventari_nemici).
+
         Args:
-            None
+            catalogo (Optional[CatalogoMissioni]): catalogo da usare
 
         Returns:
             None
         """
-
-        # Istanzio le missioni
-        # cerco dentro a static/mission ogni file json avrà lo stesso nome
-        # della missione, il nome della sottoclasse di ambiente, il nome
-        # della sottoclasse della strategia  e la lista dei nemici e dei premi
-        lista = []
-        schema = MissioniSchema()
-        routes = r"static\mission"
-        for files in os.listdir(routes):
-            if files.endswith(".json"):
-                with open(os.path.join(routes, files), 'r') as file:
-                    data = json.load(file)
-                    missione = schema.load(data)
-                    lista.append(missione)
-        self.lista_missioni = lista
+        self.lista_missioni = (catalogo or catalogo_missioni).istanze()
 
     def mostra(self) -> None:
         """
@@ -229,13 +478,13 @@ class GestoreMissioni():
                 logger.info(msg)
         return esito
 
-    def sorteggia(self) -> Missione | None:
+    def sorteggia(self, rng: random.Random | None = None) -> Missione | None:
         """
         Sorteggia una missione a caso tra quelle non completate in missioni e
         la ritorna , se non ci sono missioni non copletate ritorna False.
 
         Args:
-            None
+            rng (random.Random): generatore della partita (opzionale)
 
         Returns:
             Missione | None: Ritorna un'istanza di Missione non completata
@@ -245,7 +494,7 @@ class GestoreMissioni():
             if missione.attiva:
                 return missione
         try:
-            random.shuffle(self.lista_missioni)
+            (rng or random).shuffle(self.lista_missioni)
             for missione in self.lista_missioni:
                 if not missione.completata:
                     missione.attiva = True
@@ -255,5 +504,5 @@ class GestoreMissioni():
             raise ValueError(msg)
         except ValueError as e:
             msg = f"Errore: {e}"
-            logger(msg)
+            logger.warning(msg)
             return None
\ No newline at end of file
@@ -1,5 +1,7 @@
 import random, uuid, logging
 from dataclasses import dataclass, field
+from typing import Optional
+from gioco.storico import StoricoDanni
 
 
 logger = logging.getLogger(__name__)
@@ -26,7 +28,7 @@ class Personaggio():
     salute_max: int = 200
     attacco_min: int = 5
     attacco_max: int = 80
-    storico_danni_subiti: list[int] = field(default_factory=list)
+    storico_danni_subiti: StoricoDanni = field(default_factory=StoricoDanni)
     livello: int = 1
     destrezza: int = 15
     classe: str = ""
@@ -55,14 +57,25 @@ class Personaggio():
         # self.destrezza = 15  # Caratteristica per la sistema d20
         # self.npc = npc  # Indica se il personaggio è un NPC
 
-    def esegui_azione(self) -> bool:
+    def __post_init__(self) -> None:
+        # storico passato come lista di colpi (vecchio formato)
+        if not isinstance(self.storico_danni_subiti, StoricoDanni):
+            self.storico_danni_subiti = StoricoDanni.from_lista(
+                self.storico_danni_subiti or []
+            )
+
+    def esegui_azione(self, rng: Optional[random.Random] = None) -> bool:
         """
         Tira un d20 e verifica se il risultato è minore o uguale alla destrezza del personaggio.
 
+        Args:
+            rng (random.Random): generatore del combattimento, default il
+                modulo random
+
         Returns:
             bool: True se il testo è superato, False altrimenti.
         """
-        tiro = random.randint(1, 20)
+        tiro = (rng or random).randint(1, 20)
         successo = tiro <= self.destrezza
         if successo:
             msg = (
@@ -74,7 +87,7 @@ class Personaggio():
             logger.info(msg)
         return successo
 
-    def attacca(self, mod_ambiente: int = 0) -> int:
+    def attacca(self, mod_ambiente: int = 0, rng: Optional[random.Random] = None) -> int:
         """
         Tenta un attacco generando un danno casuale tra attacco_min e attacco_max,
         influenzato da eventuali modificatori ambientali. Il successo dipende da un tiro
@@ -82,13 +95,15 @@ class Personaggio():
 
         Args:
             mod_ambiente (int): modificatore di attacco in base all'ambiente
+            rng (random.Random): generatore del combattimento, default il
+                modulo random
 
         Returns:
             int: danno inflitto all'avversario, 0 se l'attacco fallisce
         """
         danno = 0
-        if self.esegui_azione():
-            danno = random.randint(self.attacco_min, self.attacco_max) + mod_ambiente
+        if self.esegui_azione(rng):
+            danno = (rng or random).randint(self.attacco_min, self.attacco_max) + mod_ambiente
             msg = f"{self.nome} Attacca con successo e infligge {danno} danni!"
         else:
             msg = f"{self.nome} Tenta di attaccare ma fallisce!"
@@ -102,7 +117,7 @@ class Personaggio():
             danno (int): danno subito dal personaggio
         """
         self.salute = max(0, self.salute - danno)
-        self.storico_danni_subiti.append(danno)
+        self.storico_danni_subiti.aggiungi(danno)
         msg = f"Salute di {self.nome}: {self.salute}\n"
         logger.info(msg)
 
@@ -114,13 +129,15 @@ class Personaggio():
         """
         return self.salute <= 0
 
-    def recupera_salute(self, mod_ambiente: int = 0) -> None:
+    def recupera_salute(self, mod_ambiente: int = 0, rng: Optional[random.Random] = None) -> None:
         """
         Recupera la salute del personaggio del 30% della salute corrente.
         Viene usato da pozioni e dal recupero salute post duello.
 
         Args:
             mod_ambiente (int): modificatore di recupero in base all'ambiente
+            rng (random.Random): non usato, presente per uniformità con le
+                sottoclassi
         """
         if self.salute >= self.salute_max:
             msg = f"{self.nome} ha già la salute piena."
@@ -1,6 +1,6 @@
 import uuid
 from marshmallow import Schema, fields, post_load, EXCLUDE
-from gioco.inventario import Inventario
+from gioco.inventario import Inventario, deduplica_id
 from gioco.schemas.oggetto import OggettoSchema
 
 
@@ -18,4 +18,5 @@ class InventarioSchema(Schema):
 
     @post_load
     def make_inventario(self, data, **kwargs):
+        deduplica_id(data['id'], data['oggetti'])
         return Inventario(**data)
\ No newline at end of file
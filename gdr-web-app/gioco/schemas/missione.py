@@ -1,7 +1,5 @@
-import json
-import os
 import uuid
-from marshmallow import Schema, fields, post_load
+from marshmallow import Schema, ValidationError, fields, post_load, validates_schema
 
 from gioco.ambiente import AmbienteSchema
 from gioco.missione import GestoreMissioni, Missione
@@ -16,10 +14,25 @@ class MissioniSchema(Schema):
     ambiente = fields.Nested(AmbienteSchema, required=True)
     nemici = fields.List(fields.Nested(PersonaggioSchema), required=True)
     premi = fields.List(fields.Nested(OggettoSchema), required=True)
+    # oggetti di partenza per nome del nemico
+    inventari_nemici = fields.Dict(
+        keys=fields.String(),
+        values=fields.List(fields.Nested(OggettoSchema)),
+        load_default=dict
+    )
     strategia_nemici = fields.Nested(StrategiaSchema, allow_none=True)
     completata = fields.Bool()
     attiva = fields.Bool()
 
+    @validates_schema
+    def valida_inventari_nemici(self, data, **kwargs):
+        nomi = {nemico.nome for nemico in data.get('nemici', [])}
+        sconosciuti = sorted(set(data.get('inventari_nemici', {})) - nomi)
+        if sconosciuti:
+            raise ValidationError(
+                f"Nemici sconosciuti: {', '.join(sconosciuti)}", 'inventari_nemici'
+            )
+
     @post_load
     def make_Missioni(self, data, **kwargs) -> Missione:
         return Missione(**data)
@@ -35,15 +48,9 @@ class GestoreMissioniSchema(Schema):
         return gm
 
     def prendi_Missione_Da_Json(self):
-        lista = []
-        schema = MissioniSchema()
-        routes = r"static\json\missions"
-        for files in os.listdir(routes):
-            if files.endswith(".json"):
-                with open(os.path.join(routes, files), 'r') as file:
-                    data = json.load(file)
-                    missione = schema.load(data)
-                    lista.append(missione)
+        """
+        GestoreMissioni con le missioni del catalogo (config.DATA_DIR_MIS).
+        """
         nuovo = GestoreMissioni()
-        nuovo.lista_missioni = lista
-        return nuovo
\ No newline at end of file
+        nuovo.setup()
+        return nuovo
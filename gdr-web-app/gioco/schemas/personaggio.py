@@ -2,6 +2,8 @@ from marshmallow import Schema, fields, post_load
 import uuid
 
 from gioco.personaggio import Personaggio
+from gioco.storico import StoricoDanni
+from gioco.schemas.storico import StoricoDanniField
 
 
 def get_all_subclasses(cls):
@@ -28,11 +30,10 @@ class PersonaggioSchema(Schema):
     attacco_max = fields.Integer()
     livello = fields.Integer(load_default=1)
     destrezza = fields.Integer(load_default=15)
-    storico_danni_subiti = fields.List(fields.Integer(), load_default=list)
+    storico_danni_subiti = StoricoDanniField(load_default=StoricoDanni)
 
     @post_load
     def make_personaggio(self, data, **_kwargs):
-        print(f"\nimport: \n{data}\n")
         # Crea la mappa dinamica: nome classe -> classe Python
         classe_nome = data.get("classe")
         classe_map = {
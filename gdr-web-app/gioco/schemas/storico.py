@@ -0,0 +1,28 @@
+from marshmallow import fields, ValidationError
+
+from gioco.storico import StoricoDanni
+
+
+class StoricoDanniField(fields.Field):
+    """
+    Campo Marshmallow per StoricoDanni: serializza il riepilogo compatto
+    (to_dict) e in lettura accetta anche il vecchio formato a lista di
+    tutti i colpi, che viene convertito (migrazione dei file esistenti).
+    """
+
+    def _serialize(self, value, attr, obj, **kwargs):
+        if value is None:
+            return StoricoDanni().to_dict()
+        if isinstance(value, StoricoDanni):
+            return value.to_dict()
+        return StoricoDanni.from_lista(value).to_dict()
+
+    def _deserialize(self, value, attr, data, **kwargs):
+        try:
+            if isinstance(value, list):
+                return StoricoDanni.from_lista(value)
+            if isinstance(value, dict):
+                return StoricoDanni.from_dict(value)
+        except (TypeError, ValueError) as e:
+            raise ValidationError(f"Storico danni non valido: {e}") from e
+        raise ValidationError("Storico danni non valido")
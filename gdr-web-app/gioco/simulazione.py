@@ -0,0 +1,329 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from gioco.personaggio import Personaggio
+from gioco.classi import Mago, Guerriero, Ladro
+from gioco.ambiente import Ambiente
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Percentili riportati per i danni inflitti in un duello
+PERCENTILI = (5, 25, 50, 75, 95)
+
+
+@dataclass
+class Combattente():
+    """
+    Parametri numerici di un personaggio per la simulazione, ricavati
+    dalla sua classe e dai modificatori dell'ambiente.
+    Il comportamento di ogni classe replica attacca/recupera_salute di
+    gioco/classi.py e gioco/personaggio.py.
+    """
+    nome: str
+    classe: str
+    salute: int
+    salute_max: int
+    attacco_min: int
+    attacco_max: int
+    destrezza: int
+    mod_attacco: int = 0
+    mod_cura: int = 0
+
+    @classmethod
+    def da_personaggio(
+        cls,
+        pg: Personaggio,
+        ambiente: Optional[Ambiente] = None
+    ) -> 'Combattente':
+        """
+        Crea il combattente dalla sua istanza di Personaggio.
+
+        Args:
+            pg (Personaggio): personaggio da simulare
+            ambiente (Ambiente): ambiente del duello (opzionale)
+
+        Returns:
+            Combattente: parametri del personaggio per la simulazione
+        """
+        if isinstance(pg, Mago):
+            classe = "Mago"
+        elif isinstance(pg, Guerriero):
+            classe = "Guerriero"
+        elif isinstance(pg, Ladro):
+            classe = "Ladro"
+        else:
+            classe = "Personaggio"
+        return cls(
+            nome=pg.nome,
+            classe=classe,
+            salute=pg.salute,
+            salute_max=pg.salute_max,
+            attacco_min=pg.attacco_min,
+            attacco_max=pg.attacco_max,
+            destrezza=pg.destrezza,
+            mod_attacco=ambiente.modifica_attacco(pg) if ambiente else 0,
+            mod_cura=ambiente.modifica_cura(pg) if ambiente else 0,
+        )
+
+
+# Codici delle classi negli array della simulazione
+CODICI_CLASSE = {"Personaggio": 0, "Mago": 1, "Guerriero": 2, "Ladro": 3}
+PERSONAGGIO, MAGO, GUERRIERO, LADRO = range(4)
+
+
+@dataclass
+class Schieramento():
+    """
+    Parametri di un lato dei duelli come array NumPy: la riga i descrive il
+    combattente del duello i, quindi lo stesso passo di simulazione gestisce
+    sia molti duelli dello stesso incontro sia incontri tutti diversi
+    (torneo).
+    """
+    classe: np.ndarray
+    salute: np.ndarray
+    salute_max: np.ndarray
+    attacco_min: np.ndarray
+    attacco_max: np.ndarray
+    destrezza: np.ndarray
+    mod_attacco: np.ndarray
+    mod_cura: np.ndarray
+
+    @classmethod
+    def da_combattenti(cls, combattenti: Sequence[Combattente]) -> 'Schieramento':
+        """
+        Crea lo schieramento con un combattente per riga.
+        """
+        colonne = {
+            nome: np.array([getattr(c, nome) for c in combattenti], dtype=np.int64)
+            for nome in (
+                "salute", "salute_max", "attacco_min", "attacco_max",
+                "destrezza", "mod_attacco", "mod_cura"
+            )
+        }
+        classe = np.array([CODICI_CLASSE[c.classe] for c in combattenti], dtype=np.int8)
+        return cls(classe=classe, **colonne)
+
+    def righe(self, indici: np.ndarray) -> 'Schieramento':
+        """
+        Sottoinsieme (o ripetizione) delle righe indicate.
+        """
+        return Schieramento(**{
+            nome: getattr(self, nome)[indici] for nome in self.__dataclass_fields__
+        })
+
+    def prob_colpo(self) -> np.ndarray:
+        """
+        Probabilità che un turno di esegui_turno (gioco.duello) vada a segno:
+        un tiro d20 <= destrezza, più un secondo tiro dentro attacca()
+        per Personaggio e Ladro.
+        """
+        p = np.clip(self.destrezza, 0, 20) / 20
+        doppio_tiro = (self.classe == PERSONAGGIO) | (self.classe == LADRO)
+        return np.where(doppio_tiro, p * p, p)
+
+    def tira_danni(self, rng: np.random.Generator, indici: np.ndarray) -> np.ndarray:
+        """
+        Un tiro di danno per ogni riga indicata, come in attacca() della
+        classe: il modificatore del Guerriero allarga solo il massimo.
+        """
+        guerriero = self.classe[indici] == GUERRIERO
+        mod = self.mod_attacco[indici]
+        massimo = self.attacco_max[indici] + np.where(guerriero, mod, 0)
+        danno = rng.integers(self.attacco_min[indici], massimo + 1)
+        return danno + np.where(guerriero, 0, mod)
+
+    def recupera(self, rng: np.random.Generator, indici: np.ndarray, salute: np.ndarray) -> np.ndarray:
+        """
+        recupera_salute della classe di ogni riga indicata.
+        """
+        classe = self.classe[indici]
+        mod = self.mod_cura[indici]
+        base = np.where(
+            salute >= self.salute_max[indici],
+            salute,
+            np.minimum(salute + (salute * 0.3).astype(salute.dtype) + mod, 100)
+        )
+        mago = np.minimum(salute + np.trunc((salute + mod) * 0.2).astype(salute.dtype), 80)
+        guerriero = np.minimum(salute + 30 + mod, 120)
+        ladro = np.minimum(salute + rng.integers(10, 41, salute.shape[0]) + mod, 140)
+        return np.select(
+            [classe == MAGO, classe == GUERRIERO, classe == LADRO],
+            [mago, guerriero, ladro],
+            base
+        )
+
+
+@dataclass
+class EsitiDuelli():
+    """
+    Esiti dei singoli duelli (una riga per duello).
+
+    Attributes:
+        vincitore (np.ndarray): 1 o 2, 0 se interrotto per turni_max
+        turni (np.ndarray): turni giocati
+        danni_1 (np.ndarray): danni inflitti dal primo combattente
+        danni_2 (np.ndarray): danni inflitti dal secondo combattente
+    """
+    vincitore: np.ndarray
+    turni: np.ndarray
+    danni_1: np.ndarray
+    danni_2: np.ndarray
+
+
+def simula_incontri(
+    lato_1: Schieramento,
+    lato_2: Schieramento,
+    rng: np.random.Generator,
+    turni_max: int = 500,
+    cura_fine_turno: bool = False
+) -> EsitiDuelli:
+    """
+    Simula in parallelo un duello per riga con le regole di begin_combat:
+    a ogni turno attacca prima lato_1 e poi, se ancora in piedi, lato_2.
+    Il costo è di poche operazioni vettoriali per turno sui soli duelli
+    ancora in corso, senza log per ogni tiro.
+
+    Args:
+        lato_1 (Schieramento): combattenti che attaccano per primi
+        lato_2 (Schieramento): avversari, stessa lunghezza di lato_1
+        rng (np.random.Generator): generatore dei tiri
+        turni_max (int): turni dopo i quali un duello è interrotto
+        cura_fine_turno (bool): se True i sopravvissuti usano recupera_salute
+            a fine turno con il modificatore di cura dell'ambiente
+
+    Returns:
+        EsitiDuelli: vincitore, turni e danni di ogni duello
+    """
+    duelli = lato_1.salute.shape[0]
+    p1, p2 = lato_1.prob_colpo(), lato_2.prob_colpo()
+    salute_1 = lato_1.salute.copy()
+    salute_2 = lato_2.salute.copy()
+    danni_1 = np.zeros(duelli, dtype=np.int64)
+    danni_2 = np.zeros(duelli, dtype=np.int64)
+    turni = np.zeros(duelli, dtype=np.int64)
+    attivi = (salute_1 > 0) & (salute_2 > 0)
+
+    for turno in range(1, turni_max + 1):
+        indici = np.flatnonzero(attivi)
+        if indici.size == 0:
+            break
+        turni[indici] = turno
+
+        # Attacco del primo lato
+        colpo = rng.random(indici.size) < p1[indici]
+        danno = np.where(colpo, lato_1.tira_danni(rng, indici), 0)
+        danni_1[indici] += danno
+        salute_2[indici] = np.maximum(0, salute_2[indici] - danno)
+
+        # Attacco del secondo lato solo dove il primo non ha già vinto
+        vivi = indici[salute_2[indici] > 0]
+        colpo = rng.random(vivi.size) < p2[vivi]
+        danno = np.where(colpo, lato_2.tira_danni(rng, vivi), 0)
+        danni_2[vivi] += danno
+        salute_1[vivi] = np.maximum(0, salute_1[vivi] - danno)
+
+        if cura_fine_turno:
+            vivi = vivi[salute_1[vivi] > 0]
+            salute_1[vivi] = lato_1.recupera(rng, vivi, salute_1[vivi])
+            salute_2[vivi] = lato_2.recupera(rng, vivi, salute_2[vivi])
+
+        attivi[indici] = (salute_1[indici] > 0) & (salute_2[indici] > 0)
+
+    vincitore = np.zeros(duelli, dtype=np.int8)
+    vincitore[salute_2 <= 0] = 1
+    vincitore[salute_1 <= 0] = 2
+    return EsitiDuelli(vincitore=vincitore, turni=turni, danni_1=danni_1, danni_2=danni_2)
+
+
+@dataclass
+class RisultatoSimulazione():
+    """
+    Esito aggregato di n duelli dello stesso incontro.
+    """
+    duelli: int
+    vittorie_1: int
+    vittorie_2: int
+    interrotti: int
+    turni: Dict[int, int] = field(default_factory=dict)
+    danni_1: Dict[int, float] = field(default_factory=dict)
+    danni_2: Dict[int, float] = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        """Restituisce uno stato serializzabile per JSON.
+
+        Returns:
+            dict: percentuali di vittoria, distribuzione dei turni e
+            percentili dei danni inflitti da ciascun personaggio
+        """
+        return {
+            "duelli": self.duelli,
+            "vittoria_1": self.vittorie_1 / self.duelli,
+            "vittoria_2": self.vittorie_2 / self.duelli,
+            "interrotti": self.interrotti / self.duelli,
+            "turni": {str(k): v for k, v in self.turni.items()},
+            "danni_1": {f"p{k}": v for k, v in self.danni_1.items()},
+            "danni_2": {f"p{k}": v for k, v in self.danni_2.items()},
+        }
+
+
+def simula_duelli(
+    pg1: Personaggio,
+    pg2: Personaggio,
+    ambiente: Optional[Ambiente] = None,
+    duelli: int = 10_000,
+    turni_max: int = 500,
+    cura_fine_turno: bool = False,
+    seed: Optional[int] = None
+) -> RisultatoSimulazione:
+    """
+    Simula in parallelo `duelli` combattimenti tra pg1 e pg2 con le regole di
+    begin_combat: a ogni turno attacca prima pg1 e poi, se ancora in piedi,
+    pg2. Ogni duello è una riga degli array NumPy, quindi il costo è di
+    poche operazioni vettoriali per turno, senza log per ogni tiro.
+
+    Args:
+        pg1 (Personaggio): primo combattente (attacca per primo)
+        pg2 (Personaggio): secondo combattente
+        ambiente (Ambiente): ambiente con i modificatori di attacco e cura
+        duelli (int): numero di duelli simulati
+        turni_max (int): turni dopo i quali un duello è interrotto
+        cura_fine_turno (bool): se True i sopravvissuti usano recupera_salute
+            a fine turno con il modificatore di cura dell'ambiente
+        seed (Optional[int]): seme per risultati riproducibili
+
+    Returns:
+        RisultatoSimulazione: vittorie, turni e danni aggregati
+    """
+    rng = np.random.default_rng(seed)
+    c1 = Combattente.da_personaggio(pg1, ambiente)
+    c2 = Combattente.da_personaggio(pg2, ambiente)
+    righe = np.zeros(duelli, dtype=np.intp)
+    esiti = simula_incontri(
+        Schieramento.da_combattenti([c1]).righe(righe),
+        Schieramento.da_combattenti([c2]).righe(righe),
+        rng,
+        turni_max=turni_max,
+        cura_fine_turno=cura_fine_turno
+    )
+
+    vittorie_1 = int(np.count_nonzero(esiti.vincitore == 1))
+    vittorie_2 = int(np.count_nonzero(esiti.vincitore == 2))
+    valori, conteggi = np.unique(esiti.turni, return_counts=True)
+    risultato = RisultatoSimulazione(
+        duelli=duelli,
+        vittorie_1=vittorie_1,
+        vittorie_2=vittorie_2,
+        interrotti=duelli - vittorie_1 - vittorie_2,
+        turni=dict(zip(valori.tolist(), conteggi.tolist())),
+        danni_1=dict(zip(PERCENTILI, np.percentile(esiti.danni_1, PERCENTILI).tolist())),
+        danni_2=dict(zip(PERCENTILI, np.percentile(esiti.danni_2, PERCENTILI).tolist())),
+    )
+    logger.info(
+        f"Simulati {duelli} duelli {c1.nome} vs {c2.nome}: "
+        f"{vittorie_1}-{vittorie_2} ({risultato.interrotti} interrotti)"
+    )
+    return risultato
@@ -0,0 +1,139 @@
+from array import array
+from typing import Iterable, List, Optional
+
+# Numero di colpi più recenti conservati singolarmente
+STORICO_DANNI_MAX = 20
+
+
+class StoricoDanni:
+    """
+    Storico compatto dei danni subiti da un personaggio: conteggio, somma,
+    minimo e massimo di tutti i colpi più gli ultimi `capacita` colpi in un
+    buffer circolare (array tipizzato). La dimensione resta costante per
+    tutta la vita del personaggio, a differenza di una lista di ogni colpo.
+    """
+
+    __slots__ = ("capacita", "colpi", "totale", "minimo", "massimo", "_ultimi", "_testa")
+
+    def __init__(self, capacita: int = STORICO_DANNI_MAX) -> None:
+        self.capacita = capacita
+        self.colpi = 0
+        self.totale = 0
+        self.minimo: Optional[int] = None
+        self.massimo: Optional[int] = None
+        self._ultimi = array("q")
+        self._testa = 0  # posizione del colpo più vecchio a buffer pieno
+
+    def aggiungi(self, danno: int) -> None:
+        """
+        Registra un colpo subito.
+
+        Args:
+            danno (int): danno subito
+        """
+        self.colpi += 1
+        self.totale += danno
+        self.minimo = danno if self.minimo is None else min(self.minimo, danno)
+        self.massimo = danno if self.massimo is None else max(self.massimo, danno)
+        if len(self._ultimi) < self.capacita:
+            self._ultimi.append(danno)
+        else:
+            self._ultimi[self._testa] = danno
+            self._testa = (self._testa + 1) % self.capacita
+
+    # compatibilità con il vecchio storico a lista
+    append = aggiungi
+
+    @property
+    def media(self) -> Optional[float]:
+        return self.totale / self.colpi if self.colpi else None
+
+    def ultimi(self) -> List[int]:
+        """
+        Returns:
+            List[int]: ultimi colpi dal più vecchio al più recente
+        """
+        return (self._ultimi[self._testa:] + self._ultimi[:self._testa]).tolist()
+
+    def riepilogo(self) -> dict:
+        """
+        Statistiche per l'interfaccia.
+
+        Returns:
+            dict: colpi, totale, minimo, massimo, media (arrotondata) e ultimi
+        """
+        return {
+            "colpi": self.colpi,
+            "totale": self.totale,
+            "minimo": self.minimo,
+            "massimo": self.massimo,
+            "media": round(self.media, 1) if self.colpi else None,
+            "ultimi": self.ultimi(),
+        }
+
+    def __iter__(self):
+        return iter(self.ultimi())
+
+    def __bool__(self) -> bool:
+        return self.colpi > 0
+
+    def __eq__(self, altro: object) -> bool:
+        if not isinstance(altro, StoricoDanni):
+            return NotImplemented
+        return self.to_dict() == altro.to_dict()
+
+    def __repr__(self) -> str:
+        return f"StoricoDanni(colpi={self.colpi}, totale={self.totale}, ultimi={self.ultimi()})"
+
+    # ------------------------SERIALIZZAZIONE-----------------------------------
+    def to_dict(self) -> dict:
+        """
+        Returns:
+            dict: stato serializzabile (ultimi in ordine cronologico)
+        """
+        return {
+            "colpi": self.colpi,
+            "totale": self.totale,
+            "min": self.minimo,
+            "max": self.massimo,
+            "ultimi": self.ultimi(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, capacita: int = STORICO_DANNI_MAX) -> 'StoricoDanni':
+        """
+        Ricrea lo storico da to_dict.
+
+        Args:
+            data (dict): stato salvato
+            capacita (int): colpi recenti da conservare
+
+        Returns:
+            StoricoDanni:
+        """
+        storico = cls(capacita)
+        storico.colpi = int(data.get("colpi", 0))
+        storico.totale = int(data.get("totale", 0))
+        storico.minimo = data.get("min")
+        storico.massimo = data.get("max")
+        ultimi = list(data.get("ultimi", []))
+        storico._ultimi = array("q", ultimi[-capacita:] if capacita else [])
+        return storico
+
+    @classmethod
+    def from_lista(cls, danni: Iterable[int], capacita: int = STORICO_DANNI_MAX) -> 'StoricoDanni':
+        """
+        Converte il vecchio storico (lista di tutti i colpi), calcolando le
+        statistiche sull'intera lista.
+
+        Args:
+            danni (Iterable[int]): colpi subiti in ordine cronologico
+            capacita (int): colpi recenti da conservare
+
+        Returns:
+            StoricoDanni:
+        """
+        storico = cls(capacita)
+        for danno in danni:
+            storico.aggiungi(int(danno))
+        return storico
@@ -1,4 +1,6 @@
 import random, logging
+from typing import Optional, Sequence, Tuple
+import numpy as np
 from gioco.ambiente import Ambiente
 from gioco.inventario import Inventario
 from dataclasses import dataclass, field
@@ -6,6 +8,14 @@ from dataclasses import dataclass, field
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# Azioni restituite da decidi_batch, una per NPC
+NESSUNA_AZIONE = 0
+USA_POZIONE = 1
+USA_BOMBA = 2
+
+# Oggetto usato da ogni azione
+OGGETTO_AZIONE = {USA_POZIONE: "Pozione Rossa", USA_BOMBA: "Bomba Acida"}
+
 @dataclass
 class Strategia ():
     '''
@@ -24,6 +34,7 @@ class Strategia ():
         salute_npc: int,
         inventario: 'Inventario',
         ambiente: 'Ambiente' = None,
+        rng: Optional[random.Random] = None
     ) -> int | None:
         '''
         viene definito un metodo astratto che deve essere implementato
@@ -33,6 +44,7 @@ class Strategia ():
             salute_npc (int): la salute del NPC
             inventario (Inventario): l'inventario del NPC
             ambiente (Ambiente): l'ambiente di gioco (opzionale)
+            rng (random.Random): generatore del combattimento (opzionale)
 
         Returns:
             int | None: il risultato dell'attacco, che può essere un intero
@@ -47,6 +59,36 @@ class Strategia ():
             "Devi implementare il metodo esegui nella sottoclasse"
         )
 
+    @staticmethod
+    def decidi_batch(
+        salute: np.ndarray,
+        pozioni: np.ndarray,
+        bombe: np.ndarray,
+        rng: np.random.Generator
+    ) -> np.ndarray:
+        '''
+        Versione vettoriale della decisione di uso_inventario_npc per tutti
+        gli NPC di una missione in una sola passata, con la stessa
+        distribuzione delle decisioni prese un NPC alla volta.
+
+        Args:
+            salute (np.ndarray): salute di ogni NPC
+            pozioni (np.ndarray): True se l'NPC ha una Pozione Rossa
+            bombe (np.ndarray): True se l'NPC ha una Bomba Acida
+            rng (np.random.Generator): generatore delle decisioni
+
+        Returns:
+            np.ndarray: azione di ogni NPC (NESSUNA_AZIONE, USA_POZIONE,
+            USA_BOMBA)
+
+        Raises:
+            NotImplementedError: il metodo è implementato nelle classi
+            derivate.
+        '''
+        raise NotImplementedError(
+            "Devi implementare il metodo decidi_batch nella sottoclasse"
+        )
+
 
 '''
 le classi si occuperanno di gestire le decisioni del NPC
@@ -72,7 +114,8 @@ class Aggressiva(Strategia):
     def uso_inventario_npc(
         salute_npc: int,
         inventario: Inventario,
-        ambiente: Ambiente = None
+        ambiente: Ambiente = None,
+        rng: Optional[random.Random] = None
     ) -> int | bool:
         '''
         Esegue l'attacco aggressivo del NPC sul bersaglio. l'unico oggetto
@@ -81,6 +124,7 @@ class Aggressiva(Strategia):
         args:
             inventario (Inventario): l'inventario del NPC
             ambiente (Ambiente): l'ambiente di gioco (opzionale)
+            rng (random.Random): generatore del combattimento (opzionale)
         Returns:
             Nessuno
         '''
@@ -93,13 +137,28 @@ class Aggressiva(Strategia):
                 ),
                 None
             )
-            if ogg and (random.randint(0, 1) == 0):
+            if ogg and ((rng or random).randint(0, 1) == 0):
                 result = inventario.usa_oggetto(
                     oggetto=ogg,
-                    ambiente=ambiente
+                    ambiente=ambiente,
+                    rng=rng
                 )
         return result
 
+    @staticmethod
+    def decidi_batch(
+        salute: np.ndarray,
+        pozioni: np.ndarray,
+        bombe: np.ndarray,
+        rng: np.random.Generator
+    ) -> np.ndarray:
+        '''
+        Bomba Acida con probabilità 1/2 per gli NPC che ne hanno una
+        (vedi Strategia.decidi_batch).
+        '''
+        usa = bombe & (rng.integers(0, 2, size=len(salute)) == 0)
+        return np.where(usa, USA_BOMBA, NESSUNA_AZIONE).astype(np.int8)
+
     def bonus_destrezza(self, destrezza: int) -> int:
         '''
         Incrementa la destrezza del NPC di 3 punti quando usa la strategia
@@ -130,7 +189,8 @@ class Difensiva(Strategia):
     def uso_inventario_npc(
         salute_npc: int,
         inventario: 'Inventario',
-        ambiente: 'Ambiente' = None
+        ambiente: 'Ambiente' = None,
+        rng: Optional[random.Random] = None
     ) -> None:
         '''
         Esegue l'attacco difensivo del NPC sul bersaglio.
@@ -143,6 +203,7 @@ class Difensiva(Strategia):
             salute_npc (int): la salute del NPC
             inventario (Inventario): l'inventario del NPC
             ambiente (Ambiente): l'ambiente di gioco (opzionale)
+            rng (random.Random): generatore del combattimento (opzionale)
 
         Returns:
             None
@@ -157,13 +218,28 @@ class Difensiva(Strategia):
                 ),
                 None
             )
-            if ogg and (random.randint(0, 1) == 0):
+            if ogg and ((rng or random).randint(0, 1) == 0):
                 result = inventario.usa_oggetto(
                     oggetto=ogg,
-                    ambiente=ambiente
+                    ambiente=ambiente,
+                    rng=rng
             )
         return result
 
+    @staticmethod
+    def decidi_batch(
+        salute: np.ndarray,
+        pozioni: np.ndarray,
+        bombe: np.ndarray,
+        rng: np.random.Generator
+    ) -> np.ndarray:
+        '''
+        Pozione Rossa con probabilità 1/2 per gli NPC sotto i 60 punti di
+        salute che ne hanno una (vedi Strategia.decidi_batch).
+        '''
+        usa = (salute < 60) & pozioni & (rng.integers(0, 2, size=len(salute)) == 0)
+        return np.where(usa, USA_POZIONE, NESSUNA_AZIONE).astype(np.int8)
+
     def malus_destrezza(self, destrezza: int) -> int:
         '''
         Riduce la destrezza del NPC avversario di 2 punti quando usa la strategia
@@ -196,7 +272,8 @@ class Equilibrata(Strategia):
     def uso_inventario_npc(
         salute_npc: int,
         inventario: 'Inventario',
-        ambiente: 'Ambiente' = None
+        ambiente: 'Ambiente' = None,
+        rng: Optional[random.Random] = None
     ) -> int | None:
         '''
 
@@ -212,6 +289,7 @@ class Equilibrata(Strategia):
             bersaglio (Personaggio): il bersaglio dell'attacco
             inventario (Inventario): l'inventario del NPC
             ambiente (Ambiente): l'ambiente di gioco (opzionale)
+            rng (random.Random): generatore del combattimento (opzionale)
 
         Returns:
             int | None: il risultato dell'azione, che può essere un intero
@@ -228,10 +306,11 @@ class Equilibrata(Strategia):
                     ),
                     None
                 )
-                if ogg and (random.randint(0, 2) == 0):
+                if ogg and ((rng or random).randint(0, 2) == 0):
                     result = inventario.usa_oggetto(
                         oggetto=ogg,
-                        ambiente=ambiente
+                        ambiente=ambiente,
+                        rng=rng
                     )
                     msg = (
                         "viene usata una Pozione Rossa per curarsi di "
@@ -244,10 +323,11 @@ class Equilibrata(Strategia):
                 ),
                 None
             )
-            if ogg and (random.randint(0, 2) == 0):
+            if ogg and ((rng or random).randint(0, 2) == 0):
                 result = inventario.usa_oggetto(
                     ogg,
-                    ambiente=ambiente
+                    ambiente=ambiente,
+                    rng=rng
                 )
                 msg = (
                     "viene utilizzata una Bomba Acida causando un danno di "
@@ -257,6 +337,134 @@ class Equilibrata(Strategia):
             logger.info(msg)
         return result
 
+    @staticmethod
+    def decidi_batch(
+        salute: np.ndarray,
+        pozioni: np.ndarray,
+        bombe: np.ndarray,
+        rng: np.random.Generator
+    ) -> np.ndarray:
+        '''
+        Con probabilità 1/3: Pozione Rossa sotto i 40 punti di salute,
+        altrimenti Bomba Acida, se l'NPC ha l'oggetto (vedi
+        Strategia.decidi_batch).
+        '''
+        tiro = rng.integers(0, 3, size=len(salute)) == 0
+        critico = salute < 40
+        azioni = np.full(len(salute), NESSUNA_AZIONE, dtype=np.int8)
+        azioni[critico & pozioni & tiro] = USA_POZIONE
+        azioni[~critico & bombe & tiro] = USA_BOMBA
+        return azioni
+
+# ----------------------------------------------------------------------------
+
+
+def matrici_inventari(inventari: Sequence[Optional[Inventario]]) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Presenza di Pozione Rossa e Bomba Acida negli inventari degli NPC,
+    con una sola scansione di ogni lista di oggetti.
+
+    Args:
+        inventari (Sequence[Inventario]): inventario di ogni NPC (o None)
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (pozioni, bombe) booleani per NPC
+    '''
+    pozioni = np.zeros(len(inventari), dtype=bool)
+    bombe = np.zeros(len(inventari), dtype=bool)
+    for i, inventario in enumerate(inventari):
+        if not inventario:
+            continue
+        for ogg in inventario.oggetti:
+            if ogg.nome == "Pozione Rossa":
+                pozioni[i] = True
+            elif ogg.nome == "Bomba Acida":
+                bombe[i] = True
+    return pozioni, bombe
+
+
+def decisioni_npc(
+    strategia: Strategia,
+    salute: Sequence[int],
+    inventari: Sequence[Optional[Inventario]],
+    rng: Optional[np.random.Generator] = None
+) -> np.ndarray:
+    '''
+    Decide in una passata l'uso degli oggetti di tutti gli NPC di una
+    missione secondo la strategia (equivalente a chiamare
+    uso_inventario_npc per ogni NPC, senza ancora usare gli oggetti).
+
+    Args:
+        strategia (Strategia): strategia dei nemici della missione
+        salute (Sequence[int]): salute di ogni NPC
+        inventari (Sequence[Inventario]): inventario di ogni NPC (o None)
+        rng (np.random.Generator): generatore delle decisioni (opzionale)
+
+    Returns:
+        np.ndarray: azione di ogni NPC (NESSUNA_AZIONE, USA_POZIONE,
+        USA_BOMBA)
+    '''
+    rng = rng if rng is not None else np.random.default_rng()
+    pozioni, bombe = matrici_inventari(inventari)
+    return strategia.decidi_batch(
+        np.asarray(salute), pozioni, bombe, rng
+    )
+
+
+def applica_decisioni(
+    azioni: np.ndarray,
+    inventari: Sequence[Optional[Inventario]],
+    ambiente: Ambiente = None,
+    rng: Optional[random.Random] = None
+) -> np.ndarray:
+    '''
+    Usa gli oggetti scelti da decisioni_npc, solo per gli NPC che agiscono.
+
+    Args:
+        azioni (np.ndarray): azioni restituite da decisioni_npc
+        inventari (Sequence[Inventario]): inventario di ogni NPC
+        ambiente (Ambiente): l'ambiente di gioco (opzionale)
+        rng (random.Random): generatore del combattimento (opzionale)
+
+    Returns:
+        np.ndarray: risultato di ogni NPC come in uso_inventario_npc (cura
+        positiva, danno negativo), 0 per chi non usa oggetti
+    '''
+    risultati = np.zeros(len(azioni), dtype=np.int64)
+    for i in np.flatnonzero(azioni):
+        risultati[i] = usa_decisione(int(azioni[i]), inventari[i], ambiente, rng) or 0
+    return risultati
+
+
+def usa_decisione(
+    azione: int,
+    inventario: Optional[Inventario],
+    ambiente: Ambiente = None,
+    rng: Optional[random.Random] = None
+) -> int | None:
+    '''
+    Usa l'oggetto scelto per un NPC da decisioni_npc.
+
+    Args:
+        azione (int): NESSUNA_AZIONE, USA_POZIONE o USA_BOMBA
+        inventario (Inventario): inventario dell'NPC
+        ambiente (Ambiente): l'ambiente di gioco (opzionale)
+        rng (random.Random): generatore del combattimento (opzionale)
+
+    Returns:
+        int | None: come uso_inventario_npc (cura positiva, danno
+        negativo), None se l'NPC non usa oggetti
+    '''
+    if azione == NESSUNA_AZIONE or not inventario:
+        return None
+    nome = OGGETTO_AZIONE[azione]
+    ogg = next(
+        (ogg for ogg in inventario.oggetti if ogg.nome == nome), None
+    )
+    if ogg is None:
+        return None
+    return inventario.usa_oggetto(oggetto=ogg, ambiente=ambiente, rng=rng)
+
 # ----------------------------------------------------------------------------
 
 
@@ -267,7 +475,7 @@ class StrategiaFactory:
     al tipo di strategia richiesta o randomicamente.
     '''
     @staticmethod
-    def strategia_random() -> Strategia:
+    def strategia_random(rng: Optional[random.Random] = None) -> Strategia:
         '''
         Restituisce una strategia randomica tra le tre disponibili utilizzando
         l'altro metodo usa_strategia.
@@ -278,7 +486,7 @@ class StrategiaFactory:
         Returns:
             Strategia: un'istanza della strategia randomica.
         '''
-        random_choice = random.choice(
+        random_choice = (rng or random).choice(
             ["aggressiva", "difensiva", "equilibrata"]
         )
         return StrategiaFactory.usa_strategia(random_choice)
@@ -0,0 +1,459 @@
+"""
+Torneo all'italiana tra tutti i personaggi salvati: ogni personaggio
+affronta ogni altro in ogni ambiente (Foresta, Vulcano, Palude).
+
+Gli incontri sono divisi in blocchi simulati in parallelo da un pool di
+processi con la simulazione vettoriale di gioco.simulazione; ogni blocco ha
+il proprio seme derivato dal seme del torneo, quindi i risultati non
+dipendono dal numero di processi.
+
+Uso (dalla cartella gdr-web-app):
+    python -m gioco.torneo [--seed 42] [--processi 4] [--duelli 2]
+"""
+import os
+import json
+import time
+import struct
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import DATA_DIR_TORNEI
+from gioco.ambiente import Ambiente, AmbienteFactory
+from gioco.personaggio import Personaggio
+from gioco.simulazione import (
+    CODICI_CLASSE, Combattente, Schieramento, simula_incontri
+)
+from utils.salvataggio import scrivi_atomico
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Intestazione del file dei risultati, seguita dalla lunghezza (uint32) e
+# da un header JSON con seme, ambienti e partecipanti
+MAGIA_RISULTATI = b"GDRT\x01"
+
+# Un record per duello: 13 byte
+DTYPE_RISULTATO = np.dtype([
+    ("pg1", "<u4"),        # indice del primo personaggio (pg1 < pg2)
+    ("pg2", "<u4"),        # indice del secondo personaggio
+    ("ambiente", "u1"),    # indice dell'ambiente nell'header
+    ("primo", "u1"),       # 1 se ha attaccato per primo pg1, 2 se pg2
+    ("vincitore", "u1"),   # 1 = pg1, 2 = pg2, 0 = interrotto
+    ("turni", "<u2"),
+])
+
+# Incontri (coppie) per blocco di lavoro
+COPPIE_PER_BLOCCO = 20_000
+
+# Parametri Elo
+ELO_BASE = 1500.0
+ELO_ITERAZIONI = 200
+# Passo per scarto medio 1: circa il passo di Newton per partite equilibrate
+ELO_PASSO = 800 / np.log(10)
+
+
+@dataclass
+class Blocco():
+    """
+    Blocco di lavoro: le coppie (i, j) con i in [inizio, fine) e j > i,
+    nell'ordine di np.triu_indices.
+    """
+    indice: int
+    inizio: int
+    fine: int
+    seme: np.random.SeedSequence
+
+
+def dividi_blocchi(partecipanti: int, seed: int) -> List[Blocco]:
+    """
+    Divide le coppie del torneo in blocchi di circa COPPIE_PER_BLOCCO
+    coppie. La divisione dipende solo dal numero di partecipanti, così i
+    semi dei blocchi (e quindi i risultati) sono sempre gli stessi.
+    """
+    limiti = []
+    inizio, coppie = 0, 0
+    for i in range(partecipanti):
+        coppie += partecipanti - 1 - i
+        if coppie >= COPPIE_PER_BLOCCO:
+            limiti.append((inizio, i + 1))
+            inizio, coppie = i + 1, 0
+    if inizio < partecipanti - 1:
+        limiti.append((inizio, partecipanti))
+    semi = np.random.SeedSequence(seed).spawn(len(limiti))
+    return [
+        Blocco(indice=k, inizio=a, fine=b, seme=semi[k])
+        for k, (a, b) in enumerate(limiti)
+    ]
+
+
+def coppie_blocco(partecipanti: int, inizio: int, fine: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Coppie (i, j) con inizio <= i < fine e j > i, senza cicli Python.
+    """
+    righe = np.arange(inizio, fine)
+    conteggi = partecipanti - 1 - righe
+    i = np.repeat(righe, conteggi)
+    # Posizione di ogni coppia dentro la propria riga
+    partenze = np.repeat(np.cumsum(conteggi) - conteggi, conteggi)
+    j = np.arange(i.size) - partenze + i + 1
+    return i, j
+
+
+# Stato di ogni processo del pool, impostato da _init_processo
+_schieramenti: List[Schieramento] = []
+_opzioni: Dict = {}
+
+
+def _init_processo(schieramenti: List[Schieramento], opzioni: Dict) -> None:
+    global _schieramenti, _opzioni
+    _schieramenti = schieramenti
+    _opzioni = opzioni
+
+
+def simula_blocco(blocco: Blocco) -> np.ndarray:
+    """
+    Simula tutti i duelli di un blocco in tutti gli ambienti.
+
+    Returns:
+        np.ndarray: record DTYPE_RISULTATO del blocco
+    """
+    rng = np.random.default_rng(blocco.seme)
+    partecipanti = _schieramenti[0].salute.shape[0]
+    i, j = coppie_blocco(partecipanti, blocco.inizio, blocco.fine)
+    duelli = _opzioni["duelli"]
+    # Ogni coppia gioca `duelli` duelli alternando chi attacca per primo
+    i = np.tile(i, duelli)
+    j = np.tile(j, duelli)
+    primo = np.repeat((np.arange(duelli) % 2 + 1).astype(np.uint8), i.size // duelli)
+    primo_idx = np.where(primo == 1, i, j)
+    secondo_idx = np.where(primo == 1, j, i)
+
+    parti = []
+    for a, schieramento in enumerate(_schieramenti):
+        esiti = simula_incontri(
+            schieramento.righe(primo_idx),
+            schieramento.righe(secondo_idx),
+            rng,
+            turni_max=_opzioni["turni_max"],
+            cura_fine_turno=_opzioni["cura_fine_turno"]
+        )
+        record = np.empty(i.size, dtype=DTYPE_RISULTATO)
+        record["pg1"] = i
+        record["pg2"] = j
+        record["ambiente"] = a
+        record["primo"] = primo
+        # Vincitore riportato a pg1/pg2 invece che primo/secondo
+        vincitore = esiti.vincitore
+        record["vincitore"] = np.where(
+            (vincitore == 0) | (primo == 1), vincitore, 3 - vincitore
+        )
+        record["turni"] = np.minimum(esiti.turni, np.iinfo(np.uint16).max)
+        parti.append(record)
+    return np.concatenate(parti)
+
+
+def _righe_blocchi(
+    blocchi: List[Blocco],
+    schieramenti: List[Schieramento],
+    opzioni: Dict,
+    processi: int
+) -> Iterator[np.ndarray]:
+    if processi <= 1:
+        _init_processo(schieramenti, opzioni)
+        yield from map(simula_blocco, blocchi)
+        return
+    with ProcessPoolExecutor(
+        max_workers=processi,
+        initializer=_init_processo,
+        initargs=(schieramenti, opzioni)
+    ) as pool:
+        # map restituisce i blocchi in ordine: il file è lo stesso per
+        # qualunque numero di processi
+        yield from pool.map(simula_blocco, blocchi)
+
+
+def scrivi_header(file, header: Dict) -> None:
+    dati = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    file.write(MAGIA_RISULTATI + struct.pack("<I", len(dati)) + dati)
+
+
+def leggi_risultati(file_path: str) -> Tuple[Dict, np.ndarray]:
+    """
+    Legge un file dei risultati del torneo.
+
+    Returns:
+        Tuple[Dict, np.ndarray]: header e record DTYPE_RISULTATO
+            (mappati in memoria, senza caricare tutto il file)
+    """
+    with open(file_path, "rb") as file:
+        if file.read(len(MAGIA_RISULTATI)) != MAGIA_RISULTATI:
+            raise ValueError(f"{file_path} non è un file di risultati del torneo")
+        (lunghezza,) = struct.unpack("<I", file.read(4))
+        header = json.loads(file.read(lunghezza))
+    offset = len(MAGIA_RISULTATI) + 4 + lunghezza
+    if os.path.getsize(file_path) == offset:
+        return header, np.empty(0, dtype=DTYPE_RISULTATO)
+    return header, np.memmap(file_path, dtype=DTYPE_RISULTATO, mode="r", offset=offset)
+
+
+class Classifica:
+    """
+    Accumula i risultati del torneo per coppia e ambiente mentre i blocchi
+    arrivano, senza tenere in memoria i singoli duelli.
+    """
+
+    def __init__(self, partecipanti: int, ambienti: int) -> None:
+        self.partecipanti = partecipanti
+        self.ambienti = ambienti
+        self.coppie = partecipanti * (partecipanti - 1) // 2
+        self.vittorie_1 = np.zeros((ambienti, self.coppie), dtype=np.int32)
+        self.vittorie_2 = np.zeros((ambienti, self.coppie), dtype=np.int32)
+        self.giocate = np.zeros((ambienti, self.coppie), dtype=np.int32)
+
+    def _indice_coppia(self, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+        # Posizione di (i, j) nell'ordine di np.triu_indices
+        n = self.partecipanti
+        return i * (2 * n - i - 1) // 2 + (j - i - 1)
+
+    def aggiungi(self, record: np.ndarray) -> None:
+        """
+        Aggiunge i record di un blocco: le sue coppie sono contigue
+        nell'ordine di np.triu_indices, quindi si aggiorna solo quel tratto.
+        """
+        if record.size == 0:
+            return
+        coppia = self._indice_coppia(
+            record["pg1"].astype(np.int64), record["pg2"].astype(np.int64)
+        )
+        primo, ultimo = int(coppia.min()), int(coppia.max()) + 1
+        tratto = ultimo - primo
+        indice = record["ambiente"].astype(np.int64) * tratto + (coppia - primo)
+        for matrice, peso in (
+            (self.giocate, None),
+            (self.vittorie_1, record["vincitore"] == 1),
+            (self.vittorie_2, record["vincitore"] == 2),
+        ):
+            conteggi = np.bincount(indice, weights=peso, minlength=self.ambienti * tratto)
+            matrice[:, primo:ultimo] += conteggi.reshape(self.ambienti, tratto).astype(np.int32)
+
+    def elo(self, ambienti: Optional[Sequence[int]] = None) -> np.ndarray:
+        """
+        Rating Elo che meglio spiega i risultati (modello logistico Elo,
+        aggiornamenti simultanei su tutte le partite): a differenza
+        dell'Elo sequenziale non dipende dall'ordine dei duelli.
+
+        Args:
+            ambienti (Sequence[int]): ambienti da considerare, default tutti
+
+        Returns:
+            np.ndarray: rating di ogni partecipante, media ELO_BASE
+        """
+        ambienti = list(range(self.ambienti)) if ambienti is None else list(ambienti)
+        i, j = np.triu_indices(self.partecipanti, 1)
+        giocate = self.giocate[ambienti].sum(axis=0).astype(float)
+        # I duelli interrotti valgono mezzo punto a testa
+        punti = (
+            self.vittorie_1[ambienti].sum(axis=0)
+            + 0.5 * (giocate - self.vittorie_1[ambienti].sum(axis=0) - self.vittorie_2[ambienti].sum(axis=0))
+        )
+        partite = (
+            np.bincount(i, weights=giocate, minlength=self.partecipanti)
+            + np.bincount(j, weights=giocate, minlength=self.partecipanti)
+        )
+        partite[partite == 0] = 1
+        rating = np.full(self.partecipanti, ELO_BASE)
+        for _ in range(ELO_ITERAZIONI):
+            atteso = giocate / (1 + 10 ** ((rating[j] - rating[i]) / 400))
+            scarto = punti - atteso
+            # Scarto medio per partita di ogni partecipante
+            scarto_medio = (
+                np.bincount(i, weights=scarto, minlength=self.partecipanti)
+                - np.bincount(j, weights=scarto, minlength=self.partecipanti)
+            ) / partite
+            rating += ELO_PASSO * scarto_medio
+            rating += ELO_BASE - rating.mean()
+        return rating
+
+    def matrice_classi(self, classi: np.ndarray, ambiente: int) -> np.ndarray:
+        """
+        Percentuale di vittorie della classe di riga contro la classe di
+        colonna nell'ambiente indicato (NaN se non si sono mai incontrate).
+        """
+        i, j = np.triu_indices(self.partecipanti, 1)
+        k = len(CODICI_CLASSE)
+        riga_ij = classi[i] * k + classi[j]
+        riga_ji = classi[j] * k + classi[i]
+        giocate = self.giocate[ambiente]
+        vinte = (
+            np.bincount(riga_ij, weights=self.vittorie_1[ambiente], minlength=k * k)
+            + np.bincount(riga_ji, weights=self.vittorie_2[ambiente], minlength=k * k)
+        )
+        totali = (
+            np.bincount(riga_ij, weights=giocate, minlength=k * k)
+            + np.bincount(riga_ji, weights=giocate, minlength=k * k)
+        )
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return (vinte / totali).reshape(k, k)
+
+
+def _riepilogo(
+    classifica: Classifica,
+    personaggi: Sequence[Personaggio],
+    classi: np.ndarray,
+    ambienti: Sequence[Ambiente]
+) -> Dict:
+    nomi_classi = list(CODICI_CLASSE)
+
+    def per_classe(rating: np.ndarray) -> Dict[str, float]:
+        return {
+            nome: round(float(rating[classi == codice].mean()), 1)
+            for nome, codice in CODICI_CLASSE.items()
+            if np.any(classi == codice)
+        }
+
+    def matrice(valori: np.ndarray) -> Dict[str, Dict[str, Optional[float]]]:
+        return {
+            riga: {
+                colonna: None if np.isnan(valori[r, c]) else round(float(valori[r, c]), 4)
+                for c, colonna in enumerate(nomi_classi)
+            }
+            for r, riga in enumerate(nomi_classi)
+        }
+
+    ids = [str(pg.id) for pg in personaggi]
+    rating_totale = classifica.elo()
+    riepilogo = {
+        "elo": dict(zip(ids, np.round(rating_totale, 1).tolist())),
+        "elo_classi": per_classe(rating_totale),
+        "ambienti": {},
+    }
+    for a, ambiente in enumerate(ambienti):
+        rating = classifica.elo([a])
+        riepilogo["ambienti"][ambiente.nome] = {
+            "elo": dict(zip(ids, np.round(rating, 1).tolist())),
+            "elo_classi": per_classe(rating),
+            "vittorie_classi": matrice(classifica.matrice_classi(classi, a)),
+        }
+    return riepilogo
+
+
+def esegui_torneo(
+    personaggi: Sequence[Personaggio],
+    seed: int,
+    output_dir: str = DATA_DIR_TORNEI,
+    processi: int = 1,
+    duelli: int = 2,
+    turni_max: int = 500,
+    cura_fine_turno: bool = False
+) -> Dict:
+    """
+    Esegue il torneo all'italiana, scrive i risultati di ogni duello in
+    <output_dir>/torneo_<seed>.bin man mano che i blocchi sono pronti e il
+    riepilogo (Elo per personaggio e per classe, matrici di vittoria tra
+    classi per ambiente) in <output_dir>/torneo_<seed>.json.
+
+    Args:
+        personaggi (Sequence[Personaggio]): partecipanti
+        seed (int): seme del torneo, stessi risultati a parità di seme
+        output_dir (str): cartella dei file dei risultati
+        processi (int): processi del pool (1 = nel processo corrente)
+        duelli (int): duelli per coppia e ambiente, alternando chi
+            attacca per primo
+        turni_max (int): turni dopo i quali un duello è interrotto
+        cura_fine_turno (bool): recupera_salute a fine turno
+
+    Returns:
+        Dict: riepilogo del torneo
+    """
+    inizio = time.perf_counter()
+    ambienti = list(AmbienteFactory.get_opzioni().values())
+    schieramenti = [
+        Schieramento.da_combattenti([Combattente.da_personaggio(pg, amb) for pg in personaggi])
+        for amb in ambienti
+    ]
+    classi = schieramenti[0].classe.astype(np.int64)
+    opzioni = {"duelli": duelli, "turni_max": turni_max, "cura_fine_turno": cura_fine_turno}
+    blocchi = dividi_blocchi(len(personaggi), seed)
+    classifica = Classifica(len(personaggi), len(ambienti))
+
+    os.makedirs(output_dir, exist_ok=True)
+    base = os.path.join(output_dir, f"torneo_{seed}")
+    header = {
+        "seed": seed,
+        **opzioni,
+        "ambienti": [amb.nome for amb in ambienti],
+        "partecipanti": [
+            {"id": str(pg.id), "nome": pg.nome, "classe": nome_classe}
+            for pg, nome_classe in zip(personaggi, (list(CODICI_CLASSE)[c] for c in classi))
+        ],
+    }
+    record_scritti = 0
+    with open(base + ".bin.tmp", "wb") as file:
+        scrivi_header(file, header)
+        for record in _righe_blocchi(blocchi, schieramenti, opzioni, processi):
+            file.write(record.tobytes())
+            classifica.aggiungi(record)
+            record_scritti += record.size
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(base + ".bin.tmp", base + ".bin")
+
+    riepilogo = {
+        "seed": seed,
+        **opzioni,
+        "partecipanti": len(personaggi),
+        "duelli_totali": record_scritti,
+        "durata_s": round(time.perf_counter() - inizio, 3),
+        **_riepilogo(classifica, personaggi, classi, ambienti),
+    }
+    scrivi_atomico(base + ".json", json.dumps(riepilogo, indent=2))
+    logger.info(
+        f"Torneo {seed}: {len(personaggi)} personaggi, {record_scritti} duelli "
+        f"in {riepilogo['durata_s']} s -> {base}.bin"
+    )
+    return riepilogo
+
+
+def carica_personaggi() -> List[Personaggio]:
+    """
+    Carica tutti i personaggi salvati (DATA_DIR_PGS o backend configurato),
+    ordinati per ID così l'ordine dei partecipanti è stabile tra esecuzioni.
+    """
+    # Import locale: characters dipende dall'applicazione Flask
+    import gioco.classi  # noqa: F401  registra le sottoclassi di Personaggio
+    from characters.utils import LoadMultipleCharactersJson, get_user_character_files, schema
+
+    ids = sorted(get_user_character_files())
+    return [schema.load(dati) for dati in LoadMultipleCharactersJson(ids)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Torneo all'italiana tra i personaggi salvati")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processi", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--duelli", type=int, default=2)
+    parser.add_argument("--turni-max", type=int, default=500)
+    parser.add_argument("--cura", action="store_true", help="cura a fine turno")
+    parser.add_argument("--output", default=DATA_DIR_TORNEI)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    # Un messaggio per personaggio e ambiente: troppi per un torneo
+    logging.getLogger("gioco.ambiente").setLevel(logging.WARNING)
+    personaggi = carica_personaggi()
+    if len(personaggi) < 2:
+        logger.warning("Servono almeno due personaggi per un torneo")
+        return
+    esegui_torneo(
+        personaggi, args.seed, args.output, processi=args.processi,
+        duelli=args.duelli, turni_max=args.turni_max, cura_fine_turno=args.cura
+    )
+
+
+if __name__ == "__main__":
+    main()
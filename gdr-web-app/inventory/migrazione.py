@@ -0,0 +1,70 @@
+"""
+Correzione degli inventari salvati con più oggetti con lo stesso ID.
+
+I caricamenti assegnano già agli oggetti duplicati un ID che dipende solo
+dal contenuto del file (gioco.inventario.deduplica_id), ma il file resta
+com'è fino al salvataggio successivo. Questa migrazione li riscrive una
+volta sola, così gli ID restano quelli anche per chi legge il file
+direttamente.
+
+Uso (dalla cartella gdr-web-app):
+    python -m inventory.migrazione
+"""
+import os
+import logging
+from typing import Tuple
+
+from config import DATA_DIR_INV
+from inventory.utils import (
+    inventario_schema, GetAllInventoryFiles, SaveInventoryJson,
+    _HasDuplicateObjectIds, _inventory_lock_key
+)
+from utils.salvataggio import leggi_json
+from utils.storage import unstamp
+from utils.locks import lock_manager
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def migra_inventari() -> Tuple[int, int]:
+    """
+    Riscrive gli inventari che hanno ID oggetto duplicati.
+
+    Returns:
+        Tuple[int, int]: (inventari corretti, inventari non validi)
+    """
+    ids = GetAllInventoryFiles()
+    corretti = errori = 0
+    for file_id in ids:
+        file_path = os.path.join(DATA_DIR_INV, f"{file_id}.json")
+        data = leggi_json(file_path)
+        if data is None or not _HasDuplicateObjectIds(data):
+            continue
+        # Rilettura nel lock delle operazioni sull'inventario
+        with lock_manager.write_lock(_inventory_lock_key(data)):
+            data = leggi_json(file_path)
+            if data is None or not _HasDuplicateObjectIds(data):
+                continue
+            try:
+                inventario = inventario_schema.load(unstamp(data))
+            except Exception as e:
+                logger.error(f"Inventario {file_id} non valido, non corretto: {e}")
+                errori += 1
+                continue
+            if SaveInventoryJson(inventario):
+                corretti += 1
+            else:
+                errori += 1
+    logger.info(f"Corretti {corretti} inventari su {len(ids)} ({errori} errori)")
+    return corretti, errori
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.WARNING)
+    corretti, errori = migra_inventari()
+    print(f"Inventari con ID oggetto duplicati corretti: {corretti} ({errori} errori)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,601 @@
+"""
+Interrogazioni su tutti gli inventari: gli oggetti di ogni inventario sono
+tenuti in memoria come colonne numpy (tipo, nome, valore, usato,
+proprietario, classe del proprietario), i criteri di FindObjectsInInventory
+sono compilati una volta in predicati vettoriali e le aggregazioni si
+calcolano senza leggere alcun file.
+
+L'indice si costruisce alla prima interrogazione e poi si aggiorna per
+singolo inventario: subito per i salvataggi di questo processo
+(inventory_listeners), ogni INVENTORY_QUERY_SYNC secondi confrontando le
+firme dei file per quelli degli altri worker. Allo stesso modo la classe
+dei proprietari (edit_char può cambiarla) si aggiorna subito per i
+salvataggi di questo processo (character_listeners) e, per gli altri
+worker, quando cambia la firma del loro record personaggio.
+"""
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import INVENTORY_QUERY_SYNC
+from characters.utils import character_listeners
+from utils.salvataggio import firma_json
+from .utils import DATA_DIR_INV, inventory_ids, inventory_listeners, _LoadInventoryFile
+
+# Setup logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Colonne codificate per dizionario (stringa -> codice intero)
+COLONNE_CATEGORICHE = ('tipo', 'nome', 'proprietario', 'classe_proprietario')
+
+# Criteri accettati: quelli di FindObjectsInInventory più usato e proprietario
+CRITERI = ('tipo', 'nome', 'valore_min', 'valore_max', 'usato', 'proprietario', 'classe_proprietario')
+
+# Colonne per cui si può raggruppare il risultato
+RAGGRUPPAMENTI = COLONNE_CATEGORICHE
+
+# Predicati compilati tenuti in memoria (chiave: criteri normalizzati)
+PREDICATI_MAX = 128
+
+# Righe minime prima di compattare le righe eliminate
+COMPATTA_MIN = 1024
+
+_DTYPES = {
+    'tipo': np.int32,
+    'nome': np.int32,
+    'proprietario': np.int32,
+    'classe_proprietario': np.int32,
+    'valore': np.int64,
+    'usato': np.bool_,
+    'attiva': np.bool_,
+}
+
+Predicato = Callable[['IndiceInventari', int], np.ndarray]
+
+
+class _Dizionario:
+    """
+    Codifica di una colonna di stringhe: ogni valore distinto ha un codice
+    intero progressivo (i codici non cambiano mai).
+    """
+
+    __slots__ = ("valori", "codici")
+
+    def __init__(self) -> None:
+        self.valori: List[Optional[str]] = []
+        self.codici: Dict[Optional[str], int] = {}
+
+    def codifica(self, valore: Optional[str]) -> int:
+        codice = self.codici.get(valore)
+        if codice is None:
+            codice = self.codici[valore] = len(self.valori)
+            self.valori.append(valore)
+        return codice
+
+    def codici_di(self, valori) -> np.ndarray:
+        return np.array([self.codici[v] for v in valori if v in self.codici], dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.valori)
+
+
+# ------------------------COMPILAZIONE CRITERI------------------------------
+def _insieme(valore, campo: str) -> Tuple[str, ...]:
+    valori = valore if isinstance(valore, (list, tuple, set, frozenset)) else [valore]
+    if not all(isinstance(v, str) for v in valori):
+        raise ValueError(f"Criterio '{campo}': atteso testo o lista di testi")
+    return tuple(sorted(set(valori)))
+
+
+def _intero(valore, campo: str) -> int:
+    if isinstance(valore, bool):
+        raise ValueError(f"Criterio '{campo}': atteso un intero")
+    try:
+        return int(valore)
+    except (TypeError, ValueError):
+        raise ValueError(f"Criterio '{campo}': atteso un intero")
+
+
+def _normalizza(criteria: Dict) -> Dict:
+    """
+    Controlla i criteri e li porta in forma canonica (liste ordinate,
+    interi), così criteri equivalenti condividono lo stesso predicato.
+    """
+    sconosciuti = set(criteria) - set(CRITERI)
+    if sconosciuti:
+        raise ValueError(
+            f"Criteri non supportati: {', '.join(sorted(sconosciuti))}. "
+            f"Disponibili: {', '.join(CRITERI)}"
+        )
+    normalizzati = {}
+    for campo, valore in criteria.items():
+        if campo in ('valore_min', 'valore_max'):
+            normalizzati[campo] = _intero(valore, campo)
+        elif campo == 'usato':
+            if not isinstance(valore, bool):
+                raise ValueError("Criterio 'usato': atteso true o false")
+            normalizzati[campo] = valore
+        elif campo == 'nome':
+            if not isinstance(valore, str):
+                raise ValueError("Criterio 'nome': atteso testo")
+            normalizzati[campo] = valore.lower()
+        else:
+            normalizzati[campo] = _insieme(valore, campo)
+    return normalizzati
+
+
+def _predicato_categorico(colonna: str, valori: Tuple[str, ...]) -> Predicato:
+    def predicato(indice: 'IndiceInventari', n: int) -> np.ndarray:
+        codici = indice._dizionari[colonna].codici_di(valori)
+        if len(codici) == 1:
+            return indice._colonne[colonna][:n] == codici[0]
+        return np.isin(indice._colonne[colonna][:n], codici)
+    return predicato
+
+
+def _predicato_nome(parte: str) -> Predicato:
+    # Il confronto parziale si fa sui nomi distinti (pochi), poi sui codici
+    def predicato(indice: 'IndiceInventari', n: int) -> np.ndarray:
+        nomi = indice._dizionari['nome'].valori
+        codici = [codice for codice, nome in enumerate(nomi) if parte in (nome or '').lower()]
+        return np.isin(indice._colonne['nome'][:n], np.array(codici, dtype=np.int32))
+    return predicato
+
+
+def _compila(criteri: Dict) -> Predicato:
+    parti: List[Predicato] = []
+    for campo, valore in criteri.items():
+        if campo == 'valore_min':
+            parti.append(lambda indice, n, v=valore: indice._colonne['valore'][:n] >= v)
+        elif campo == 'valore_max':
+            parti.append(lambda indice, n, v=valore: indice._colonne['valore'][:n] <= v)
+        elif campo == 'usato':
+            parti.append(lambda indice, n, v=valore: indice._colonne['usato'][:n] == v)
+        elif campo == 'nome':
+            parti.append(_predicato_nome(valore))
+        else:
+            parti.append(_predicato_categorico(campo, valore))
+
+    def predicato(indice: 'IndiceInventari', n: int) -> np.ndarray:
+        maschera = indice._colonne['attiva'][:n].copy()
+        for parte in parti:
+            maschera &= parte(indice, n)
+        return maschera
+    return predicato
+
+
+_predicati: 'OrderedDict[str, Predicato]' = OrderedDict()
+_predicati_lock = threading.Lock()
+
+
+def compila_criteri(criteria: Optional[Dict]) -> Predicato:
+    """
+    Compila i criteri di ricerca in un predicato sulle colonne dell'indice.
+    I predicati già compilati sono riusati (LRU di PREDICATI_MAX voci).
+
+    Args:
+        criteria (Optional[Dict]): tipo, nome (parziale, case-insensitive),
+            valore_min, valore_max, usato, proprietario, classe_proprietario;
+            tipo, proprietario e classe_proprietario accettano anche liste
+
+    Returns:
+        Predicato: funzione (indice, righe) -> maschera booleana
+
+    Raises:
+        ValueError: criterio sconosciuto o di tipo errato
+    """
+    criteri = _normalizza(criteria or {})
+    chiave = json.dumps(criteri, sort_keys=True)
+    with _predicati_lock:
+        predicato = _predicati.get(chiave)
+        if predicato is not None:
+            _predicati.move_to_end(chiave)
+            return predicato
+    predicato = _compila(criteri)
+    with _predicati_lock:
+        _predicati[chiave] = predicato
+        while len(_predicati) > PREDICATI_MAX:
+            _predicati.popitem(last=False)
+    return predicato
+
+
+def _statistiche(numero: int, totale: int, minimo: Optional[int], massimo: Optional[int]) -> Dict:
+    return {
+        'numero': numero,
+        'valore_totale': totale,
+        'valore_medio': round(totale / numero, 2) if numero else None,
+        'valore_min': minimo,
+        'valore_max': massimo,
+    }
+
+
+# ------------------------INDICE COLONNARE----------------------------------
+class IndiceInventari:
+    """
+    Istantanea colonnare degli oggetti di tutti gli inventari. Ogni file
+    inventario occupa un blocco contiguo di righe: aggiornarlo spegne il
+    blocco vecchio (colonna 'attiva') e ne accoda uno nuovo; quando le
+    righe spente superano la metà l'indice viene compattato.
+    """
+
+    def __init__(self, cartella: str = DATA_DIR_INV, intervallo_sync: float = INVENTORY_QUERY_SYNC) -> None:
+        self.cartella = cartella
+        self.intervallo_sync = intervallo_sync
+        self._lock = threading.RLock()
+        self._pronto = False
+        self._in_costruzione = False
+        self._pendenti: List[Tuple[str, Optional[Dict]]] = []
+        self._azzera()
+
+    def _azzera(self) -> None:
+        self._colonne = {nome: np.empty(0, dtype=dtype) for nome, dtype in _DTYPES.items()}
+        self._dizionari = {nome: _Dizionario() for nome in COLONNE_CATEGORICHE}
+        self._ids: List[str] = []
+        self._n = 0
+        self._spente = 0
+        # file_id -> (prima riga, riga successiva all'ultima)
+        self._blocchi: Dict[str, Tuple[int, int]] = {}
+        self._firme: Dict[str, Optional[tuple]] = {}
+        # id personaggio -> classe, valida finché la firma del record
+        # personaggio (character_store.signature) non cambia
+        self._classi: Dict[str, str] = {}
+        self._firme_classi: Dict[str, Optional[tuple]] = {}
+        self._ultimo_sync = time.monotonic()
+
+    @property
+    def righe(self) -> int:
+        """Oggetti presenti nell'indice (righe attive)."""
+        return self._n - self._spente
+
+    # ------------------------CARICAMENTO-------------------------------------
+    def _leggi_classi(self, char_ids: List[str]) -> Dict[str, Tuple[Optional[tuple], Optional[str]]]:
+        """
+        Firma e classe dei personaggi indicati, lette in un solo batch (la
+        firma prima dei dati: una modifica concorrente viene riletta al
+        controllo successivo).
+        """
+        from characters.utils import character_store
+        firme = character_store.signatures(char_ids)
+        dati = character_store.get_many(char_ids)
+        return {
+            char_id: (firme.get(char_id), (dati.get(char_id) or {}).get('classe'))
+            for char_id in char_ids
+        }
+
+    def _classi_proprietari(self, proprietari) -> None:
+        """Legge in un solo batch le classi dei proprietari non ancora note."""
+        mancanti = [p for p in set(proprietari) if p and p not in self._firme_classi]
+        if not mancanti:
+            return
+        for char_id, (firma, classe) in self._leggi_classi(mancanti).items():
+            self._firme_classi[char_id] = firma
+            if classe:
+                self._classi[char_id] = classe
+
+    def _sincronizza_classi(self) -> int:
+        """
+        Rilegge le classi dei personaggi il cui record è cambiato (es. con
+        edit_char) e aggiorna la colonna classe_proprietario dei loro oggetti.
+
+        Returns:
+            int: personaggi con la classe cambiata
+        """
+        from characters.utils import character_store
+        with self._lock:
+            noti = list(self._firme_classi)
+        if not noti:
+            return 0
+        firme = character_store.signatures(noti)
+        cambiati = [char_id for char_id in noti if firme.get(char_id) != self._firme_classi.get(char_id)]
+        if not cambiati:
+            return 0
+        letti = self._leggi_classi(cambiati)
+        with self._lock:
+            return sum(
+                self._imposta_classe(char_id, firma, classe)
+                for char_id, (firma, classe) in letti.items()
+            )
+
+    def _imposta_classe(self, char_id: str, firma: Optional[tuple], classe: Optional[str]) -> bool:
+        """
+        Registra firma e classe di un personaggio e, se la classe è
+        cambiata, aggiorna la colonna classe_proprietario dei suoi oggetti
+        (con self._lock già preso).
+
+        Returns:
+            bool: True se la classe è cambiata
+        """
+        self._firme_classi[char_id] = firma
+        if classe == self._classi.get(char_id):
+            return False
+        if classe:
+            self._classi[char_id] = classe
+        else:
+            self._classi.pop(char_id, None)
+        c, d = self._colonne, self._dizionari
+        codice = d['proprietario'].codici.get(char_id)
+        if codice is not None:
+            righe = c['proprietario'][:self._n] == codice
+            c['classe_proprietario'][:self._n][righe] = d['classe_proprietario'].codifica(classe)
+        return True
+
+    def _percorso(self, file_id: str) -> str:
+        return os.path.join(self.cartella, f"{file_id}.json")
+
+    def _leggi_file(self, file_id: str) -> Tuple[Optional[tuple], Optional[Dict]]:
+        firma = firma_json(self._percorso(file_id))
+        if firma is None:
+            return None, None
+        return firma, _LoadInventoryFile(file_id, memorizza=False)
+
+    def ricostruisci(self) -> None:
+        """
+        Costruisce l'indice leggendo tutti i file inventario (senza passare
+        dalla cache degli inventari). I salvataggi notificati durante la
+        lettura sono applicati subito dopo.
+        """
+        inizio = time.perf_counter()
+        with self._lock:
+            self._in_costruzione = True
+            self._pendenti = []
+        try:
+            letti = {}
+            for file_id in inventory_ids.all():
+                firma, dati = self._leggi_file(file_id)
+                if dati is not None:
+                    letti[file_id] = (firma, dati)
+            with self._lock:
+                self._azzera()
+                self._classi_proprietari(
+                    dati.get('id_proprietario') for _, dati in letti.values()
+                )
+                for file_id, (firma, dati) in letti.items():
+                    self._accoda(file_id, dati)
+                    self._firme[file_id] = firma
+                for file_id, dati in self._pendenti:
+                    self._applica(file_id, dati)
+                self._pronto = True
+        finally:
+            with self._lock:
+                self._in_costruzione = False
+                self._pendenti = []
+        logger.info(
+            f"Indice inventari costruito: {len(self._blocchi)} inventari, "
+            f"{self.righe} oggetti in {(time.perf_counter() - inizio) * 1000:.1f} ms"
+        )
+
+    def _riserva(self, extra: int) -> None:
+        capacita = len(self._colonne['attiva'])
+        richieste = self._n + extra
+        if richieste <= capacita:
+            return
+        capacita = max(richieste, capacita * 2, COMPATTA_MIN)
+        for nome, colonna in self._colonne.items():
+            nuova = np.zeros(capacita, dtype=colonna.dtype)
+            nuova[:self._n] = colonna[:self._n]
+            self._colonne[nome] = nuova
+
+    def _accoda(self, file_id: str, inventario_data: Dict) -> None:
+        oggetti = inventario_data.get('oggetti') or []
+        proprietario = inventario_data.get('id_proprietario')
+        proprietario = str(proprietario) if proprietario else None
+        self._classi_proprietari([proprietario])
+        inizio = self._n
+        fine = inizio + len(oggetti)
+        self._riserva(len(oggetti))
+        c = self._colonne
+        tipi, nomi = self._dizionari['tipo'], self._dizionari['nome']
+        c['tipo'][inizio:fine] = [tipi.codifica(obj.get('classe', 'Unknown')) for obj in oggetti]
+        c['nome'][inizio:fine] = [nomi.codifica(obj.get('nome', '')) for obj in oggetti]
+        c['valore'][inizio:fine] = [obj.get('valore', 0) or 0 for obj in oggetti]
+        c['usato'][inizio:fine] = [bool(obj.get('usato', False)) for obj in oggetti]
+        c['proprietario'][inizio:fine] = self._dizionari['proprietario'].codifica(proprietario)
+        c['classe_proprietario'][inizio:fine] = self._dizionari['classe_proprietario'].codifica(
+            self._classi.get(proprietario)
+        )
+        c['attiva'][inizio:fine] = True
+        self._ids.extend(str(obj.get('id')) for obj in oggetti)
+        self._n = fine
+        self._blocchi[file_id] = (inizio, fine)
+
+    def _spegni(self, file_id: str) -> None:
+        blocco = self._blocchi.pop(file_id, None)
+        self._firme.pop(file_id, None)
+        if blocco is None:
+            return
+        inizio, fine = blocco
+        self._colonne['attiva'][inizio:fine] = False
+        self._spente += fine - inizio
+
+    def _compatta(self) -> None:
+        """Elimina le righe spente mantenendo l'ordine (i blocchi restano contigui)."""
+        n = self._n
+        tenute = self._colonne['attiva'][:n].copy()
+        # righe tenute prima di ogni posizione: nuovo inizio di ogni blocco
+        precedenti = np.concatenate(([0], np.cumsum(tenute)))
+        for colonna in self._colonne.values():
+            rimaste = colonna[:n][tenute]
+            colonna[:len(rimaste)] = rimaste
+        self._ids = [self._ids[i] for i in np.flatnonzero(tenute)]
+        self._n = len(self._ids)
+        self._spente = 0
+        self._blocchi = {
+            file_id: (int(precedenti[inizio]), int(precedenti[inizio]) + fine - inizio)
+            for file_id, (inizio, fine) in self._blocchi.items()
+        }
+
+    def _applica(self, file_id: str, inventario_data: Optional[Dict]) -> None:
+        firma = self._firme.get(file_id)
+        self._spegni(file_id)
+        if inventario_data is not None:
+            self._accoda(file_id, inventario_data)
+            self._firme[file_id] = firma
+        if self._spente > self._n // 2 and self._n >= COMPATTA_MIN:
+            self._compatta()
+
+    # ------------------------AGGIORNAMENTO-----------------------------------
+    def aggiorna_file(self, file_id: str, inventario_data: Optional[Dict]) -> None:
+        """
+        Aggiorna l'indice dopo il salvataggio (dati serializzati) o
+        l'eliminazione (None) di un inventario; registrata in
+        inventory_listeners.
+
+        Args:
+            file_id (str): nome del file inventario senza estensione
+            inventario_data (Optional[Dict]): dati salvati o None se eliminato
+        """
+        with self._lock:
+            if self._in_costruzione:
+                self._pendenti.append((file_id, inventario_data))
+                return
+            if not self._pronto:
+                return
+            self._applica(file_id, inventario_data)
+            if inventario_data is not None:
+                self._firme[file_id] = firma_json(self._percorso(file_id))
+
+    def aggiorna_personaggio(self, char_id: str, personaggio_data: Optional[Dict]) -> None:
+        """
+        Aggiorna la classe di un proprietario dopo il salvataggio (dati
+        serializzati) o l'eliminazione (None) del suo personaggio;
+        registrata in character_listeners. I personaggi che l'indice non
+        conosce sono letti quando si accoda un loro inventario.
+
+        Args:
+            char_id (str): ID del personaggio
+            personaggio_data (Optional[Dict]): dati salvati o None se eliminato
+        """
+        from characters.utils import character_store
+        char_id = str(char_id)
+        if char_id not in self._firme_classi:
+            return
+        firma = character_store.signature(char_id)
+        with self._lock:
+            # durante la costruzione le classi sono lette dopo i file:
+            # vedranno già il record salvato
+            if not self._pronto or self._in_costruzione or char_id not in self._firme_classi:
+                return
+            self._imposta_classe(char_id, firma, (personaggio_data or {}).get('classe'))
+
+    def sincronizza(self, forza: bool = False) -> int:
+        """
+        Ricarica gli inventari i cui file sono cambiati fuori da questo
+        processo (firma diversa) e toglie quelli eliminati. Senza `forza`
+        lo fa al massimo ogni `intervallo_sync` secondi (0 = mai).
+
+        Returns:
+            int: inventari ricaricati o rimossi
+        """
+        ora = time.monotonic()
+        if not forza and (self.intervallo_sync <= 0 or ora - self._ultimo_sync < self.intervallo_sync):
+            return 0
+        self._ultimo_sync = ora
+        presenti = set(inventory_ids.all())
+        cambiati = 0
+        for file_id in presenti:
+            firma = firma_json(self._percorso(file_id))
+            if firma is not None and firma != self._firme.get(file_id):
+                _, dati = self._leggi_file(file_id)
+                with self._lock:
+                    self._applica(file_id, dati)
+                    if dati is not None:
+                        self._firme[file_id] = firma
+                cambiati += 1
+        with self._lock:
+            for file_id in set(self._blocchi) - presenti:
+                self._applica(file_id, None)
+                cambiati += 1
+        cambiati += self._sincronizza_classi()
+        if cambiati:
+            logger.info(f"Indice inventari: {cambiati} inventari aggiornati da disco")
+        return cambiati
+
+    # ------------------------INTERROGAZIONE----------------------------------
+    def interroga(self, criteria: Optional[Dict] = None, raggruppa: Optional[str] = None,
+                  limite: int = 0) -> Dict:
+        """
+        Statistiche sugli oggetti di tutti gli inventari che soddisfano i
+        criteri, opzionalmente raggruppate per una colonna.
+
+        Args:
+            criteria (Optional[Dict]): criteri di compila_criteri
+            raggruppa (Optional[str]): una di RAGGRUPPAMENTI
+            limite (int): numero massimo di oggetti da restituire (0 = nessuno)
+
+        Returns:
+            Dict: numero, valore_totale/medio/min/max, 'gruppi' (per numero
+                decrescente) se raggruppato, 'oggetti' se limite > 0
+
+        Raises:
+            ValueError: criteri o raggruppamento non validi
+        """
+        predicato = compila_criteri(criteria)
+        if raggruppa is not None and raggruppa not in RAGGRUPPAMENTI:
+            raise ValueError(f"Raggruppamento non valido. Disponibili: {', '.join(RAGGRUPPAMENTI)}")
+        if not self._pronto:
+            self.ricostruisci()
+        else:
+            self.sincronizza()
+
+        with self._lock:
+            n = self._n
+            maschera = predicato(self, n)
+            valori = self._colonne['valore'][:n][maschera]
+            risultato = _statistiche(
+                len(valori), int(valori.sum()),
+                int(valori.min()) if len(valori) else None,
+                int(valori.max()) if len(valori) else None,
+            )
+
+            if raggruppa is not None:
+                risultato['raggruppa'] = raggruppa
+                risultato['gruppi'] = self._gruppi(raggruppa, maschera, valori)
+
+            if limite > 0:
+                righe = np.flatnonzero(maschera)[:limite]
+                risultato['oggetti'] = [self._oggetto(int(riga)) for riga in righe]
+        return risultato
+
+    def _gruppi(self, colonna: str, maschera: np.ndarray, valori: np.ndarray) -> List[Dict]:
+        dizionario = self._dizionari[colonna]
+        codici = self._colonne[colonna][:self._n][maschera]
+        k = len(dizionario)
+        numeri = np.bincount(codici, minlength=k)
+        totali = np.zeros(k, dtype=np.int64)
+        np.add.at(totali, codici, valori)
+        minimi = np.full(k, np.iinfo(np.int64).max, dtype=np.int64)
+        np.minimum.at(minimi, codici, valori)
+        massimi = np.full(k, np.iinfo(np.int64).min, dtype=np.int64)
+        np.maximum.at(massimi, codici, valori)
+        presenti = np.flatnonzero(numeri)
+        presenti = presenti[np.argsort(-numeri[presenti], kind='stable')]
+        return [
+            {colonna: dizionario.valori[c],
+             **_statistiche(int(numeri[c]), int(totali[c]), int(minimi[c]), int(massimi[c]))}
+            for c in presenti
+        ]
+
+    def _oggetto(self, riga: int) -> Dict:
+        c, d = self._colonne, self._dizionari
+        return {
+            'id': self._ids[riga],
+            'nome': d['nome'].valori[c['nome'][riga]],
+            'tipo': d['tipo'].valori[c['tipo'][riga]],
+            'valore': int(c['valore'][riga]),
+            'usato': bool(c['usato'][riga]),
+            'proprietario': d['proprietario'].valori[c['proprietario'][riga]],
+            'classe_proprietario': d['classe_proprietario'].valori[c['classe_proprietario'][riga]],
+        }
+
+
+# Indice condiviso dal processo, aggiornato dai salvataggi degli inventari
+indice_inventari = IndiceInventari()
+inventory_listeners.append(indice_inventari.aggiorna_file)
+character_listeners.append(indice_inventari.aggiorna_personaggio)
@@ -10,6 +10,7 @@ from .utils import (
     
     # Gestione JSON inventari
     SaveInventoryJson, LoadInventoryJson, DeleteInventoryJson, GetAllInventoryFiles,
+    LoadInventoriesForOwners,
     
     # Operazioni inventario
     add_object_to_inventory, remove_object_from_inventory, use_object_in_inventory,
@@ -26,7 +27,7 @@ from gioco.schemas.inventario import InventarioSchema
 from gioco.inventario import Inventario
 from marshmallow import ValidationError
 import os
-from config import DATA_DIR_INV
+from config import DATA_DIR_INV, ADMIN_EMAILS
 
 # Setup logging
 logger = logging.getLogger(__name__)
@@ -35,6 +36,9 @@ logger.setLevel(logging.INFO)
 # Schema initialization
 inventario_schema = InventarioSchema()
 
+# Oggetti restituiti al massimo da /api/inventories/query
+QUERY_LIMITE_MAX = 500
+
 # ------------------------VISUALIZZA INVENTARIO-----------------------------
 @inventory_bp.route('/inventory', methods=['GET', 'POST'])
 @login_required
@@ -61,9 +65,9 @@ def inventory():
     personaggio = next((p for p in personaggi if p['id'] == id_personaggio), None)
     inventario_selezionato = None
 
-    if id_personaggio:
-        # Carica inventario con utils
-        inventario_selezionato = LoadInventoryJson(id_personaggio)
+    if personaggio:
+        # Carica solo l'inventario del personaggio selezionato (se dell'utente)
+        inventario_selezionato = LoadInventoriesForOwners([id_personaggio]).get(id_personaggio)
         
         if inventario_selezionato:
             nome_proprietario = nome_per_id.get(id_personaggio, 'sconosciuto')
@@ -77,6 +81,8 @@ def inventory():
             logger.info(f"Inventario di {nome_proprietario} caricato da JSON.")
         else:
             flash("Inventario non trovato o errore nel file.", "warning")
+    elif id_personaggio:
+        flash("Personaggio non trovato", "warning")
 
     return render_template(
         'inventory.html',
@@ -105,11 +111,9 @@ def add_object():
         flash("ID personaggio mancante", "danger")
         return redirect(url_for('inventory.inventory'))
 
-    # Carica e valida personaggio - IMPORT da characters.utils
-    from characters.utils import filter_owned_characters, LoadMultipleCharactersJson
-    owned_ids = filter_owned_characters(current_user.character_ids or [])
-    personaggi = LoadMultipleCharactersJson(owned_ids)
-    personaggio = next((p for p in personaggi if p['id'] == personaggio_id), None)
+    # Carica e valida personaggio (ownership con query indicizzata)
+    from characters.utils import LoadCharacterJson
+    personaggio = LoadCharacterJson(personaggio_id) if current_user.owns_character(personaggio_id) else None
 
     if not personaggio:
         flash("Personaggio non trovato", "danger")
@@ -197,12 +201,9 @@ def delete_object(oggetto_id):
         flash("ID personaggio mancante", "danger")
         return redirect(url_for('inventory.inventory'))
 
-    # Validazione ownership personaggio
-    from characters.routes import load_char, get_owned_chars
-    owned_ids = load_char()
-    personaggi = get_owned_chars(owned_ids)
-    
-    personaggio = next((p for p in personaggi if p['id'] == personaggio_id), None)
+    # Validazione ownership personaggio (query indicizzata)
+    from characters.utils import LoadCharacterJson
+    personaggio = LoadCharacterJson(personaggio_id) if current_user.owns_character(personaggio_id) else None
     if not personaggio:
         flash("Personaggio non trovato", "danger")
         return redirect(url_for('inventory.inventory'))
@@ -253,9 +254,9 @@ def use_object():
             return redirect(url_for('inventory.inventory'))
 
         # Carica personaggi e inventario
-        from characters.routes import load_char, get_owned_chars
-        owned_ids = load_char()
-        personaggi = get_owned_chars(owned_ids)
+        from characters.utils import LoadMultipleCharactersJson
+        owned_ids = current_user.owned_character_ids([personaggio_id, bersaglio_id])
+        personaggi = LoadMultipleCharactersJson(owned_ids)
         
         # Trova utilizzatore e bersaglio
         utilizzatore = next((p for p in personaggi if p['id'] == personaggio_id), None)
@@ -304,12 +305,9 @@ def inventory_stats(personaggio_id):
     con analisi valore, tipologie e distribuzioni.
     """
     try:
-        # Validazione ownership
-        from characters.routes import load_char, get_owned_chars
-        owned_ids = load_char()
-        personaggi = get_owned_chars(owned_ids)
-        
-        personaggio = next((p for p in personaggi if p['id'] == personaggio_id), None)
+        # Validazione ownership (query indicizzata)
+        from characters.utils import LoadCharacterJson
+        personaggio = LoadCharacterJson(personaggio_id) if current_user.owns_character(personaggio_id) else None
         if not personaggio:
             flash("Personaggio non trovato", "danger")
             return redirect(url_for('inventory.inventory'))
@@ -355,11 +353,8 @@ def inventory_api(personaggio_id):
     per dashboard dinamiche e AJAX calls.
     """
     try:
-        # Validazione ownership
-        from characters.routes import load_char
-        owned_ids = load_char()
-        
-        if personaggio_id not in owned_ids:
+        # Validazione ownership (query indicizzata)
+        if not current_user.owns_character(personaggio_id):
             return jsonify({'success': False, 'error': 'Personaggio non autorizzato'}), 403
 
         # Carica inventario
@@ -385,6 +380,84 @@ def inventory_api(personaggio_id):
         logger.error(f"Errore API inventario {personaggio_id}: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# ------------------------API INTERROGAZIONI INVENTARI----------------------
+def _criteri_da_richiesta() -> tuple:
+    """
+    Legge criteri, raggruppamento e limite dal corpo JSON
+    ({"criteri": {...}, "raggruppa": ..., "limite": ...}) oppure dai
+    parametri della query string (tipo, proprietario e classe_proprietario
+    ripetibili).
+    """
+    body = request.get_json(silent=True)
+    if isinstance(body, dict):
+        criteri = body.get('criteri') or {}
+        if not isinstance(criteri, dict):
+            raise ValueError("'criteri' deve essere un oggetto")
+        return criteri, body.get('raggruppa'), body.get('limite', 0)
+
+    criteri = {}
+    for campo in ('tipo', 'proprietario', 'classe_proprietario'):
+        valori = request.args.getlist(campo)
+        if valori:
+            criteri[campo] = valori
+    for campo in ('nome', 'valore_min', 'valore_max'):
+        if campo in request.args:
+            criteri[campo] = request.args[campo]
+    if 'usato' in request.args:
+        usato = request.args['usato'].lower()
+        if usato not in ('true', 'false', '1', '0'):
+            raise ValueError("Criterio 'usato': atteso true o false")
+        criteri['usato'] = usato in ('true', '1')
+    return criteri, request.args.get('raggruppa'), request.args.get('limite', 0)
+
+
+@inventory_bp.route('/api/inventories/query', methods=['GET', 'POST'])
+@login_required
+def inventories_query_api():
+    """
+    API endpoint per statistiche sugli oggetti di tutti gli inventari
+    (es. BombaAcida con valore > 40 raggruppate per classe del proprietario),
+    calcolate sull'indice colonnare di inventory/query.py.
+    Gli utenti in ADMIN_EMAILS interrogano tutti gli inventari, gli altri
+    solo quelli dei propri personaggi.
+    """
+    from .query import indice_inventari
+
+    try:
+        criteri, raggruppa, limite = _criteri_da_richiesta()
+        limite = min(max(int(limite or 0), 0), QUERY_LIMITE_MAX)
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    tutti = (current_user.email or '').lower() in ADMIN_EMAILS
+    if not tutti:
+        richiesti = criteri.get('proprietario')
+        if richiesti is not None:
+            richiesti = richiesti if isinstance(richiesti, list) else [richiesti]
+            owned_ids = current_user.owned_character_ids(richiesti)
+        else:
+            owned_ids = current_user.character_ids
+        criteri = dict(criteri, proprietario=sorted(owned_ids))
+
+    try:
+        inizio = datetime.now()
+        risultato = indice_inventari.interroga(criteri, raggruppa=raggruppa, limite=limite)
+        durata_ms = (datetime.now() - inizio).total_seconds() * 1000
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Errore interrogazione inventari: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    logger.info(f"Interrogazione inventari di {current_user.email}: {risultato['numero']} oggetti in {durata_ms:.2f} ms")
+    return jsonify({
+        'success': True,
+        'tutti_gli_inventari': tutti,
+        'criteri': criteri,
+        'risultato': risultato,
+        'durata_ms': round(durata_ms, 3)
+    })
+
 # ------------------------COMPATIBILITÀ CON CODICE ESISTENTE---------------
 def salva_inventario_su_json(inventario: Inventario):
     """
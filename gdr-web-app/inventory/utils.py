@@ -1,13 +1,17 @@
 import os
-import json
 import logging
-from typing import List, Dict, Optional, Tuple
+from dataclasses import dataclass
+from typing import Callable, List, Dict, Optional, Tuple
 from gioco.oggetto import Oggetto
 from gioco.inventario import Inventario
 from gioco.schemas.oggetto import OggettoSchema
 from gioco.schemas.inventario import InventarioSchema
 from marshmallow import ValidationError
-from config import DATA_DIR_INV
+from config import DATA_DIR_INV, DATA_INV_INDEX, CACHE_MAX_ENTRIES
+from utils.storage import OwnerIndex, DirectoryIds, stamp, verify_stamp
+from utils.salvataggio import salva_json, leggi_json, elimina_json, esiste_json, firma_json
+from utils.cache import LRUCache
+from utils.locks import lock_manager
 
 # Setup logging
 logger = logging.getLogger(__name__)
@@ -17,6 +21,72 @@ logger.setLevel(logging.INFO)
 oggetto_schema = OggettoSchema()
 inventario_schema = InventarioSchema()
 
+# Versione dello schema scritta nei file inventario (vedi utils.storage.stamp)
+INVENTORY_SCHEMA_VERSION = 1
+
+# Indice persistente id_proprietario -> file inventario
+inventory_index = OwnerIndex(DATA_DIR_INV, DATA_INV_INDEX, 'id_proprietario')
+
+# IDs dei file inventario esistenti, riletti solo se la cartella cambia
+inventory_ids = DirectoryIds(DATA_DIR_INV)
+
+# Cache degli inventari già validati, chiave: nome file senza estensione
+inventory_cache = LRUCache(CACHE_MAX_ENTRIES)
+
+# Funzioni chiamate dopo ogni salvataggio (file_id, dati serializzati) o
+# eliminazione (file_id, None) di un inventario in questo processo; le usa
+# l'indice delle interrogazioni (inventory/query.py) per aggiornarsi
+inventory_listeners: List[Callable[[str, Optional[Dict]], None]] = []
+
+
+def _notify_inventory_listeners(file_id: str, inventario_dict: Optional[Dict]) -> None:
+    for listener in inventory_listeners:
+        try:
+            listener(file_id, inventario_dict)
+        except Exception as e:
+            logger.error(f"Errore notifica inventario {file_id}: {e}")
+
+# ------------------------INDICE DATI INVENTARIO----------------------------
+@dataclass(frozen=True)
+class RiepilogoOggetti:
+    """
+    Indice degli oggetti serializzati di un inventario, costruito con una
+    sola scansione: oggetti per ID e per classe, conteggi e valore totale.
+    """
+    per_id: Dict[str, Dict]
+    per_classe: Dict[str, List[Dict]]
+    valore_totale: int
+
+    @classmethod
+    def da_oggetti(cls, oggetti: List[Dict]) -> 'RiepilogoOggetti':
+        per_id, per_classe, valore = {}, {}, 0
+        for obj in oggetti:
+            per_id[str(obj.get('id'))] = obj
+            per_classe.setdefault(obj.get('classe', 'Unknown'), []).append(obj)
+            valore += obj.get('valore', 0)
+        return cls(per_id, per_classe, valore)
+
+
+class DatiInventario(dict):
+    """
+    Dati inventario validati restituiti dai Load*Inventory* e tenuti in
+    cache (sola lettura). Stessa forma del dizionario serializzato; in più
+    il riepilogo degli oggetti è calcolato alla prima statistica richiesta
+    e riusato finché il dizionario resta in cache.
+    """
+
+    def riepilogo(self) -> RiepilogoOggetti:
+        riepilogo = getattr(self, '_riepilogo', None)
+        if riepilogo is None:
+            riepilogo = self._riepilogo = RiepilogoOggetti.da_oggetti(self.get('oggetti', []))
+        return riepilogo
+
+
+def _riepilogo(inventario_data: Dict) -> RiepilogoOggetti:
+    if isinstance(inventario_data, DatiInventario):
+        return inventario_data.riepilogo()
+    return RiepilogoOggetti.da_oggetti(inventario_data.get('oggetti', []))
+
 # ------------------------MAPPING OGGETTI-----------------------------------
 def get_object_classes() -> Dict[str, type]:
     """
@@ -64,11 +134,18 @@ def SaveInventoryJson(inventario: Inventario) -> bool:
         )
         file_path = os.path.join(DATA_DIR_INV, file_name)
         
-        # Serializza con Marshmallow
-        inventario_dict = inventario_schema.dump(inventario)
+        # Serializza con Marshmallow e aggiunge versione e checksum
+        inventario_dict = stamp(inventario_schema.dump(inventario), INVENTORY_SCHEMA_VERSION)
         
-        with open(file_path, "w", encoding="utf-8") as file:
-            json.dump(inventario_dict, file, indent=4)
+        # Scrittura atomica (temp + fsync + rename), eventualmente differita
+        was_fresh = inventory_ids.is_fresh()
+        salva_json(file_path, inventario_dict)
+        inventory_ids.add(os.path.splitext(file_name)[0], was_fresh)
+        inventory_cache.invalidate(os.path.splitext(file_name)[0])
+
+        if inventario.id_proprietario:
+            inventory_index.set(inventario.id_proprietario, os.path.splitext(file_name)[0])
+        _notify_inventory_listeners(os.path.splitext(file_name)[0], inventario_dict)
 
         logger.info(f"Inventario salvato: {file_name}")
         return True
@@ -77,6 +154,75 @@ def SaveInventoryJson(inventario: Inventario) -> bool:
         logger.error(f"Errore salvataggio inventario: {str(e)}")
         return False
 
+def _InventoryFileExists(file_id: str) -> bool:
+    """
+    Verifica l'esistenza di un file inventario usando l'insieme degli IDs
+    in cache (o un salvataggio ancora in sospeso).
+    """
+    file_id = str(file_id)
+    return (
+        file_id in inventory_ids
+        or esiste_json(os.path.join(DATA_DIR_INV, f"{file_id}.json"))
+    )
+
+def _HasDuplicateObjectIds(inventario_data: Dict) -> bool:
+    """
+    Verifica se più oggetti dell'inventario hanno lo stesso ID (file salvati
+    prima che gli ID fossero univoci, vedi gioco.inventario.deduplica_id).
+    """
+    oggetti = inventario_data.get('oggetti') or []
+    return len({str(oggetto.get('id')) for oggetto in oggetti}) != len(oggetti)
+
+def _LoadInventoryFile(file_id: str, memorizza: bool = True, usa_cache: bool = True) -> Optional[Dict]:
+    """
+    Legge e valida un file inventario dato il suo nome senza estensione.
+    Se il file non è cambiato (mtime_ns e dimensione) usa la cache.
+    
+    Args:
+        file_id (str): Nome del file (ID proprietario o ID inventario)
+        memorizza (bool): False per le letture di massa (es. indice delle
+            interrogazioni), che non devono svuotare la cache
+        usa_cache (bool): False per rileggere comunque il file (la firma
+            non distingue due scritture della stessa dimensione nello
+            stesso tick della mtime)
+        
+    Returns:
+        Optional[Dict]: Dati inventario validati (sola lettura) o None se errore
+    """
+    file_name = os.path.join(DATA_DIR_INV, f"{file_id}.json")
+    signature = firma_json(file_name)
+    if signature is None:
+        return None
+
+    cached = inventory_cache.get(file_id, signature) if usa_cache else None
+    if cached is not None:
+        return cached
+
+    try:
+        # Lettura condivisa: attende le modifiche in corso sull'inventario
+        # (stessa chiave di _inventory_lock_key: il file ha il nome del
+        # proprietario o, se manca, dell'inventario)
+        with lock_manager.read_lock(f"inventario:{file_id}"):
+            data = leggi_json(file_name)
+        if data is None:
+            return None
+            
+        # File scritti da SaveInventoryJson: nessuna validazione necessaria
+        validated_dict = verify_stamp(data, INVENTORY_SCHEMA_VERSION)
+        if validated_dict is None or _HasDuplicateObjectIds(validated_dict):
+            # Validazione con Marshmallow (i metadati sono esclusi dallo
+            # schema); lo schema corregge anche gli ID oggetto duplicati
+            inventario_obj = inventario_schema.load(data)
+            validated_dict = inventario_schema.dump(inventario_obj)
+        validated_dict = DatiInventario(validated_dict)
+        if memorizza:
+            inventory_cache.put(file_id, signature, validated_dict)
+        return validated_dict
+        
+    except (ValueError, ValidationError) as e:
+        logger.error(f"Errore caricamento inventario {file_name}: {e}")
+        return None
+
 def LoadInventoryJson(personaggio_id: str) -> Optional[Dict]:
     """
     Carica inventario da file JSON con validazione Marshmallow.
@@ -88,29 +234,19 @@ def LoadInventoryJson(personaggio_id: str) -> Optional[Dict]:
         Optional[Dict]: Dati inventario validati o None se errore
     """
     # Prova caricamento diretto per ID proprietario
-    file_name = os.path.join(DATA_DIR_INV, f"{personaggio_id}.json")
-    if os.path.exists(file_name):
-        try:
-            with open(file_name, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                
-            # Validazione con Marshmallow
-            inventario_obj = inventario_schema.load(data)
-            validated_dict = inventario_schema.dump(inventario_obj)
-            
+    if _InventoryFileExists(personaggio_id):
+        validated_dict = _LoadInventoryFile(personaggio_id)
+        if validated_dict:
             logger.info(f"Inventario caricato direttamente: {personaggio_id}")
-            return validated_dict
-            
-        except (json.JSONDecodeError, ValidationError) as e:
-            logger.error(f"Errore caricamento inventario {file_name}: {e}")
-            return None
+        return validated_dict
 
-    # Fallback: cerca in tutti i file per ID proprietario
+    # Fallback: cerca il file tramite l'indice dei proprietari
     return _SearchInventoryByOwner(personaggio_id)
 
 def _SearchInventoryByOwner(personaggio_id: str) -> Optional[Dict]:
     """
-    Cerca inventario per ID proprietario in tutti i file (fallback).
+    Cerca inventario per ID proprietario tramite l'indice persistente
+    (fallback per inventari salvati con il proprio ID).
     
     Args:
         personaggio_id (str): ID proprietario da cercare
@@ -119,24 +255,14 @@ def _SearchInventoryByOwner(personaggio_id: str) -> Optional[Dict]:
         Optional[Dict]: Inventario trovato o None
     """
     try:
-        for file in os.listdir(DATA_DIR_INV):
-            if file.endswith('.json') and file != '.gitkeep':
-                file_path = os.path.join(DATA_DIR_INV, file)
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        
-                    if str(data.get('id_proprietario')) == str(personaggio_id):
-                        # Validazione con Marshmallow
-                        inventario_obj = inventario_schema.load(data)
-                        validated_dict = inventario_schema.dump(inventario_obj)
-                        
-                        logger.info(f"Inventario trovato via fallback: {personaggio_id} in {file}")
-                        return validated_dict
-                        
-                except (json.JSONDecodeError, ValidationError) as e:
-                    logger.error(f"Errore fallback caricamento da {file}: {e}")
-                    continue
+        file_id = inventory_index.get(personaggio_id)
+        if file_id:
+            validated_dict = _LoadInventoryFile(file_id)
+            if validated_dict and str(validated_dict.get('id_proprietario')) == str(personaggio_id):
+                logger.info(f"Inventario trovato via indice: {personaggio_id} in {file_id}")
+                return validated_dict
+            # Voce non più valida (file rimosso o proprietario cambiato)
+            inventory_index.discard(personaggio_id)
     
     except Exception as e:
         logger.error(f"Errore durante ricerca fallback: {str(e)}")
@@ -144,6 +270,37 @@ def _SearchInventoryByOwner(personaggio_id: str) -> Optional[Dict]:
     logger.warning(f"Inventario non trovato per personaggio {personaggio_id}")
     return None
 
+def LoadInventoriesForOwners(personaggio_ids: List[str]) -> Dict[str, Dict]:
+    """
+    Carica gli inventari di più proprietari leggendo solo i loro file.
+    
+    Args:
+        personaggio_ids (List[str]): IDs dei proprietari
+        
+    Returns:
+        Dict[str, Dict]: {id_proprietario: inventario validato} dei soli
+        inventari trovati
+    """
+    inventari = {}
+    mancanti = []
+
+    for personaggio_id in personaggio_ids:
+        personaggio_id = str(personaggio_id)
+        if _InventoryFileExists(personaggio_id):
+            validated_dict = _LoadInventoryFile(personaggio_id)
+            if validated_dict:
+                inventari[personaggio_id] = validated_dict
+        else:
+            mancanti.append(personaggio_id)
+
+    for personaggio_id, file_id in inventory_index.get_many(mancanti).items():
+        validated_dict = _LoadInventoryFile(file_id)
+        if validated_dict and str(validated_dict.get('id_proprietario')) == personaggio_id:
+            inventari[personaggio_id] = validated_dict
+
+    logger.info(f"Caricati {len(inventari)} inventari da {len(personaggio_ids)} richiesti")
+    return inventari
+
 def DeleteInventoryJson(personaggio_id: str) -> bool:
     """
     Elimina file JSON inventario del personaggio.
@@ -157,8 +314,20 @@ def DeleteInventoryJson(personaggio_id: str) -> bool:
     try:
         file_path = os.path.join(DATA_DIR_INV, f"{personaggio_id}.json")
         
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        if not esiste_json(file_path):
+            # Inventario salvato con il proprio ID: lo trova tramite indice
+            file_id = inventory_index.get(personaggio_id)
+            if file_id:
+                file_path = os.path.join(DATA_DIR_INV, f"{file_id}.json")
+
+        if esiste_json(file_path):
+            file_id = os.path.splitext(os.path.basename(file_path))[0]
+            was_fresh = inventory_ids.is_fresh()
+            elimina_json(file_path)
+            inventory_ids.discard(file_id, was_fresh)
+            inventory_cache.invalidate(file_id)
+            inventory_index.discard(personaggio_id)
+            _notify_inventory_listeners(file_id, None)
             logger.info(f"Inventario eliminato: {file_path}")
             return True
         else:
@@ -177,16 +346,10 @@ def GetAllInventoryFiles() -> List[str]:
         List[str]: Lista di IDs inventari trovati
     """
     try:
-        files = os.listdir(DATA_DIR_INV)
-        inventory_ids = []
+        ids = inventory_ids.all()
         
-        for file in files:
-            if file.endswith('.json') and file != '.gitkeep':
-                filename = os.path.splitext(file)[0]
-                inventory_ids.append(filename)
-        
-        logger.info(f"Trovati {len(inventory_ids)} file inventario")
-        return inventory_ids
+        logger.info(f"Trovati {len(ids)} file inventario")
+        return ids
         
     except Exception as e:
         logger.error(f"Errore lettura directory inventari: {str(e)}")
@@ -295,6 +458,28 @@ def create_character_inventory(char_id: str, initial_object: Oggetto) -> Inventa
     return inv
 
 # ------------------------OPERAZIONI INVENTARIO-----------------------------
+def _inventory_lock_key(inventario_data: Dict) -> str:
+    return f"inventario:{inventario_data.get('id_proprietario') or inventario_data.get('id')}"
+
+def _ReloadInventoryData(inventario_data: Dict) -> Dict:
+    """
+    Rilegge l'inventario dal file sotto lock, così le modifiche partono
+    dall'ultima versione salvata e non da una copia letta prima del lock
+    (che farebbe perdere gli aggiornamenti di un altro worker). Non usa la
+    cache: una scrittura concorrente della stessa dimensione nello stesso
+    tick della mtime avrebbe la stessa firma.
+    """
+    proprietario = inventario_data.get('id_proprietario')
+    if not proprietario:
+        return inventario_data
+    proprietario = str(proprietario)
+    file_id = proprietario if _InventoryFileExists(proprietario) else inventory_index.get(proprietario)
+    if file_id:
+        dati = _LoadInventoryFile(file_id, usa_cache=False)
+        if dati and str(dati.get('id_proprietario')) == proprietario:
+            return dati
+    return inventario_data
+
 def add_object_to_inventory(inventario_data: Dict, nuovo_oggetto: Oggetto) -> Tuple[bool, str]:
     """
     Aggiunge oggetto all'inventario con validazione.
@@ -307,18 +492,19 @@ def add_object_to_inventory(inventario_data: Dict, nuovo_oggetto: Oggetto) -> Tu
         Tuple[bool, str]: (success, message)
     """
     try:
-        # Deserializza inventario
-        inventario_obj = inventario_schema.load(inventario_data)
-        
-        # Aggiunge oggetto
-        inventario_obj.aggiungi_oggetto(nuovo_oggetto)
-        
-        # Salva su file
-        if SaveInventoryJson(inventario_obj):
-            logger.info(f"Oggetto '{nuovo_oggetto.nome}' aggiunto all'inventario")
-            return True, f"Oggetto '{nuovo_oggetto.nome}' aggiunto con successo"
-        else:
-            return False, "Errore salvataggio inventario"
+        with lock_manager.write_lock(_inventory_lock_key(inventario_data)):
+            # Deserializza inventario
+            inventario_obj = inventario_schema.load(_ReloadInventoryData(inventario_data))
+
+            # Aggiunge oggetto
+            inventario_obj.aggiungi_oggetto(nuovo_oggetto)
+
+            # Salva su file
+            if not SaveInventoryJson(inventario_obj):
+                return False, "Errore salvataggio inventario"
+
+        logger.info(f"Oggetto '{nuovo_oggetto.nome}' aggiunto all'inventario")
+        return True, f"Oggetto '{nuovo_oggetto.nome}' aggiunto con successo"
             
     except ValidationError as e:
         logger.error(f"Errore validazione inventario: {e}")
@@ -339,21 +525,21 @@ def remove_object_from_inventory(inventario_data: Dict, oggetto_id: str) -> Tupl
         Tuple[bool, str, Optional[Oggetto]]: (success, message, oggetto_rimosso)
     """
     try:
-        # Deserializza inventario
-        inventario_obj = inventario_schema.load(inventario_data)
-        
-        # Rimuove oggetto
-        oggetto_rimosso = inventario_obj.rimuovi_oggetto(oggetto_id)
-        
-        if oggetto_rimosso:
+        with lock_manager.write_lock(_inventory_lock_key(inventario_data)):
+            # Deserializza inventario
+            inventario_obj = inventario_schema.load(_ReloadInventoryData(inventario_data))
+
+            # Rimuove oggetto
+            oggetto_rimosso = inventario_obj.rimuovi_oggetto(oggetto_id)
+            if not oggetto_rimosso:
+                return False, "Oggetto non trovato nell'inventario", None
+
             # Salva su file
-            if SaveInventoryJson(inventario_obj):
-                logger.info(f"Oggetto ID {oggetto_id} rimosso dall'inventario")
-                return True, "Oggetto rimosso con successo", oggetto_rimosso
-            else:
+            if not SaveInventoryJson(inventario_obj):
                 return False, "Errore salvataggio inventario", None
-        else:
-            return False, "Oggetto non trovato nell'inventario", None
+
+        logger.info(f"Oggetto ID {oggetto_id} rimosso dall'inventario")
+        return True, "Oggetto rimosso con successo", oggetto_rimosso
             
     except ValidationError as e:
         logger.error(f"Errore validazione inventario: {e}")
@@ -362,6 +548,45 @@ def remove_object_from_inventory(inventario_data: Dict, oggetto_id: str) -> Tupl
         logger.error(f"Errore rimozione oggetto: {str(e)}")
         return False, "Errore durante la rimozione", None
 
+def apply_inventory_changes(inventario_data: Dict, rimuovi: List[str], aggiungi: List[Oggetto]) -> Tuple[bool, str]:
+    """
+    Rimuove e aggiunge più oggetti con un solo lock e un solo salvataggio
+    (es. oggetti consumati e premi di una battaglia).
+
+    Args:
+        inventario_data (Dict): Dati inventario serializzati, usati se il
+            proprietario non ha ancora un inventario salvato
+        rimuovi (List[str]): IDs degli oggetti da rimuovere (quelli non più
+            presenti vengono ignorati)
+        aggiungi (List[Oggetto]): Oggetti da aggiungere
+
+    Returns:
+        Tuple[bool, str]: (success, message)
+    """
+    try:
+        with lock_manager.write_lock(_inventory_lock_key(inventario_data)):
+            inventario_obj = inventario_schema.load(_ReloadInventoryData(inventario_data))
+
+            da_rimuovere = {str(oggetto_id) for oggetto_id in rimuovi}
+            for oggetto_id in da_rimuovere:
+                inventario_obj.oggetti.pop_id(oggetto_id)
+            for oggetto in aggiungi:
+                if oggetto.id not in inventario_obj.oggetti:
+                    inventario_obj._aggiungi(oggetto)
+
+            if not SaveInventoryJson(inventario_obj):
+                return False, "Errore salvataggio inventario"
+
+        logger.info(f"Inventario aggiornato: -{len(da_rimuovere)} +{len(aggiungi)} oggetti")
+        return True, "Inventario aggiornato"
+
+    except ValidationError as e:
+        logger.error(f"Errore validazione inventario: {e}")
+        return False, "Errore validazione inventario"
+    except Exception as e:
+        logger.error(f"Errore aggiornamento inventario: {str(e)}")
+        return False, "Errore durante l'aggiornamento dell'inventario"
+
 def use_object_in_inventory(inventario_data: Dict, oggetto_nome: str, utilizzatore, bersaglio) -> Tuple[bool, str]:
     """
     Usa oggetto dall'inventario su un bersaglio.
@@ -376,24 +601,25 @@ def use_object_in_inventory(inventario_data: Dict, oggetto_nome: str, utilizzato
         Tuple[bool, str]: (success, message)
     """
     try:
-        # Deserializza inventario
-        inventario_obj = inventario_schema.load(inventario_data)
-        
-        # Trova oggetto per nome
-        oggetto = next((o for o in inventario_obj.oggetti if o.nome == oggetto_nome), None)
-        
-        if not oggetto:
-            return False, f"Oggetto '{oggetto_nome}' non trovato nell'inventario"
-        
-        # Usa oggetto
-        result = inventario_obj.usa_oggetto(oggetto, utilizzatore=utilizzatore, bersaglio=bersaglio)
-        
-        # Salva inventario aggiornato
-        if SaveInventoryJson(inventario_obj):
-            logger.info(f"Oggetto '{oggetto_nome}' usato da {utilizzatore.nome} su {bersaglio.nome}")
-            return True, f"Oggetto '{oggetto_nome}' utilizzato con successo"
-        else:
-            return False, "Errore salvataggio dopo utilizzo"
+        with lock_manager.write_lock(_inventory_lock_key(inventario_data)):
+            # Deserializza inventario
+            inventario_obj = inventario_schema.load(_ReloadInventoryData(inventario_data))
+
+            # Trova oggetto per nome
+            oggetto = next((o for o in inventario_obj.oggetti if o.nome == oggetto_nome), None)
+
+            if not oggetto:
+                return False, f"Oggetto '{oggetto_nome}' non trovato nell'inventario"
+
+            # Usa oggetto
+            result = inventario_obj.usa_oggetto(oggetto, utilizzatore=utilizzatore, bersaglio=bersaglio)
+
+            # Salva inventario aggiornato
+            if not SaveInventoryJson(inventario_obj):
+                return False, "Errore salvataggio dopo utilizzo"
+
+        logger.info(f"Oggetto '{oggetto_nome}' usato da {utilizzatore.nome} su {bersaglio.nome}")
+        return True, f"Oggetto '{oggetto_nome}' utilizzato con successo"
             
     except ValidationError as e:
         logger.error(f"Errore validazione inventario: {e}")
@@ -433,8 +659,7 @@ def GetInventoryValueTotal(inventario_data: Dict) -> int:
         int: Valore totale dell'inventario
     """
     try:
-        oggetti = inventario_data.get('oggetti', [])
-        valore_totale = sum(obj.get('valore', 0) for obj in oggetti)
+        valore_totale = _riepilogo(inventario_data).valore_totale
         logger.info(f"Valore totale inventario: {valore_totale}")
         return valore_totale
     except Exception as e:
@@ -452,13 +677,11 @@ def GetInventoryStatsByType(inventario_data: Dict) -> Dict[str, int]:
         Dict[str, int]: Dizionario {tipo_oggetto: quantità}
     """
     try:
-        oggetti = inventario_data.get('oggetti', [])
-        stats = {}
-        
-        for obj in oggetti:
-            tipo = obj.get('classe', 'Unknown')
-            stats[tipo] = stats.get(tipo, 0) + 1
-        
+        stats = {
+            tipo: len(oggetti)
+            for tipo, oggetti in _riepilogo(inventario_data).per_classe.items()
+        }
+
         # Aggiungi totale
         stats['Totale'] = sum(stats.values())
         
@@ -472,16 +695,26 @@ def GetInventoryStatsByType(inventario_data: Dict) -> Dict[str, int]:
 def FindObjectsInInventory(inventario_data: Dict, criteria: Dict) -> List[Dict]:
     """
     Cerca oggetti nell'inventario secondo criteri specifici.
+    Con 'id' o 'tipo' si scorrono solo gli oggetti indicizzati con quel
+    valore invece di tutto l'inventario.
     
     Args:
         inventario_data (Dict): Dati inventario serializzati
-        criteria (Dict): Criteri di ricerca (nome, tipo, valore_min, etc.)
+        criteria (Dict): Criteri di ricerca (id, nome, tipo, valore_min, etc.)
         
     Returns:
         List[Dict]: Lista oggetti che corrispondono ai criteri
     """
     try:
-        oggetti = inventario_data.get('oggetti', [])
+        if 'id' in criteria or 'tipo' in criteria:
+            riepilogo = _riepilogo(inventario_data)
+            if 'id' in criteria:
+                trovato = riepilogo.per_id.get(str(criteria['id']))
+                oggetti = [trovato] if trovato is not None else []
+            else:
+                oggetti = riepilogo.per_classe.get(criteria['tipo'], [])
+        else:
+            oggetti = inventario_data.get('oggetti', [])
         risultati = []
         
         for obj in oggetti:
@@ -0,0 +1,93 @@
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class LRUCache:
+    """
+    Cache LRU limitata per i dati già validati letti dagli store.
+    Ogni voce è associata alla firma del record al momento della lettura
+    (per i file: percorso, mtime_ns e dimensione): se la firma cambia la voce
+    non è più valida e conta come miss.
+
+    I valori restituiti sono condivisi tra le richieste e vanno trattati
+    in sola lettura.
+    """
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, signature: Any) -> Optional[Any]:
+        """
+        Restituisce il valore in cache se la firma coincide.
+
+        Args:
+            key (Hashable): chiave del record
+            signature (Any): firma attuale del record
+
+        Returns:
+            Optional[Any]: valore in cache o None se assente/scaduto
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] == signature:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, signature: Any, value: Any) -> None:
+        """
+        Inserisce o aggiorna una voce, eliminando la meno usata se piena.
+
+        Args:
+            key (Hashable): chiave del record
+            signature (Any): firma del record letto
+            value (Any): valore validato da memorizzare
+        """
+        with self._lock:
+            self._data[key] = (signature, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        """
+        Rimuove una voce; usato dalle funzioni di salvataggio/eliminazione.
+        """
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """
+        Svuota la cache senza azzerare i contatori.
+        """
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Contatori della cache.
+
+        Returns:
+            Dict[str, int]: hits, misses, evictions, size, maxsize
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+            }
@@ -0,0 +1,92 @@
+import os
+import json
+import time
+import uuid
+import logging
+from typing import Dict, List
+
+from utils.salvataggio import scrivi_atomico
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class Journal:
+    """
+    Journal write-ahead per operazioni che toccano più store (database
+    utenti, file personaggio, file inventario).
+
+    Ogni operazione è un file `<id>.json` scritto in modo atomico prima di
+    modificare qualsiasi store e rimosso quando l'operazione è conclusa.
+    I file rimasti dopo un crash descrivono operazioni interrotte, che
+    vengono completate o annullate al riavvio.
+    """
+
+    def __init__(self, journal_dir: str) -> None:
+        self.journal_dir = journal_dir
+
+    def _path(self, tx_id: str) -> str:
+        return os.path.join(self.journal_dir, f"{tx_id}.json")
+
+    def begin(self, operazione: str, **dati) -> str:
+        """
+        Registra un'operazione prima di applicarla.
+
+        Args:
+            operazione (str): tipo di operazione (es. 'create', 'delete')
+            **dati: tutto il necessario per completarla o annullarla
+
+        Returns:
+            str: ID della transazione
+        """
+        os.makedirs(self.journal_dir, exist_ok=True)
+        tx_id = uuid.uuid4().hex
+        record = {
+            "id": tx_id,
+            "operazione": operazione,
+            "creata": time.time(),
+            "pid": os.getpid(),
+            **dati,
+        }
+        scrivi_atomico(self._path(tx_id), json.dumps(record))
+        logger.info(f"Transazione {operazione} registrata: {tx_id}")
+        return tx_id
+
+    def complete(self, tx_id: str) -> None:
+        """
+        Segna la transazione come conclusa (applicata o annullata).
+        """
+        try:
+            os.remove(self._path(tx_id))
+        except FileNotFoundError:
+            pass
+
+    def pending(self, min_age: float = 0.0) -> List[Dict]:
+        """
+        Transazioni non concluse, dalla più vecchia.
+
+        Args:
+            min_age (float): ignora le transazioni più recenti di min_age
+                secondi, che potrebbero essere ancora in corso in un altro
+                processo
+
+        Returns:
+            List[Dict]: record delle transazioni
+        """
+        if not os.path.isdir(self.journal_dir):
+            return []
+        limite = time.time() - min_age
+        transazioni = []
+        for file in os.listdir(self.journal_dir):
+            if not file.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.journal_dir, file), "r", encoding="utf-8") as f:
+                    record = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.error(f"Transazione illeggibile {file}: {e}")
+                continue
+            if record.get("creata", 0) <= limite:
+                transazioni.append(record)
+        transazioni.sort(key=lambda record: record.get("creata", 0))
+        return transazioni
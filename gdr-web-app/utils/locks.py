@@ -0,0 +1,274 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+from config import DATA_DIR_LOCKS, LOCK_STATS_INTERVAL
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo lock tra thread dello stesso processo
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class _LettoriScrittore:
+    """
+    Lock lettori/scrittore tra i thread di un processo: più letture insieme
+    oppure una sola scrittura. Uno scrittore in attesa blocca le nuove
+    letture, così le letture continue non lo affamano.
+    """
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition(threading.Lock())
+        self._lettori = 0
+        self._scrittore = False
+        self._scrittori_in_attesa = 0
+
+    def acquisisci(self, esclusivo: bool) -> None:
+        with self._cond:
+            if not esclusivo:
+                while self._scrittore or self._scrittori_in_attesa:
+                    self._cond.wait()
+                self._lettori += 1
+                return
+            self._scrittori_in_attesa += 1
+            try:
+                while self._scrittore or self._lettori:
+                    self._cond.wait()
+            except BaseException:
+                self._scrittori_in_attesa -= 1
+                self._cond.notify_all()
+                raise
+            self._scrittori_in_attesa -= 1
+            self._scrittore = True
+
+    def rilascia(self, esclusivo: bool) -> None:
+        with self._cond:
+            if esclusivo:
+                self._scrittore = False
+            else:
+                self._lettori -= 1
+            self._cond.notify_all()
+
+
+class LockManager:
+    """
+    Lock consultivi per oggetto (personaggio, inventario, file) validi tra
+    più processi (worker gunicorn) tramite fcntl.flock su un file di lock
+    per chiave, con semantica lettori/scrittore: più letture condivise
+    (read_lock, LOCK_SH) oppure una sola scrittura esclusiva (write_lock,
+    LOCK_EX).
+
+    Dentro lo stesso processo ogni chiave ha anche un lock lettori/scrittore
+    tra thread. I lock non sono rientranti, tranne read_lock su una chiave
+    che il thread tiene già (in lettura o scrittura), che non fa nulla: le
+    funzioni di caricamento si possono chiamare dentro un write_lock.
+
+    Lock di thread e file di lock esistono solo finché la chiave è in uso:
+    il lock di thread è rimosso quando nessuno lo tiene o lo aspetta, il
+    file è eliminato da chi rilascia il lock per ultimo (un lettore solo se
+    riesce a prenderlo in esclusiva senza attendere; chi era in attesa sul
+    file eliminato se ne accorge dall'inode e riapre il percorso).
+
+    Le attese sono riassunte da stats() e scritte nel log ogni
+    `intervallo_stats` secondi.
+    """
+
+    def __init__(self, lock_dir: str, intervallo_stats: float = LOCK_STATS_INTERVAL) -> None:
+        self.lock_dir = lock_dir
+        self.intervallo_stats = intervallo_stats
+        # chiave -> [lock, thread che lo tengono o lo aspettano]
+        self._thread_locks: Dict[str, list] = {}
+        self._guard = threading.Lock()
+        # chiavi tenute dal thread corrente
+        self._tenuti = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "acquisizioni": 0,
+            "condivise": 0,
+            "attesa_totale_ms": 0.0,
+            "attesa_max_ms": 0.0,
+        }
+        self._ultimo_report = time.monotonic()
+
+    def _thread_lock(self, key: str) -> _LettoriScrittore:
+        with self._guard:
+            voce = self._thread_locks.get(key)
+            if voce is None:
+                voce = self._thread_locks[key] = [_LettoriScrittore(), 0]
+            voce[1] += 1
+            return voce[0]
+
+    def _release_thread_lock(self, key: str) -> bool:
+        """
+        Rilascia il riferimento al lock di thread della chiave.
+
+        Returns:
+            bool: True se altri thread di questo processo lo tengono o lo
+            aspettano
+        """
+        with self._guard:
+            voce = self._thread_locks[key]
+            voce[1] -= 1
+            if voce[1] == 0:
+                del self._thread_locks[key]
+                return False
+            return True
+
+    def _chiavi_tenute(self) -> Dict[str, bool]:
+        tenuti = getattr(self._tenuti, "chiavi", None)
+        if tenuti is None:
+            tenuti = self._tenuti.chiavi = {}
+        return tenuti
+
+    def _lock_path(self, key: str) -> str:
+        # Nome file sicuro qualunque sia la chiave
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.lock_dir, f"{digest}.lock")
+
+    def _lock_file(self, path: str, esclusivo: bool) -> int:
+        """
+        Apre e blocca il file di lock, riprovando se nel frattempo chi lo
+        teneva lo ha eliminato.
+
+        Returns:
+            int: descrittore del file bloccato
+        """
+        modo = fcntl.LOCK_EX if esclusivo else fcntl.LOCK_SH
+        while True:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, modo)
+                if os.fstat(fd).st_ino == os.stat(path).st_ino:
+                    return fd
+            except FileNotFoundError:
+                pass
+            except BaseException:
+                os.close(fd)
+                raise
+            os.close(fd)
+
+    @staticmethod
+    def _elimina_file(fd: int, path: str, esclusivo: bool) -> None:
+        """
+        Elimina il file di lock mentre è tenuto in esclusiva. Un lettore
+        prova a passare in esclusiva senza attendere: se non ci riesce altri
+        processi lo usano ancora e lo eliminerà l'ultimo di loro.
+        """
+        if not esclusivo:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def _record_wait(self, attesa_ms: float, esclusivo: bool) -> None:
+        ora = time.monotonic()
+        report = None
+        with self._stats_lock:
+            self._stats["acquisizioni"] += 1
+            if not esclusivo:
+                self._stats["condivise"] += 1
+            self._stats["attesa_totale_ms"] += attesa_ms
+            self._stats["attesa_max_ms"] = max(self._stats["attesa_max_ms"], attesa_ms)
+            if self.intervallo_stats > 0 and ora - self._ultimo_report >= self.intervallo_stats:
+                self._ultimo_report = ora
+                report = True
+        if report:
+            stats = self.stats()
+            logger.info(
+                f"Lock: {stats['acquisizioni']} acquisizioni ({stats['condivise']} condivise), "
+                f"attesa media {stats['attesa_media_ms']:.2f} ms, massima {stats['attesa_max_ms']:.1f} ms"
+            )
+
+    @contextmanager
+    def _acquisisci(self, key: str, esclusivo: bool) -> Iterator[None]:
+        key = str(key)
+        tenuti = self._chiavi_tenute()
+        if key in tenuti:
+            if esclusivo:
+                raise RuntimeError(f"Lock {key} già tenuto da questo thread")
+            yield  # lettura dentro un lock già tenuto
+            return
+        inizio = time.perf_counter()
+        thread_lock = self._thread_lock(key)
+        try:
+            thread_lock.acquisisci(esclusivo)
+        except BaseException:
+            self._release_thread_lock(key)
+            raise
+        fd = None
+        path = self._lock_path(key)
+        try:
+            if fcntl is not None:
+                os.makedirs(self.lock_dir, exist_ok=True)
+                fd = self._lock_file(path, esclusivo)
+            attesa_ms = (time.perf_counter() - inizio) * 1000
+            self._record_wait(attesa_ms, esclusivo)
+            if attesa_ms > 100:
+                logger.warning(f"Attesa lock {key}: {attesa_ms:.1f} ms")
+            tenuti[key] = esclusivo
+            yield
+        finally:
+            tenuti.pop(key, None)
+            in_uso = self._release_thread_lock(key)
+            if fd is not None:
+                # Se altri thread del processo lo usano il file resta per
+                # loro; altrimenti si elimina finché il lock è ancora tenuto
+                if not in_uso:
+                    self._elimina_file(fd, path, esclusivo)
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+            thread_lock.rilascia(esclusivo)
+
+    def write_lock(self, key: str):
+        """
+        Lock esclusivo per sequenze carica-modifica-salva.
+
+        Args:
+            key (str): chiave dell'oggetto (es. 'personaggio:<id>')
+
+        Raises:
+            RuntimeError: se il thread tiene già la chiave
+        """
+        return self._acquisisci(key, True)
+
+    def read_lock(self, key: str):
+        """
+        Lock condiviso per le letture: attende le scritture in corso sulla
+        stessa chiave ma non le altre letture. Non fa nulla se il thread
+        tiene già la chiave.
+
+        Args:
+            key (str): chiave dell'oggetto (es. 'personaggio:<id>')
+        """
+        return self._acquisisci(key, False)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Metriche di attesa dei lock di questo processo.
+
+        Returns:
+            Dict[str, float]: acquisizioni (di cui condivise), attesa
+            totale/media/massima in ms
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["attesa_media_ms"] = (
+            stats["attesa_totale_ms"] / stats["acquisizioni"]
+            if stats["acquisizioni"] else 0.0
+        )
+        return stats
+
+
+# Lock manager condiviso da personaggi e inventari
+lock_manager = LockManager(DATA_DIR_LOCKS)
@@ -1,12 +1,335 @@
 # importo di datetime per la registrazione degli eventi
 from datetime import datetime
 import os
+import gzip
+import time
+import queue
+import atexit
+import shutil
+import logging
+import tempfile
+import threading
+from itertools import islice
+from typing import BinaryIO, Iterator, List, Optional
+
+from config import (
+    DATA_LOG, LOG_MAX_BYTES, LOG_MAX_AGE, LOG_BACKUPS,
+    LOG_FLUSH_INTERVAL, LOG_QUEUE_MAX
+)
+from utils.locks import lock_manager
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+FORMATO_DATA = '%Y-%m-%d %H:%M:%S'
+
+# Eventi scritti al massimo con una sola write
+LOG_BLOCCO = 1024
+
+# Eventi mostrati da Log.mostra_log
+LOG_MOSTRA = 100
+
+# Segnale di chiusura per il thread di scrittura
+_FINE = object()
+
+
+# ------------------------SCRITTURA-----------------------------------------
+class ScrittoreLog:
+    """
+    Scrive il log degli eventi da un thread in background: scrivi() mette
+    la riga in coda e torna subito, il thread svuota la coda a blocchi
+    (una write per blocco su un file tenuto aperto) e ruota il file quando
+    supera `max_bytes` o è più vecchio di `max_eta` secondi. I file ruotati
+    sono compressi in gzip (log.txt.1.gz il più recente, fino a `backup`).
+
+    Con più worker ognuno ha il suo thread: scrittura di un blocco e
+    rotazione avvengono sotto lo stesso lock del file, e prima di scrivere
+    il file aperto è confrontato con quello sul percorso (riaperto se un
+    altro worker lo ha ruotato), così nessun blocco finisce nel file ruotato.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        max_bytes: int = LOG_MAX_BYTES,
+        max_eta: float = LOG_MAX_AGE,
+        backup: int = LOG_BACKUPS,
+        intervallo: float = LOG_FLUSH_INTERVAL,
+        coda_max: int = LOG_QUEUE_MAX
+    ) -> None:
+        self.file_path = os.path.abspath(file_path)
+        self.max_bytes = max_bytes
+        self.max_eta = max_eta
+        self.backup = backup
+        self.intervallo = intervallo
+        self._coda: queue.Queue = queue.Queue(maxsize=coda_max)
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._avvio_lock = threading.Lock()
+        # usati solo dal thread di scrittura
+        self._file = None
+        self._inizio = 0.0  # orario del primo evento del file corrente
+        self.eventi_scritti = 0
+        self.scritture = 0
+        self.rotazioni = 0
+
+    def _attivo(self) -> bool:
+        return (
+            self._thread is not None and self._thread.is_alive()
+            and self._pid == os.getpid()
+        )
+
+    def _avvia(self) -> None:
+        """Avvia il thread al primo evento (e di nuovo dopo un fork)."""
+        if self._attivo():
+            return
+        with self._avvio_lock:
+            if self._attivo():
+                return
+            if self._pid != os.getpid():
+                # Processo figlio: coda e file del padre non sono utilizzabili
+                self._coda = queue.Queue(maxsize=self._coda.maxsize)
+                self._file = None
+                self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._ciclo, name="gdr-log", daemon=True
+            )
+            self._thread.start()
+
+    def scrivi(self, riga: str) -> None:
+        """
+        Mette in coda una riga già formattata. Se la coda è piena attende
+        il thread di scrittura invece di perdere eventi.
+
+        Args:
+            riga (str): riga terminata da '\\n'
+        """
+        self._avvia()
+        self._coda.put(riga)
+
+    def flush(self) -> None:
+        """Attende che tutti gli eventi in coda siano su disco."""
+        if self._attivo():
+            self._coda.join()
+
+    def chiudi(self) -> None:
+        """Scrive gli eventi in coda e ferma il thread (registrato con atexit)."""
+        if not self._attivo():
+            return
+        self._coda.put(_FINE)
+        self._thread.join(timeout=5)
+
+    # ------------------------THREAD DI SCRITTURA---------------------------
+    def _ciclo(self) -> None:
+        coda = self._coda
+        while True:
+            try:
+                primo = coda.get(timeout=self.intervallo)
+            except queue.Empty:
+                # Nessun evento: controlla comunque la rotazione per età
+                self._ruota_se_serve()
+                continue
+            blocco = [primo]
+            while len(blocco) < LOG_BLOCCO:
+                try:
+                    blocco.append(coda.get_nowait())
+                except queue.Empty:
+                    break
+            fine = _FINE in blocco
+            righe = [riga for riga in blocco if riga is not _FINE]
+            try:
+                if righe:
+                    self._scrivi_blocco(righe)
+            except Exception as e:
+                logger.error(f"Errore scrittura log {self.file_path}: {e}")
+            finally:
+                for _ in blocco:
+                    coda.task_done()
+            if fine:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                return
+
+    def _apri(self):
+        if self._file is not None:
+            try:
+                if os.stat(self.file_path).st_ino == os.fstat(self._file.fileno()).st_ino:
+                    return self._file
+            except FileNotFoundError:
+                pass
+            # Ruotato da un altro worker
+            self._file.close()
+        os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+        self._file = open(self.file_path, "a", encoding="utf-8")
+        self._inizio = _orario_prima_riga(self.file_path) or time.time()
+        return self._file
+
+    def _scrivi_blocco(self, righe: List[str]) -> None:
+        with lock_manager.write_lock(f"file:{self.file_path}"):
+            file = self._apri()
+            file.write("".join(righe))
+            file.flush()
+            self.scritture += 1
+            self.eventi_scritti += len(righe)
+            if self._da_ruotare(os.fstat(file.fileno()).st_size):
+                self._ruota()
+
+    def _da_ruotare(self, dimensione: int) -> bool:
+        if dimensione == 0:
+            return False
+        if self.max_bytes and dimensione >= self.max_bytes:
+            return True
+        return bool(self.max_eta) and time.time() - self._inizio >= self.max_eta
+
+    def _ruota_se_serve(self) -> None:
+        """Rotazione per età quando non arrivano eventi."""
+        if self._file is None or not self._da_ruotare(os.fstat(self._file.fileno()).st_size):
+            return
+        with lock_manager.write_lock(f"file:{self.file_path}"):
+            # Ricontrolla sul percorso: un altro worker può aver già ruotato
+            file = self._apri()
+            if self._da_ruotare(os.fstat(file.fileno()).st_size):
+                self._ruota()
+
+    def _ruota(self) -> None:
+        """Ruota il file aperto; da chiamare sotto il lock del file."""
+        self._file.close()
+        self._file = None
+        ruota_file(self.file_path, self.backup)
+        self.rotazioni += 1
+
+
+def ruota_file(file_path: str, backup: int) -> None:
+    """
+    Sposta il log corrente in file_path.1.gz (compresso) facendo scorrere
+    i file precedenti ed eliminando quelli oltre `backup`.
+
+    Args:
+        file_path (str): log corrente
+        backup (int): file ruotati da conservare, 0 per nessuno
+    """
+    if backup <= 0:
+        os.remove(file_path)
+        return
+    for i in range(backup - 1, 0, -1):
+        sorgente = f"{file_path}.{i}.gz"
+        if os.path.exists(sorgente):
+            os.replace(sorgente, f"{file_path}.{i + 1}.gz")
+    # Rinomina prima di comprimere: il nuovo log può ripartire subito
+    ruotato = f"{file_path}.1"
+    os.replace(file_path, ruotato)
+    temporaneo = f"{file_path}.1.gz.tmp"
+    with open(ruotato, "rb") as src, gzip.open(temporaneo, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.replace(temporaneo, f"{file_path}.1.gz")
+    os.remove(ruotato)
+
+
+def _orario_prima_riga(file_path: str) -> Optional[float]:
+    try:
+        with open(file_path, "r", encoding="utf-8") as file:
+            inizio = file.read(len("YYYY-mm-dd HH:MM:SS"))
+        return datetime.strptime(inizio, FORMATO_DATA).timestamp()
+    except (OSError, ValueError):
+        return None
+
+
+# Ultimo orario formattato: strftime costa più della messa in coda, e gli
+# eventi dello stesso secondo condividono la stessa stringa
+_orario = (0, "")
+
+
+def _timestamp() -> str:
+    global _orario
+    secondo = int(time.time())
+    cache = _orario
+    if cache[0] != secondo:
+        cache = _orario = (secondo, datetime.fromtimestamp(secondo).strftime(FORMATO_DATA))
+    return cache[1]
+
+
+# ------------------------LETTURA-------------------------------------------
+def _righe_dal_fondo(file: BinaryIO, blocco: int = 64 * 1024) -> Iterator[str]:
+    """
+    Righe di un file binario aperto dall'ultima alla prima, leggendo a
+    blocchi dalla fine: costo proporzionale alle righe lette, non al file.
+    """
+    posizione = file.seek(0, os.SEEK_END)
+    resto = b""
+    while posizione > 0:
+        passo = min(blocco, posizione)
+        posizione -= passo
+        file.seek(posizione)
+        righe = (file.read(passo) + resto).split(b"\n")
+        resto = righe.pop(0)  # può essere incompleta: si completa col blocco prima
+        for riga in reversed(righe):
+            if riga:
+                yield riga.decode("utf-8", errors="replace")
+    if resto:
+        yield resto.decode("utf-8", errors="replace")
+
+
+def _righe_inverse(file_path: str, backup: int) -> Iterator[str]:
+    """
+    Eventi dal più recente al più vecchio, file ruotati compresi. Un file
+    ruotato è decompresso a blocchi in un file temporaneo (gzip non si
+    legge all'indietro) solo quando la lettura arriva fino a lui.
+    """
+    try:
+        with open(file_path, "rb") as file:
+            yield from _righe_dal_fondo(file)
+    except FileNotFoundError:
+        pass
+    for i in range(1, backup + 1):
+        try:
+            compresso = gzip.open(f"{file_path}.{i}.gz", "rb")
+        except FileNotFoundError:
+            continue
+        with compresso, tempfile.TemporaryFile() as file:
+            shutil.copyfileobj(compresso, file)
+            yield from _righe_dal_fondo(file)
+
+
+def leggi_log(
+    offset: int = 0,
+    limite: int = LOG_MOSTRA,
+    file_path: Optional[str] = None,
+    backup: Optional[int] = None
+) -> List[str]:
+    """
+    Pagina di eventi contando a ritroso dal più recente: offset=0 restituisce
+    gli ultimi `limite` eventi, offset=limite la pagina precedente e così via.
+
+    Args:
+        offset (int): eventi più recenti da saltare
+        limite (int): numero massimo di eventi
+        file_path (Optional[str]): log da leggere, default quello di gioco
+        backup (Optional[int]): file ruotati da considerare
+
+    Returns:
+        List[str]: eventi in ordine cronologico
+    """
+    file_path = file_path or scrittore_log.file_path
+    backup = scrittore_log.backup if backup is None else backup
+    righe = list(islice(_righe_inverse(file_path, backup), offset, offset + limite))
+    righe.reverse()
+    return righe
+
+
+# Scrittore condiviso dagli eventi di gioco
+scrittore_log = ScrittoreLog(DATA_LOG)
+atexit.register(scrittore_log.chiudi)
+
+
 class Log:
     """Classe per la registrazione degli eventi del gioco."""
     @staticmethod
     def scrivi_log(messaggio: str) -> None:
         """
-        Registra un messaggio con timestamp direttamente nel file log.txt.
+        Registra un messaggio con timestamp nel file log.txt. La scrittura
+        avviene in background: il messaggio è su disco entro
+        LOG_FLUSH_INTERVAL secondi (o dopo Log.flush).
 
         Args:
             messaggio (str): Messaggio da registrare.
@@ -14,28 +337,39 @@ class Log:
         Return:
             None
         """
-        # creo cartella data se non esiste
-        
-        if not os.path.exists("data"):
-            os.makedirs("data")
-        
-        with open("data/log.txt", "a", encoding="utf-8") as file:
-            file.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - {messaggio}\n")
-        
-        
+        # un evento per riga: gli a capo del messaggio diventano spazi
+        testo = " ".join(messaggio.split("\n")).rstrip()
+        scrittore_log.scrivi(f"{_timestamp()} - {testo}\n")
 
     @staticmethod
-    def mostra_log() -> None:
+    def flush() -> None:
+        """Attende la scrittura degli eventi in coda."""
+        scrittore_log.flush()
+
+    @staticmethod
+    def leggi(offset: int = 0, limite: int = LOG_MOSTRA) -> List[str]:
         """
-        Legge il file e stampa tutto quello che è successo nella partita
+        Pagina di eventi a ritroso dal più recente (vedi leggi_log).
 
         Args:
-            None
+            offset (int): eventi più recenti da saltare
+            limite (int): numero massimo di eventi
+
+        Return:
+            List[str]: eventi in ordine cronologico
+        """
+        scrittore_log.flush()
+        return leggi_log(offset, limite)
+
+    @staticmethod
+    def mostra_log(ultimi: int = LOG_MOSTRA) -> None:
+        """
+        Stampa gli ultimi eventi della partita, senza caricare tutto il file.
+
+        Args:
+            ultimi (int): numero di eventi da mostrare
 
         Return:
             None
         """
-        
-        with open("data/log.txt", "r", encoding="utf-8") as file:
-            print(file.read())
-        
\ No newline at end of file
+        print("\n".join(Log.leggi(0, ultimi)))
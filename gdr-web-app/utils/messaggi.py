@@ -1,28 +1,203 @@
+import threading
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional
+
+try:
+    from flask import g, has_app_context
+except ImportError:  # uso senza Flask (es. script da riga di comando)
+    g = None
+
+    def has_app_context() -> bool:
+        return False
+
+# Livelli dei messaggi: gli stessi delle categorie di flash (classi Bootstrap)
+INFO = "info"
+SUCCESSO = "success"
+AVVISO = "warning"
+ERRORE = "danger"
+LIVELLI = (INFO, SUCCESSO, AVVISO, ERRORE)
+
+# Messaggi conservati per canale: oltre questo numero si scartano i più vecchi
+MESSAGGI_MAX = 200
+
+
+class CanaleMessaggi:
+    """
+    Canale di messaggi per l'utente limitato a `max_messaggi` voci (deque
+    con maxlen: memoria costante anche in una battaglia lunghissima).
+    Ogni voce ha un id progressivo, così la vista può leggere solo i
+    messaggi arrivati dopo l'ultimo che ha già mostrato.
+
+    È thread-safe; ogni richiesta o battaglia ha il proprio canale, quindi
+    utenti diversi non vedono mai i messaggi degli altri.
+    """
+
+    __slots__ = ("_voci", "_ultimo", "_lock")
+
+    def __init__(self, max_messaggi: int = MESSAGGI_MAX, ultimo: int = 0) -> None:
+        self._voci: deque = deque(maxlen=max_messaggi)
+        self._ultimo = ultimo
+        self._lock = threading.Lock()
+
+    @property
+    def ultimo(self) -> int:
+        """Id dell'ultimo messaggio aggiunto (0 se nessuno)."""
+        return self._ultimo
+
+    @property
+    def max_messaggi(self) -> int:
+        return self._voci.maxlen
+
+    def aggiungi(self, testo: str, livello: str = INFO) -> int:
+        """
+        Aggiunge un messaggio.
+
+        Args:
+            testo (str): testo del messaggio
+            livello (str): uno di LIVELLI
+
+        Returns:
+            int: id del messaggio
+        """
+        if livello not in LIVELLI:
+            raise ValueError(f"Livello di messaggio non valido: {livello}")
+        with self._lock:
+            self._ultimo += 1
+            self._voci.append({"id": self._ultimo, "livello": livello, "testo": testo})
+            return self._ultimo
+
+    def estendi(self, testi: Iterable[str], livello: str = INFO) -> None:
+        """
+        Aggiunge più messaggi con lo stesso livello.
+
+        Args:
+            testi (Iterable[str]): testi in ordine
+            livello (str): uno di LIVELLI
+        """
+        for testo in testi:
+            self.aggiungi(testo, livello)
+
+    def dopo(self, cursore: int = 0) -> List[Dict]:
+        """
+        Messaggi successivi a `cursore` ancora conservati, senza rimuoverli.
+
+        Args:
+            cursore (int): id dell'ultimo messaggio già letto
+
+        Returns:
+            List[Dict]: voci {id, livello, testo} dalla più vecchia
+        """
+        with self._lock:
+            if cursore >= self._ultimo:
+                return []
+            # Gli id sono consecutivi: le voci nuove sono in coda
+            nuove = min(self._ultimo - cursore, len(self._voci))
+            return [dict(voce) for voce in list(self._voci)[-nuove:]]
+
+    def svuota(self) -> List[Dict]:
+        """
+        Rimuove e restituisce tutti i messaggi (l'id continua a crescere).
+
+        Returns:
+            List[Dict]: voci {id, livello, testo} dalla più vecchia
+        """
+        with self._lock:
+            voci = list(self._voci)
+            self._voci.clear()
+            return voci
+
+    def testi(self) -> List[str]:
+        """
+        Returns:
+            List[str]: testi dei messaggi conservati dal più vecchio
+        """
+        with self._lock:
+            return [voce["testo"] for voce in self._voci]
+
+    def __len__(self) -> int:
+        return len(self._voci)
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self.dopo(0))
+
+    # ------------------------SERIALIZZAZIONE-----------------------------------
+    def to_dict(self) -> Dict:
+        """
+        Returns:
+            Dict: stato serializzabile (es. in sessione)
+        """
+        with self._lock:
+            return {"ultimo": self._ultimo, "voci": list(self._voci)}
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict], max_messaggi: int = MESSAGGI_MAX) -> 'CanaleMessaggi':
+        """
+        Ricrea il canale da to_dict; accetta anche la vecchia lista di testi.
+
+        Args:
+            data (Optional[Dict]): stato salvato
+            max_messaggi (int): voci da conservare
+
+        Returns:
+            CanaleMessaggi:
+        """
+        canale = cls(max_messaggi)
+        if isinstance(data, list):
+            canale.estendi(data)
+        elif data:
+            canale._voci.extend(data.get("voci", []))
+            canale._ultimo = int(data.get("ultimo", 0))
+        return canale
+
+
+# ------------------------CANALE DELLA RICHIESTA------------------------------
+_locale = threading.local()
+
+
+def messaggi_richiesta() -> CanaleMessaggi:
+    """
+    Canale della richiesta corrente (flask.g), creato al primo uso. Fuori
+    da una richiesta Flask il canale è per thread.
+
+    Returns:
+        CanaleMessaggi:
+    """
+    if has_app_context():
+        if "messaggi" not in g:
+            g.messaggi = CanaleMessaggi()
+        return g.messaggi
+    canale = getattr(_locale, "messaggi", None)
+    if canale is None:
+        canale = _locale.messaggi = CanaleMessaggi()
+    return canale
+
 
 class Messaggi:
     """
-    Si occupa di accumulare i messaggi che devono essere mostrati all'utente
+    Si occupa di accumulare i messaggi che devono essere mostrati all'utente.
+    I messaggi sono nel canale della richiesta corrente (messaggi_richiesta),
+    non più in una stringa condivisa da tutte le richieste.
     """
-    messaggi=""
 
     @staticmethod
-    def add_to_messaggi(msg:str):
-            """
-            Aggiunge un nuovo msg a messaggi, mandando a capo ad ogni nuovo msg
-
-            Args:
-                msg (str): nuovo msg da concatenare
-            """
-            if Messaggi.messaggi == "" :
-                Messaggi.messaggi = msg
-            else:
-                Messaggi.messaggi = f"{Messaggi.messaggi}\n{msg}"
+    def add_to_messaggi(msg: str, livello: str = INFO):
+        """
+        Aggiunge un nuovo msg ai messaggi della richiesta.
+
+        Args:
+            msg (str): nuovo msg
+            livello (str): uno di LIVELLI
+        """
+        messaggi_richiesta().aggiungi(msg, livello)
 
     @staticmethod
-    def get_messaggi():
-        return Messaggi.messaggi
+    def get_messaggi() -> str:
+        """
+        Returns:
+            str: messaggi della richiesta, uno per riga
+        """
+        return "\n".join(messaggi_richiesta().testi())
 
     @staticmethod
     def delete_messaggi():
-        Messaggi.messaggi=""
-
+        messaggi_richiesta().svuota()
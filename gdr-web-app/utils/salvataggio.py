@@ -1,5 +1,389 @@
+import os
+import copy
 import json
-from typing import Any
+import atexit
+import logging
+import tempfile
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Union
+
+from config import WRITE_BEHIND_WINDOW, SAVE_CODEC, SAVE_CODEC_MIGRATE
+from utils.locks import lock_manager
+
+try:
+    import orjson
+except ImportError:  # opzionale: si usa il modulo json standard
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # senza msgspec il formato binario non è disponibile
+    msgspec = None
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+# ------------------------CODEC---------------------------------------------
+# Intestazione dei file binari: i file JSON iniziano sempre con '{' o '['
+MAGIA_BINARIO = b"GDRB\x01"
+
+
+class Codec:
+    """
+    Formato di serializzazione dei file di gioco.
+
+    Attributes:
+        nome (str): nome usato in configurazione (GDR_SAVE_CODEC)
+        formato (str): formato su disco ('json', 'json-compatto', 'msgpack');
+            codec diversi possono produrre lo stesso formato
+    """
+
+    def __init__(self, nome: str, formato: str, codifica) -> None:
+        self.nome = nome
+        self.formato = formato
+        self._codifica = codifica
+
+    def codifica(self, dati: Any) -> bytes:
+        return self._codifica(dati)
+
+    def __repr__(self) -> str:
+        return f"Codec({self.nome!r})"
+
+
+def _codifica_orjson(dati: Any) -> bytes:
+    return orjson.dumps(dati, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _codifica_indentato(dati: Any) -> bytes:
+    # Il modulo json indenta in Python puro: con orjson si indenta a 2 spazi
+    if orjson is not None:
+        return orjson.dumps(dati, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_INDENT_2)
+    return json.dumps(dati, indent=4).encode("utf-8")
+
+
+def _codifica_msgpack(dati: Any) -> bytes:
+    return MAGIA_BINARIO + _encoder_msgpack.encode(dati)
+
+
+_encoder_msgpack = msgspec.msgpack.Encoder() if msgspec else None
+_decoder_msgpack = msgspec.msgpack.Decoder() if msgspec else None
+
+CODECS: Dict[str, Codec] = {
+    "json": Codec("json", "json", _codifica_indentato),
+    "json-compatto": Codec(
+        "json-compatto", "json-compatto",
+        lambda dati: json.dumps(dati, separators=(",", ":")).encode("utf-8")
+    ),
+}
+if orjson is not None:
+    CODECS["orjson"] = Codec("orjson", "json-compatto", _codifica_orjson)
+if msgspec is not None:
+    CODECS["msgpack"] = Codec("msgpack", "msgpack", _codifica_msgpack)
+
+
+def get_codec(nome: Optional[str] = None) -> Codec:
+    """
+    Restituisce il codec richiesto, o quello configurato (GDR_SAVE_CODEC).
+
+    Raises:
+        ValueError: se il codec non esiste o la sua libreria non è installata
+    """
+    nome = nome or SAVE_CODEC
+    try:
+        return CODECS[nome]
+    except KeyError:
+        raise ValueError(
+            f"Codec '{nome}' non disponibile (disponibili: {', '.join(CODECS)})"
+        ) from None
+
+
+def rileva_formato(contenuto: Union[bytes, str]) -> str:
+    """
+    Riconosce il formato dal contenuto, non dall'estensione del file.
+
+    Returns:
+        str: 'msgpack', 'json-compatto' o 'json' (indentato)
+    """
+    if isinstance(contenuto, str):
+        contenuto = contenuto[:2].encode("utf-8")
+    if contenuto.startswith(MAGIA_BINARIO):
+        return "msgpack"
+    # Il JSON indentato va a capo subito dopo la parentesi iniziale
+    return "json" if contenuto[1:2] == b"\n" else "json-compatto"
+
+
+def decodifica(contenuto: Union[bytes, str]) -> Any:
+    """
+    Decodifica il contenuto di un file di gioco in qualunque formato.
+
+    Raises:
+        ValueError: contenuto non valido (json.JSONDecodeError è una
+            sottoclasse di ValueError)
+    """
+    if isinstance(contenuto, bytes) and contenuto.startswith(MAGIA_BINARIO):
+        if _decoder_msgpack is None:
+            raise ValueError("File binario ma msgspec non è installato")
+        try:
+            return _decoder_msgpack.decode(memoryview(contenuto)[len(MAGIA_BINARIO):])
+        except msgspec.DecodeError as e:
+            raise ValueError(f"File binario non valido: {e}") from e
+    if orjson is not None:
+        try:
+            return orjson.loads(contenuto)
+        except orjson.JSONDecodeError:
+            pass  # es. NaN/Infinity scritti dal modulo json: riprova sotto
+    return json.loads(contenuto)
+
+
+def _fsync_dir(dir_path: str) -> None:
+    """
+    Rende persistente la rinomina del file (su Windows non è possibile
+    aprire una cartella, e la rinomina è già atomica).
+    """
+    if os.name != "posix":
+        return
+    fd = os.open(dir_path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def scrivi_atomico(file_path: str, contenuto: Union[bytes, str], sync_dir: bool = True) -> None:
+    """
+    Scrive il contenuto su un file temporaneo nella stessa cartella, lo
+    sincronizza su disco e lo rinomina sul file di destinazione: un crash
+    lascia il file vecchio o quello nuovo, mai uno troncato.
+
+    Args:
+        file_path (str): file di destinazione
+        contenuto (Union[bytes, str]): dati già codificati o testo
+        sync_dir (bool): sincronizza anche la cartella dopo la rinomina
+    """
+    if isinstance(contenuto, str):
+        contenuto = contenuto.encode("utf-8")
+    cartella = os.path.dirname(os.path.abspath(file_path))
+    fd, tmp_path = tempfile.mkstemp(
+        dir=cartella, prefix=".", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(contenuto)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if sync_dir:
+        _fsync_dir(cartella)
+
+
+def _scrivi_file(file_path: str, contenuto: bytes, sync_dir: bool = True) -> None:
+    # Lock per file: serializza scritture e migrazioni tra worker
+    with lock_manager.write_lock(f"file:{os.path.abspath(file_path)}"):
+        scrivi_atomico(file_path, contenuto, sync_dir=sync_dir)
+
+
+class ScritturaDifferita:
+    """
+    Write-behind dei file JSON di gioco: più salvataggi dello stesso file
+    entro `finestra` secondi diventano un'unica scrittura atomica.
+    Con finestra <= 0 ogni salvataggio è scritto subito.
+
+    Finché un salvataggio è in sospeso le letture fatte con leggi_json
+    vedono già i nuovi dati; gli altri processi li vedono dopo il flush.
+    """
+
+    def __init__(self, finestra: float = 0.0) -> None:
+        self.finestra = finestra
+        self._pending: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self.scritture_richieste = 0
+        self.scritture_eseguite = 0
+
+    def scrivi(self, file_path: str, dati: Any, codec: Optional[str] = None) -> None:
+        """
+        Serializza subito i dati e ne pianifica la scrittura.
+
+        Args:
+            file_path (str): file di destinazione
+            dati (Any): dati serializzabili in JSON
+            codec (Optional[str]): codec da usare, default quello configurato
+        """
+        contenuto = get_codec(codec).codifica(dati)
+        self.scritture_richieste += 1
+        if self.finestra <= 0:
+            _scrivi_file(file_path, contenuto)
+            self.scritture_eseguite += 1
+            return
+        with self._lock:
+            self._pending[file_path] = contenuto
+            if self._timer is None:
+                self._timer = threading.Timer(self.finestra, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def in_sospeso(self, file_path: str) -> Optional[bytes]:
+        """
+        Returns:
+            Optional[str]: contenuto non ancora scritto del file, se presente
+        """
+        with self._lock:
+            return self._pending.get(file_path)
+
+    def annulla(self, file_path: str) -> bool:
+        """
+        Scarta un salvataggio in sospeso (es. il file viene eliminato).
+
+        Returns:
+            bool: True se c'era un salvataggio in sospeso
+        """
+        with self._lock:
+            return self._pending.pop(file_path, None) is not None
+
+    def flush(self) -> int:
+        """
+        Scrive tutti i salvataggi in sospeso. Da chiamare allo spegnimento
+        (è registrato anche con atexit).
+
+        Returns:
+            int: numero di file scritti
+        """
+        with self._flush_lock:
+            with self._lock:
+                self._timer = None
+                snapshot = dict(self._pending)
+            cartelle = set()
+            for file_path, contenuto in snapshot.items():
+                try:
+                    with lock_manager.write_lock(f"file:{os.path.abspath(file_path)}"):
+                        # Ricontrolla sotto il lock del file: se elimina_json
+                        # ha scartato il salvataggio (o ne è arrivato uno più
+                        # recente) questo contenuto non va scritto
+                        with self._lock:
+                            if self._pending.get(file_path) is not contenuto:
+                                continue
+                        scrivi_atomico(file_path, contenuto, sync_dir=False)
+                        with self._lock:
+                            if self._pending.get(file_path) is contenuto:
+                                del self._pending[file_path]
+                    cartelle.add(os.path.dirname(os.path.abspath(file_path)))
+                    self.scritture_eseguite += 1
+                except Exception as e:
+                    logger.error(f"Errore scrittura differita {file_path}: {e}")
+            # Un solo fsync per cartella per tutto il gruppo di scritture
+            for cartella in cartelle:
+                _fsync_dir(cartella)
+            return len(snapshot)
+
+
+# Scrittore condiviso dai file JSON di personaggi, inventari e salvataggi
+scrittore = ScritturaDifferita(WRITE_BEHIND_WINDOW)
+atexit.register(scrittore.flush)
+
+
+def salva_json(file_path: str, dati: Any, codec: Optional[str] = None) -> None:
+    """
+    Salva i dati in modo atomico tramite lo scrittore condiviso, nel
+    formato del codec configurato (il nome resta .json anche in binario).
+    """
+    scrittore.scrivi(file_path, dati, codec=codec)
+
+
+def _migra(file_path: str, dati: Any, contenuto: bytes, firma: tuple) -> None:
+    """
+    Riscrive un file nel formato configurato, solo se nessuno lo ha
+    modificato dopo la lettura (controllo fatto sotto il lock del file).
+    """
+    nuovo = get_codec().codifica(dati)
+    if nuovo == contenuto:
+        return  # es. '{}' è uguale in JSON indentato e compatto
+    with lock_manager.write_lock(f"file:{os.path.abspath(file_path)}"):
+        if firma_json(file_path) != firma:
+            return
+        scrivi_atomico(file_path, nuovo, sync_dir=False)
+    logger.info(f"File migrato al formato {get_codec().formato}: {file_path}")
+
+
+def leggi_json(file_path: str, migra: bool = True) -> Optional[Any]:
+    """
+    Legge un file di gioco in qualunque formato, considerando i salvataggi
+    ancora in sospeso. Se GDR_SAVE_CODEC_MIGRATE è attivo, un file in un
+    formato diverso da quello configurato viene riscritto alla prima lettura.
+
+    Args:
+        file_path (str): percorso del file
+        migra (bool): False per i file con un formato proprio (es. i replay
+            binari) che non vanno riscritti nel codec configurato
+
+    Returns:
+        Optional[Any]: dati letti o None se il file non esiste
+    """
+    contenuto = scrittore.in_sospeso(file_path)
+    if contenuto is not None:
+        return decodifica(contenuto)
+    firma = firma_json(file_path)
+    if firma is None:
+        return None
+    with open(file_path, "rb") as file:
+        contenuto = file.read()
+    dati = decodifica(contenuto)
+    if migra and SAVE_CODEC_MIGRATE and rileva_formato(contenuto) != get_codec().formato:
+        try:
+            _migra(file_path, dati, contenuto, firma)
+        except OSError as e:
+            logger.error(f"Migrazione formato fallita {file_path}: {e}")
+    return dati
+
+
+def elimina_json(file_path: str) -> bool:
+    """
+    Elimina un file JSON e l'eventuale salvataggio in sospeso.
+
+    Returns:
+        bool: True se il file (o il salvataggio in sospeso) esisteva
+    """
+    # Stesso lock del flush: un salvataggio in sospeso non può essere
+    # scritto dopo l'eliminazione e far ricomparire il file
+    with lock_manager.write_lock(f"file:{os.path.abspath(file_path)}"):
+        annullato = scrittore.annulla(file_path)
+        if os.path.exists(file_path):
+            os.remove(file_path)
+            return True
+    return annullato
+
+
+def firma_json(file_path: str) -> Optional[tuple]:
+    """
+    Firma del file per validare le cache: (percorso, mtime_ns, dimensione),
+    oppure una firma del contenuto se c'è un salvataggio in sospeso.
+
+    Returns:
+        Optional[tuple]: firma o None se il file non esiste
+    """
+    contenuto = scrittore.in_sospeso(file_path)
+    if contenuto is not None:
+        return (file_path, "in_sospeso", hash(contenuto))
+    try:
+        st = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return (file_path, st.st_mtime_ns, st.st_size)
+
+
+def esiste_json(file_path: str) -> bool:
+    """
+    Returns:
+        bool: True se il file esiste o ha un salvataggio in sospeso
+    """
+    return scrittore.in_sospeso(file_path) is not None or os.path.exists(file_path)
+
 
 class Json:
 
@@ -18,8 +402,7 @@ class Json:
         """
         
         try:
-            with open(file_path, 'w') as file:
-                json.dump(dati_da_salvare, file, indent=4)
+            salva_json(file_path, dati_da_salvare)
             print(f"Dati scritti con successo in {file_path}")
         except Exception as e:
             print(f"Errore nella scrittura del file JSON: {e}")
@@ -36,76 +419,103 @@ class Json:
         """
         
         try:
-            with open(file_path, 'r') as file:
-                dati = json.load(file)
-            return dati
+            return leggi_json(file_path)
         except Exception as e:
             print(f"Errore nella lettura del file JSON: {e}")
             return None
     @staticmethod
-    def applica_patch(patch_element: dict) -> None:
+    def applica_patch(
+        patches: Union[dict, List[dict]],
+        file_path: str = "data/salvataggio.json",
+        salva: bool = True
+    ) -> Optional[dict]:
         """
-        Applica un aggiornamento a tutti gli oggetti nel salvataggio che combaciano
-        con __class__ e nome dell'oggetto dato come patch (non strutturata).
+        Applica uno o più aggiornamenti a tutti gli oggetti nel salvataggio che
+        combaciano con __class__ e nome dell'oggetto dato come patch (non strutturata).
+
+        Il salvataggio è letto una sola volta e visitato una sola volta per
+        costruire l'indice (__class__, nome) -> nodi; le patch sono poi
+        applicate in ordine consultando l'indice e il risultato è scritto in
+        modo atomico.
 
         Args:
-            salvataggio (dict): Il dizionario del salvataggio da aggiornare.
-            patch_element (dict): Un oggetto da aggiornare, con chiavi come '__class__', 'nome', etc.
+            patches (Union[dict, List[dict]]): una patch o una lista di patch,
+                con chiavi come '__class__', 'nome', etc.
+            file_path (str): file del salvataggio da aggiornare
+            salva (bool): se False restituisce il risultato senza scriverlo
+
+        Returns:
+            Optional[dict]: salvataggio aggiornato, None se non esiste
         """
-        def match(e1: dict, e2: dict) -> bool:
+        if isinstance(patches, dict):
+            patches = [patches]
+
+        indice: Dict[tuple, List[dict]] = defaultdict(list)
+
+        def chiave(nodo: dict) -> tuple:
+            return (nodo.get("__class__"), nodo.get("nome"))
+
+        def indicizza(radice) -> None:
             """
-                Controlla se due dict rappresentano lo stesso oggetto logico,
-                confrontando '__class__' e 'nome'.
+                Aggiunge all'indice tutti i dict contenuti in radice
+                (visita iterativa, senza limiti di ricorsione).
 
                 Args:
-                    e1 (dict): Dizionario presente nel salvataggio.
-                    e2 (dict): Patch da applicare.
-
-                Returns:
-                    bool: True se entrambi sono dict e hanno stesse '__class__' e 'nome'.
+                    radice (Union[dict, list]): Oggetto da esplorare.
             """
-            return (
-                isinstance(e1, dict) and
-                all(e1.get(k) == e2.get(k) for k in ("__class__", "nome"))
-            )
+            da_visitare = [radice]
+            while da_visitare:
+                obj = da_visitare.pop()
+                if isinstance(obj, dict):
+                    indice[chiave(obj)].append(obj)
+                    da_visitare.extend(obj.values())
+                elif isinstance(obj, list):
+                    da_visitare.extend(obj)
 
         def aggiorna(dizionario: dict, aggiornamento: dict) -> None:
             """
                 Unisce i campi da 'aggiornamento' dentro 'dizionario',
-                ricorsivamente per dict annidati.
+                ricorsivamente per dict annidati, mantenendo l'indice
+                allineato.
 
                 Args:
                     dizionario (dict): Dizionario originale da modificare.
                     aggiornamento (dict): Dizionario con nuovi valori.
-
-                Returns:
-                    None
             """
+            vecchia_chiave = None
+            if any(k in aggiornamento and aggiornamento[k] != dizionario.get(k)
+                   for k in ("__class__", "nome")):
+                vecchia_chiave = chiave(dizionario)
             for k, v in aggiornamento.items():
                 if isinstance(v, dict) and isinstance(dizionario.get(k), dict):
                     aggiorna(dizionario[k], v)
+                elif isinstance(v, (dict, list)):
+                    # Copia: i nodi del salvataggio non condividono la patch
+                    dizionario[k] = copy.deepcopy(v)
+                    indicizza(dizionario[k])
                 else:
                     dizionario[k] = v
+            if vecchia_chiave is not None:
+                # Cambiati __class__ o nome: il nodo va spostato nell'indice
+                nodi = indice[vecchia_chiave]
+                nodi[:] = [nodo for nodo in nodi if nodo is not dizionario]
+                indice[chiave(dizionario)].append(dizionario)
 
-        def cerca_e_aggiorna(obj) -> None:
-            """
-                Cerca ricorsivamente nell’oggetto (dict o list),
-                applicando la patch se trova una corrispondenza.
+        with lock_manager.write_lock(f"patch:{os.path.abspath(file_path)}"):
+            salvataggio = Json.carica_dati(file_path)
+            if salvataggio is None:
+                return None
+            indicizza(salvataggio)
 
-                Args:
-                    obj (Union[dict, list]): Oggetto da esplorare.
-                
-                Returns:
-                    None
-            """
-            if isinstance(obj, dict):
-                if match(obj, patch_element):
-                    aggiorna(obj, patch_element)
-                for v in obj.values():
-                    cerca_e_aggiorna(v)
-            elif isinstance(obj, list):
-                for item in obj:
-                    cerca_e_aggiorna(item)
-        salvataggio = Json.carica_dati("data/salvataggio.json")
-        cerca_e_aggiorna(salvataggio)
-        return salvataggio
\ No newline at end of file
+            aggiornati = 0
+            for patch_element in patches:
+                # Copia della lista: i nodi aggiunti da questa patch sono
+                # visibili solo alle patch successive
+                for nodo in list(indice.get(chiave(patch_element), ())):
+                    aggiorna(nodo, patch_element)
+                    aggiornati += 1
+
+            if salva:
+                salva_json(file_path, salvataggio)
+        logger.info(f"{len(patches)} patch applicate a {aggiornati} oggetti in {file_path}")
+        return salvataggio
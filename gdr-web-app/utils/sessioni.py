@@ -0,0 +1,222 @@
+"""
+Sessioni lato server in un unico database SQLite (al posto di un file per
+sessione in flask_session/, mai ripulito).
+
+Ogni richiesta legge una riga per chiave primaria e scrive al massimo una
+riga (solo se la sessione è cambiata o se la scadenza va rinnovata); la
+scadenza è indicizzata e le sessioni scadute sono eliminate a blocchi
+ogni SESSION_GC_INTERVAL secondi. Una sessione modificata oltre
+SESSION_MAX_BYTES non viene salvata (resta quella precedente) e la
+richiesta risponde con SessioneTroppoGrande (413), che l'app può gestire
+con errorhandler.
+"""
+import time
+import sqlite3
+import logging
+import threading
+from datetime import timedelta
+from typing import Optional
+
+from flask import Flask, Response, current_app, session as sessione_corrente
+from flask_session.base import ServerSideSession, ServerSideSessionInterface
+from werkzeug.exceptions import HTTPException
+
+from config import SESSION_MAX_BYTES, SESSION_GC_INTERVAL, SESSION_TOUCH_INTERVAL
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Sessioni scadute eliminate per istruzione durante la pulizia
+GC_BLOCCO = 1000
+
+
+class SessioneTroppoGrande(HTTPException):
+    """
+    La sessione modificata dalla richiesta supera il limite di dimensione:
+    le modifiche non sono state salvate.
+    """
+    code = 413
+    description = "Dati di sessione troppo grandi: le modifiche non sono state salvate."
+
+    def __init__(self, dimensione: int, limite: int) -> None:
+        super().__init__()
+        self.dimensione = dimensione
+        self.limite = limite
+
+
+class SessioneSqlite(ServerSideSession):
+    """
+    Sessione con la scadenza letta dal database, per sapere se va
+    rinnovata anche quando i dati non cambiano.
+    """
+    scadenza: Optional[float] = None
+    # True se la richiesta l'ha resa troppo grande: non va salvata
+    scartata: bool = False
+
+
+class SqliteSessionInterface(ServerSideSessionInterface):
+    """
+    Interfaccia di Flask-Session su una tabella SQLite
+    (id TEXT PRIMARY KEY, dati BLOB, scadenza REAL indicizzata).
+    I dati sono serializzati da Flask-Session (msgpack).
+    """
+
+    session_class = SessioneSqlite
+    ttl = True  # la pulizia è interna: niente comando 'flask session_cleanup'
+
+    def __init__(self, app: Flask, db_path: str, max_bytes: int = SESSION_MAX_BYTES,
+                 gc_interval: float = SESSION_GC_INTERVAL,
+                 touch_interval: float = SESSION_TOUCH_INTERVAL) -> None:
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.gc_interval = gc_interval
+        self.touch_interval = touch_interval
+        self._local = threading.local()
+        self._gc_lock = threading.Lock()
+        self._ultimo_gc = 0.0
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessioni ("
+                "id TEXT PRIMARY KEY, dati BLOB NOT NULL, scadenza REAL NOT NULL"
+                ") WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_sessioni_scadenza ON sessioni(scadenza)")
+        super().__init__(
+            app,
+            key_prefix=app.config.get("SESSION_KEY_PREFIX", "session:"),
+            permanent=app.config.get("SESSION_PERMANENT", True),
+            sid_length=app.config.get("SESSION_ID_LENGTH", 32),
+            serialization_format="msgpack",
+        )
+        # Registrato per primo, eseguito per ultimo: vede la sessione finale
+        app.after_request(self._controlla_dimensione)
+
+    def _conn(self) -> sqlite3.Connection:
+        """
+        Una connessione per thread (come utils.storage.SqliteStore).
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ------------------------PULIZIA-----------------------------------------
+    def elimina_scadute(self, ora: Optional[float] = None) -> int:
+        """
+        Elimina le sessioni scadute a blocchi di GC_BLOCCO righe (indice
+        sulla scadenza: non scorre le sessioni valide).
+
+        Returns:
+            int: sessioni eliminate
+        """
+        ora = time.time() if ora is None else ora
+        conn = self._conn()
+        eliminate = 0
+        while True:
+            with conn:
+                cursor = conn.execute(
+                    "DELETE FROM sessioni WHERE id IN ("
+                    "SELECT id FROM sessioni WHERE scadenza <= ? LIMIT ?)",
+                    (ora, GC_BLOCCO)
+                )
+            eliminate += cursor.rowcount
+            if cursor.rowcount < GC_BLOCCO:
+                break
+        if eliminate:
+            logger.info(f"Sessioni scadute eliminate: {eliminate}")
+        return eliminate
+
+    def _forse_gc(self) -> None:
+        if self.gc_interval <= 0 or time.monotonic() - self._ultimo_gc < self.gc_interval:
+            return
+        # Un solo thread per processo fa la pulizia, gli altri proseguono
+        if not self._gc_lock.acquire(blocking=False):
+            return
+        try:
+            self._ultimo_gc = time.monotonic()
+            self.elimina_scadute()
+        except sqlite3.Error as e:
+            logger.error(f"Errore pulizia sessioni: {e}")
+        finally:
+            self._gc_lock.release()
+
+    # ------------------------FLASK-SESSION-----------------------------------
+    def open_session(self, app: Flask, request) -> SessioneSqlite:
+        self._forse_gc()
+        self._local.scadenza = None
+        sessione = super().open_session(app, request)
+        # Scadenza della riga letta da _retrieve_session_data (None se nuova)
+        sessione.scadenza = self._local.scadenza
+        return sessione
+
+    def _retrieve_session_data(self, store_id: str) -> Optional[dict]:
+        row = self._conn().execute(
+            "SELECT dati, scadenza FROM sessioni WHERE id = ? AND scadenza > ?",
+            (store_id, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        self._local.scadenza = row[1]
+        return self.serializer.decode(row[0])
+
+    def _controlla_dimensione(self, response: Response) -> Response:
+        """
+        after_request: se la sessione modificata supera max_bytes la scarta
+        e sostituisce la risposta con SessioneTroppoGrande (o con quella
+        dell'errorhandler registrato dall'app), prima del salvataggio.
+        """
+        sessione = sessione_corrente._get_current_object()
+        if not self.max_bytes or not isinstance(sessione, SessioneSqlite) or not sessione.modified:
+            return response
+        dimensione = len(self.serializer.encode(sessione))
+        if dimensione <= self.max_bytes:
+            return response
+        logger.warning(
+            f"Sessione di {dimensione} byte oltre il limite di {self.max_bytes}: "
+            f"modifiche non salvate"
+        )
+        sessione.scartata = True
+        errore = SessioneTroppoGrande(dimensione, self.max_bytes)
+        return current_app.make_response(current_app.handle_http_exception(errore))
+
+    def should_set_storage(self, app: Flask, session: SessioneSqlite) -> bool:
+        """
+        Scrive se la sessione è cambiata; altrimenti rinnova la scadenza
+        al massimo ogni touch_interval secondi invece che a ogni richiesta.
+        Una sessione scartata da _controlla_dimensione non viene scritta.
+        """
+        if getattr(session, "scartata", False):
+            return False
+        if session.modified:
+            return True
+        if not app.config["SESSION_REFRESH_EACH_REQUEST"]:
+            return False
+        if session.scadenza is None:
+            return True
+        nuova = time.time() + app.permanent_session_lifetime.total_seconds()
+        return nuova - session.scadenza >= self.touch_interval
+
+    def _upsert_session(self, session_lifetime: timedelta, session: ServerSideSession,
+                        store_id: str) -> None:
+        dati = self.serializer.encode(session)
+        if self.max_bytes and len(dati) > self.max_bytes:
+            # Fuori da una richiesta (o senza _controlla_dimensione)
+            raise SessioneTroppoGrande(len(dati), self.max_bytes)
+        scadenza = time.time() + session_lifetime.total_seconds()
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO sessioni (id, dati, scadenza) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET dati = excluded.dati, scadenza = excluded.scadenza",
+                (store_id, dati, scadenza)
+            )
+        if isinstance(session, SessioneSqlite):
+            session.scadenza = scadenza
+
+    def _delete_session(self, store_id: str) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM sessioni WHERE id = ?", (store_id,))
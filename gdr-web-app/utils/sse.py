@@ -0,0 +1,39 @@
+import json
+from typing import Any, Optional
+
+# Header delle risposte text/event-stream: niente cache e niente buffering
+# dei proxy (nginx), altrimenti gli eventi arrivano tutti alla fine
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+
+def evento_sse(
+    dati: Any,
+    evento: Optional[str] = None,
+    id: Optional[str] = None,
+    retry: Optional[int] = None
+) -> str:
+    """
+    Formatta un evento Server-Sent Events.
+
+    Args:
+        dati (Any): contenuto dell'evento, serializzato in JSON su una riga
+        evento (Optional[str]): tipo di evento (campo event)
+        id (Optional[str]): ID dell'evento, rimandato dal browser nell'header
+            Last-Event-ID quando si riconnette
+        retry (Optional[int]): attesa in ms prima della riconnessione
+
+    Returns:
+        str: evento terminato da una riga vuota
+    """
+    righe = []
+    if id is not None:
+        righe.append(f"id: {id}")
+    if evento is not None:
+        righe.append(f"event: {evento}")
+    if retry is not None:
+        righe.append(f"retry: {retry}")
+    righe.append(f"data: {json.dumps(dati, ensure_ascii=False)}")
+    return "\n".join(righe) + "\n\n"
@@ -0,0 +1,749 @@
+import os
+import json
+import zlib
+import time
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+from utils.salvataggio import (
+    salva_json, leggi_json, elimina_json, esiste_json, firma_json, scrivi_atomico,
+    get_codec, decodifica
+)
+from utils.locks import lock_manager
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# SQLite limita il numero di parametri per query (999 nelle versioni vecchie)
+SQLITE_MAX_PARAMS = 900
+
+# Chiave dei metadati aggiunti ai record scritti dalle nostre funzioni
+META_KEY = "_meta"
+
+
+def _checksum(data: Dict) -> int:
+    """
+    CRC32 della forma canonica (chiavi ordinate, senza spazi) del record.
+    """
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"))
+    return zlib.crc32(canonical.encode("utf-8"))
+
+
+def stamp(data: Dict, schema_version: int) -> Dict:
+    """
+    Restituisce una copia del record con versione dello schema e checksum,
+    così che al caricamento si possa saltare la validazione.
+
+    Args:
+        data (Dict): record già serializzato dallo schema
+        schema_version (int): versione dello schema che lo ha prodotto
+
+    Returns:
+        Dict: record con la chiave META_KEY
+    """
+    clean = {k: v for k, v in data.items() if k != META_KEY}
+    clean[META_KEY] = {"schema": schema_version, "checksum": _checksum(clean)}
+    return clean
+
+
+def unstamp(data: Dict) -> Dict:
+    """
+    Rimuove i metadati dal record (da usare prima della validazione).
+    """
+    return {k: v for k, v in data.items() if k != META_KEY}
+
+
+def verify_stamp(data: Dict, schema_version: int) -> Optional[Dict]:
+    """
+    Verifica che il record sia stato scritto da noi con la versione dello
+    schema attuale e non sia stato modificato.
+
+    Args:
+        data (Dict): record letto dallo store
+        schema_version (int): versione dello schema attesa
+
+    Returns:
+        Optional[Dict]: record senza metadati se affidabile, altrimenti None
+        (anche se non è un oggetto JSON: lo rifiuta poi la validazione)
+    """
+    if not isinstance(data, dict):
+        return None
+    meta = data.get(META_KEY)
+    if not isinstance(meta, dict) or meta.get("schema") != schema_version:
+        return None
+    clean = unstamp(data)
+    if meta.get("checksum") != _checksum(clean):
+        return None
+    return clean
+
+
+class DirectoryIds:
+    """
+    Insieme in memoria degli IDs (nomi file .json) presenti in una cartella.
+    Si rilegge la cartella solo quando la sua mtime cambia; le funzioni di
+    salvataggio/eliminazione lo aggiornano direttamente con add/discard.
+
+    La mtime ha una granularità (fino al secondo su alcuni filesystem): un
+    file creato da un altro worker nello stesso intervallo dell'ultima
+    modifica non la cambia. Per questo un ID assente viene verificato sul
+    file, e all() rilegge la cartella finché l'ultima modifica è troppo
+    vicina alla scansione per fidarsi della mtime.
+    """
+
+    # Margine oltre il quale una scansione successiva alla mtime è affidabile
+    GRANULARITA_MTIME_NS = 2_000_000_000
+
+    def __init__(self, base_dir: str) -> None:
+        self.base_dir = base_dir
+        self._ids: set = set()
+        self._mtime_ns: Optional[int] = None
+        self._incerto = False
+        self._lock = threading.Lock()
+
+    def _dir_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.base_dir).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _refresh(self, completo: bool = False) -> set:
+        """
+        Args:
+            completo (bool): rilegge anche se la mtime non è affidabile
+                (per l'elenco completo degli IDs)
+        """
+        mtime = self._dir_mtime()
+        with self._lock:
+            if mtime != self._mtime_ns or mtime is None or (completo and self._incerto):
+                inizio = time.time_ns()
+                ids = set()
+                if mtime is not None:
+                    with os.scandir(self.base_dir) as entries:
+                        for entry in entries:
+                            if entry.name.endswith('.json') and entry.name != '.gitkeep':
+                                ids.add(entry.name[:-5])
+                self._ids = ids
+                self._mtime_ns = mtime
+                self._incerto = mtime is not None and inizio - mtime < self.GRANULARITA_MTIME_NS
+            return self._ids
+
+    def _verifica(self, record_id: str) -> bool:
+        """
+        ID non presente nell'insieme: controlla il file (può essere stato
+        creato senza cambiare la mtime della cartella).
+        """
+        if not self._incerto:
+            return False
+        if os.path.exists(os.path.join(self.base_dir, f"{record_id}.json")):
+            with self._lock:
+                self._ids.add(record_id)
+            return True
+        return False
+
+    def all(self) -> List[str]:
+        """
+        Returns:
+            List[str]: tutti gli IDs presenti nella cartella
+        """
+        return list(self._refresh(completo=True))
+
+    def __contains__(self, record_id: str) -> bool:
+        record_id = str(record_id)
+        return record_id in self._refresh() or self._verifica(record_id)
+
+    def existing(self, record_ids: Iterable[str]) -> List[str]:
+        """
+        Filtra gli IDs esistenti mantenendo l'ordine, in O(len(record_ids)).
+        """
+        ids = self._refresh()
+        return [
+            str(record_id) for record_id in record_ids
+            if str(record_id) in ids or self._verifica(str(record_id))
+        ]
+
+    def _update(self, record_id: str, add: bool, was_fresh: bool) -> None:
+        with self._lock:
+            if add:
+                self._ids.add(str(record_id))
+            else:
+                self._ids.discard(str(record_id))
+            # La nostra scrittura ha cambiato la mtime della cartella: se
+            # prima l'insieme era aggiornato lo resta, senza rileggerla
+            # (ma un altro worker può aver scritto nello stesso intervallo)
+            if was_fresh:
+                self._mtime_ns = self._dir_mtime()
+                self._incerto = True
+
+    def is_fresh(self) -> bool:
+        """
+        Returns:
+            bool: True se l'insieme riflette l'ultima mtime della cartella
+        """
+        return self._mtime_ns is not None and self._dir_mtime() == self._mtime_ns
+
+    def add(self, record_id: str, was_fresh: bool) -> None:
+        """
+        Registra un file appena creato.
+
+        Args:
+            record_id (str): ID del record
+            was_fresh (bool): risultato di is_fresh() prima della scrittura
+        """
+        self._update(record_id, True, was_fresh)
+
+    def discard(self, record_id: str, was_fresh: bool) -> None:
+        """
+        Registra un file appena eliminato.
+
+        Args:
+            record_id (str): ID del record
+            was_fresh (bool): risultato di is_fresh() prima dell'eliminazione
+        """
+        self._update(record_id, False, was_fresh)
+
+
+class DirectoryStore:
+    """
+    Backend di default: un file JSON per ogni record dentro una cartella.
+    E il layout storico di data/json/personaggi e data/json/inventari.
+    """
+
+    def __init__(self, base_dir: str) -> None:
+        self.base_dir = base_dir
+        self.index = DirectoryIds(base_dir)
+
+    def path(self, record_id: str) -> str:
+        """
+        Restituisce il percorso del file associato al record.
+
+        Args:
+            record_id (str): ID del record
+
+        Returns:
+            str: percorso del file JSON
+        """
+        return os.path.join(self.base_dir, f"{record_id}.json")
+
+    def get(self, record_id: str) -> Optional[Dict]:
+        """
+        Legge un record dal suo file.
+
+        Args:
+            record_id (str): ID del record
+
+        Returns:
+            Optional[Dict]: dati del record o None se il file non esiste
+        """
+        return leggi_json(self.path(record_id))
+
+    def signature(self, record_id: str) -> Optional[tuple]:
+        """
+        Firma del record usata per validare la cache: cambia a ogni
+        riscrittura del file.
+
+        Args:
+            record_id (str): ID del record
+
+        Returns:
+            Optional[tuple]: (percorso, mtime_ns, dimensione) o None se il
+            file non esiste (vedi utils.salvataggio.firma_json)
+        """
+        return firma_json(self.path(record_id))
+
+    def signatures(self, record_ids: Iterable[str]) -> Dict[str, tuple]:
+        """
+        Firme di più record; omette quelli inesistenti.
+        """
+        risultati = {}
+        for record_id in record_ids:
+            sig = self.signature(record_id)
+            if sig is not None:
+                risultati[str(record_id)] = sig
+        return risultati
+
+    def get_many(self, record_ids: Iterable[str]) -> Dict[str, Dict]:
+        """
+        Legge più record; con le cartelle resta un file per record.
+
+        Args:
+            record_ids (Iterable[str]): IDs da leggere
+
+        Returns:
+            Dict[str, Dict]: {id: dati} dei soli record trovati
+        """
+        risultati = {}
+        for record_id in record_ids:
+            try:
+                data = self.get(record_id)
+            except (OSError, ValueError) as e:
+                logger.error(f"Errore lettura record {record_id}: {e}")
+                continue
+            if data is not None:
+                risultati[str(record_id)] = data
+        return risultati
+
+    def put(self, record_id: str, data: Dict, owner_id: Optional[str] = None) -> None:
+        """
+        Scrive un record sul suo file in modo atomico (temp + fsync +
+        rename, vedi utils.salvataggio). owner_id non è usato dalle cartelle:
+        la proprietà resta registrata nel database utenti.
+
+        Args:
+            record_id (str): ID del record
+            data (Dict): dati serializzati
+            owner_id (Optional[str]): ID del proprietario
+        """
+        was_fresh = self.index.is_fresh()
+        salva_json(self.path(record_id), data)
+        self.index.add(record_id, was_fresh)
+
+    def put_many(self, records: Dict[str, Dict], owner_id: Optional[str] = None) -> None:
+        """
+        Scrive più record.
+
+        Args:
+            records (Dict[str, Dict]): {id: dati}
+            owner_id (Optional[str]): ID del proprietario comune
+        """
+        for record_id, data in records.items():
+            self.put(record_id, data, owner_id)
+
+    def delete(self, record_id: str) -> bool:
+        """
+        Elimina il file del record.
+
+        Returns:
+            bool: True se il file esisteva ed è stato eliminato
+        """
+        path = self.path(record_id)
+        if not esiste_json(path):
+            return False
+        was_fresh = self.index.is_fresh()
+        elimina_json(path)
+        self.index.discard(record_id, was_fresh)
+        return True
+
+    def ids(self) -> List[str]:
+        """
+        Elenca gli IDs dei record presenti nella cartella (dalla cache).
+
+        Returns:
+            List[str]: IDs trovati
+        """
+        return self.index.all()
+
+    def existing(self, record_ids: Iterable[str]) -> List[str]:
+        """
+        Filtra gli IDs che hanno un file, senza leggere la cartella
+        se non è cambiata.
+
+        Returns:
+            List[str]: IDs esistenti, nell'ordine richiesto
+        """
+        record_ids = [str(record_id) for record_id in record_ids]
+        found = set(self.index.existing(record_ids))
+        # Anche i record nuovi non ancora scritti dallo write-behind
+        return [
+            record_id for record_id in record_ids
+            if record_id in found or esiste_json(self.path(record_id))
+        ]
+
+
+class SqliteStore:
+    """
+    Backend embedded: tutti i record in un unico file SQLite, con il JSON
+    in una colonna e indici sull'ID (chiave primaria) e sul proprietario.
+    Le letture multiple sono un'unica query invece di N aperture di file.
+    """
+
+    def __init__(self, db_path: str, table: str) -> None:
+        self.db_path = db_path
+        self.table = table
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "id TEXT PRIMARY KEY, owner_id TEXT, data TEXT NOT NULL, "
+                "version INTEGER NOT NULL DEFAULT 0)"
+            )
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS ix_{table}_owner ON {table}(owner_id)"
+            )
+            # Database creati prima della colonna version
+            colonne = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if "version" not in colonne:
+                conn.execute(
+                    f"ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 0"
+                )
+            # Contatore delle versioni per tabella: non riparte quando un
+            # record viene eliminato e reinserito, quindi una firma
+            # (tabella, id, versione) non torna mai a valere per dati diversi
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS store_versioni ("
+                "tabella TEXT PRIMARY KEY, ultima INTEGER NOT NULL)"
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO store_versioni (tabella, ultima) "
+                f"SELECT ?, COALESCE(MAX(version), 0) FROM {table}",
+                (table,)
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        """
+        Una connessione per thread: sqlite3 non condivide le connessioni
+        tra thread diversi.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, record_id: str) -> Optional[Dict]:
+        row = self._conn().execute(
+            f"SELECT data FROM {self.table} WHERE id = ?", (str(record_id),)
+        ).fetchone()
+        return decodifica(row[0]) if row else None
+
+    def _select_many(self, columns: str, record_ids: Iterable[str]):
+        ids = [str(record_id) for record_id in record_ids]
+        conn = self._conn()
+        for start in range(0, len(ids), SQLITE_MAX_PARAMS):
+            chunk = ids[start:start + SQLITE_MAX_PARAMS]
+            placeholders = ",".join("?" * len(chunk))
+            yield from conn.execute(
+                f"SELECT id, {columns} FROM {self.table} WHERE id IN ({placeholders})",
+                chunk
+            )
+
+    def get_many(self, record_ids: Iterable[str]) -> Dict[str, Dict]:
+        return {
+            record_id: decodifica(data)
+            for record_id, data in self._select_many("data", record_ids)
+        }
+
+    def signature(self, record_id: str) -> Optional[tuple]:
+        # La versione cambia a ogni scrittura, anche da altri processi
+        row = self._conn().execute(
+            f"SELECT version FROM {self.table} WHERE id = ?", (str(record_id),)
+        ).fetchone()
+        return (self.table, str(record_id), row[0]) if row else None
+
+    def signatures(self, record_ids: Iterable[str]) -> Dict[str, tuple]:
+        return {
+            record_id: (self.table, record_id, version)
+            for record_id, version in self._select_many("version", record_ids)
+        }
+
+    @staticmethod
+    def _codifica(data: Dict):
+        # Il JSON indentato serve solo a leggere i file a mano: nel
+        # database si usa la forma compatta
+        codec = get_codec()
+        if codec.formato == "json":
+            codec = get_codec("json-compatto")
+        return codec.codifica(data)
+
+    def put(self, record_id: str, data: Dict, owner_id: Optional[str] = None) -> None:
+        self.put_many({record_id: data}, owner_id)
+
+    def put_many(self, records: Dict[str, Dict], owner_id: Optional[str] = None) -> None:
+        owner = str(owner_id) if owner_id is not None else None
+        encoded = [
+            (str(record_id), self._codifica(data))
+            for record_id, data in records.items()
+        ]
+        if not encoded:
+            return
+        with self._conn() as conn:
+            # Riserva un blocco di versioni: l'UPDATE prende il lock di
+            # scrittura, quindi i blocchi di processi diversi non si sovrappongono
+            conn.execute(
+                "UPDATE store_versioni SET ultima = ultima + ? WHERE tabella = ?",
+                (len(encoded), self.table)
+            )
+            base = conn.execute(
+                "SELECT ultima FROM store_versioni WHERE tabella = ?", (self.table,)
+            ).fetchone()[0] - len(encoded)
+            # Se il proprietario non è indicato si mantiene quello già salvato
+            conn.executemany(
+                f"INSERT INTO {self.table} (id, owner_id, data, version) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET data = excluded.data, "
+                "version = excluded.version, "
+                f"owner_id = COALESCE(excluded.owner_id, {self.table}.owner_id)",
+                [
+                    (record_id, owner, data, base + i + 1)
+                    for i, (record_id, data) in enumerate(encoded)
+                ]
+            )
+
+    def delete(self, record_id: str) -> bool:
+        with self._conn() as conn:
+            cursor = conn.execute(
+                f"DELETE FROM {self.table} WHERE id = ?", (str(record_id),)
+            )
+        return cursor.rowcount > 0
+
+    def ids(self) -> List[str]:
+        return [
+            row[0] for row in
+            self._conn().execute(f"SELECT id FROM {self.table}")
+        ]
+
+    def existing(self, record_ids: Iterable[str]) -> List[str]:
+        ids = [str(record_id) for record_id in record_ids]
+        found = {record_id for record_id, _ in self._select_many("1", ids)}
+        return [record_id for record_id in ids if record_id in found]
+
+    def ids_by_owner(self, owner_id: str) -> List[str]:
+        """
+        IDs dei record del proprietario (indice su owner_id).
+        """
+        return [
+            row[0] for row in self._conn().execute(
+                f"SELECT id FROM {self.table} WHERE owner_id = ?",
+                (str(owner_id),)
+            )
+        ]
+
+
+
+class OwnerIndex:
+    """
+    Indice persistente proprietario -> ID del record (nome del file senza
+    estensione) per gli store a directory.
+    Viene mantenuto dalle funzioni di salvataggio/eliminazione e ricostruito
+    se più vecchio della cartella che indicizza.
+
+    Ogni worker ne tiene una copia in memoria: le modifiche rileggono il
+    file sotto un lock tra processi e lo riscrivono con la sola voce
+    cambiata, così le voci scritte dagli altri worker non vanno perse; le
+    letture ricaricano il file quando la sua firma cambia.
+    """
+
+    def __init__(self, base_dir: str, index_path: str, owner_key: str) -> None:
+        self.base_dir = base_dir
+        self.index_path = index_path
+        self.owner_key = owner_key
+        self._mapping: Optional[Dict[str, str]] = None
+        self._firma: Optional[tuple] = None
+        self._lock = threading.Lock()
+
+    def _firma_file(self) -> Optional[tuple]:
+        # Ogni scrittura atomica crea un nuovo inode: cambia anche se
+        # mtime e dimensione restano uguali
+        try:
+            st = os.stat(self.index_path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _lock_file(self):
+        return lock_manager.write_lock(f"indice:{os.path.abspath(self.index_path)}")
+
+    def is_stale(self) -> bool:
+        """
+        L'indice è vecchio se manca o se la cartella è stata modificata
+        (file creati o eliminati) dopo l'ultima scrittura dell'indice.
+
+        Returns:
+            bool: True se l'indice va ricostruito
+        """
+        try:
+            index_mtime = os.stat(self.index_path).st_mtime_ns
+        except FileNotFoundError:
+            return True
+        return os.stat(self.base_dir).st_mtime_ns > index_mtime
+
+    def rebuild(self) -> int:
+        """
+        Ricostruisce l'indice leggendo il solo campo proprietario di ogni
+        file, senza validazione Marshmallow.
+
+        Returns:
+            int: numero di proprietari indicizzati
+        """
+        with self._lock, self._lock_file():
+            mapping = {}
+            for file in os.listdir(self.base_dir):
+                if not file.endswith('.json') or file == '.gitkeep':
+                    continue
+                try:
+                    data = leggi_json(os.path.join(self.base_dir, file))
+                except (OSError, ValueError) as e:
+                    logger.error(f"Errore indicizzazione {file}: {e}")
+                    continue
+                if data is None:
+                    continue
+                if not isinstance(data, dict):
+                    logger.error(f"Errore indicizzazione {file}: il contenuto non è un oggetto JSON")
+                    continue
+                owner = data.get(self.owner_key)
+                if owner:
+                    mapping[str(owner)] = os.path.splitext(file)[0]
+            self._mapping = mapping
+            self._write()
+        logger.info(f"Indice proprietari ricostruito: {len(mapping)} voci")
+        return len(mapping)
+
+    def _read(self) -> bool:
+        """
+        Carica l'indice da disco (chiamato con self._lock).
+
+        Returns:
+            bool: False se il file manca o non è valido
+        """
+        firma = self._firma_file()
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                mapping = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return False
+        self._mapping = mapping
+        self._firma = firma
+        return True
+
+    def ensure_fresh(self) -> None:
+        """
+        Carica l'indice da disco, ricostruendolo se vecchio.
+        Va chiamato all'avvio dell'applicazione.
+        """
+        if self.is_stale():
+            self.rebuild()
+            return
+        with self._lock:
+            letto = self._read()
+        if not letto:
+            self.rebuild()
+
+    def _write(self) -> None:
+        scrivi_atomico(
+            self.index_path, json.dumps(self._mapping, separators=(",", ":"))
+        )
+        self._firma = self._firma_file()
+
+    def _loaded(self) -> Dict[str, str]:
+        if self._mapping is None:
+            self.ensure_fresh()
+        elif self._firma_file() != self._firma:
+            # Scritto da un altro worker dopo la nostra ultima lettura
+            with self._lock:
+                self._read()
+        return self._mapping
+
+    def _modifica(self, owner_id: str, record_id: Optional[str]) -> None:
+        """
+        Imposta (o rimuove, con record_id None) una voce rileggendo prima
+        l'indice sotto il lock tra processi.
+        """
+        owner_id = str(owner_id)
+        record_id = None if record_id is None else str(record_id)
+        # Caso comune (salvataggio di un inventario già indicizzato): niente lock
+        if self._loaded().get(owner_id) == record_id:
+            return
+        with self._lock, self._lock_file():
+            if self._firma_file() != self._firma:
+                self._read()
+            if record_id is None:
+                if self._mapping.pop(owner_id, None) is None:
+                    return
+            elif self._mapping.get(owner_id) != record_id:
+                self._mapping[owner_id] = record_id
+            else:
+                return
+            self._write()
+
+    def get(self, owner_id: str) -> Optional[str]:
+        """
+        Restituisce l'ID del record del proprietario, se indicizzato.
+        """
+        return self._loaded().get(str(owner_id))
+
+    def get_many(self, owner_ids: Iterable[str]) -> Dict[str, str]:
+        """
+        Restituisce {proprietario: ID record} per i proprietari indicizzati.
+        """
+        mapping = self._loaded()
+        return {
+            str(owner_id): mapping[str(owner_id)]
+            for owner_id in owner_ids
+            if str(owner_id) in mapping
+        }
+
+    def set(self, owner_id: str, record_id: str) -> None:
+        """
+        Registra il record di un proprietario; scrive su disco solo se
+        l'associazione è cambiata.
+        """
+        self._modifica(owner_id, record_id)
+
+    def discard(self, owner_id: str) -> None:
+        """
+        Rimuove il proprietario dall'indice.
+        """
+        self._modifica(owner_id, None)
+
+
+def get_store(name: str, base_dir: str, backend: Optional[str] = None):
+    """
+    Factory dei backend di storage.
+
+    Args:
+        name (str): nome logico dello store (usato come tabella SQLite)
+        base_dir (str): cartella del backend a directory
+        backend (Optional[str]): 'directory' o 'sqlite';
+            di default config.STORAGE_BACKEND
+
+    Returns:
+        DirectoryStore | SqliteStore: backend configurato
+
+    Raises:
+        ValueError: se il backend non è supportato
+    """
+    from config import STORAGE_BACKEND, DATA_DB
+
+    backend = (backend or STORAGE_BACKEND).lower()
+    if backend == "directory":
+        return DirectoryStore(base_dir)
+    if backend == "sqlite":
+        os.makedirs(os.path.dirname(DATA_DB), exist_ok=True)
+        return SqliteStore(DATA_DB, name)
+    raise ValueError(f"Backend di storage sconosciuto: {backend}")
+
+
+def copy_records(source, target, batch_size: int = 500,
+                 owners: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Copia tutti i record da uno store a un altro, a blocchi.
+    Serve a migrare i file JSON esistenti verso il backend sqlite
+    (vedi characters.migrazione_store).
+
+    Args:
+        source: store di origine
+        target: store di destinazione
+        batch_size (int): record letti per blocco
+        owners (Optional[Dict[str, Any]]): proprietario di ogni record
+            (owner_id del backend sqlite); i record assenti restano senza
+
+    Returns:
+        int: numero di record copiati
+    """
+    owners = owners or {}
+    ids = source.ids()
+    copiati = 0
+    for start in range(0, len(ids), batch_size):
+        records = source.get_many(ids[start:start + batch_size])
+        # put_many ha un solo proprietario: una scrittura per proprietario
+        per_owner: Dict[Optional[str], Dict[str, Dict]] = {}
+        for record_id, data in records.items():
+            owner = owners.get(record_id)
+            per_owner.setdefault(str(owner) if owner is not None else None, {})[record_id] = data
+        for owner, gruppo in per_owner.items():
+            target.put_many(gruppo, owner)
+        copiati += len(records)
+    logger.info(f"Copiati {copiati} record nello store di destinazione")
+    return copiati